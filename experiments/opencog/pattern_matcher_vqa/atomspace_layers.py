@@ -0,0 +1,133 @@
+"""
+Per-image child atomspaces with bounding boxes
+
+Atomspaces are organized as:
+    background knowledge atomspace
+      -> image layer with bounding boxes of the image, one per cached image
+        -> scratch layer of the question
+
+Image layers of the last images are kept alive, so questions about the same
+image reuse bounding boxes and only the thin scratch layer is created and
+dropped for each question.
+"""
+
+import collections
+import contextlib
+import logging
+
+from opencog.scheme_wrapper import scheme_eval, scheme_eval_as
+from opencog.type_constructors import set_type_ctor_atomspace
+
+
+# atomspaces are referenced from scheme, otherwise they are destroyed
+# when the python wrapper is released
+BACKGROUND_LAYER = 'vqa-background-atomspace'
+LAYERS_TABLE = 'vqa-image-layers'
+SCRATCH_LAYER = 'vqa-scratch-layer'
+
+
+def _schemeString(value):
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class ImageLayerCache:
+    """
+    Cache of child atomspaces with bounding boxes of the last images
+    """
+
+    def __init__(self, atomspace, maxsize):
+        """
+        :param atomspace: atomspace
+            atomspace with background knowledge, parent of the image layers
+        :param maxsize: int
+            number of image layers to keep
+        """
+        self.atomspace = atomspace
+        self.maxsize = maxsize
+        # image key -> features, features are kept while the layer is alive
+        # because bounding box values may reference them without copying
+        self.layers = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger('ImageLayerCache')
+        scheme_eval(self.atomspace, '(define {0} (cog-atomspace))\n'
+                                    '(define {1} (make-hash-table))\n'
+                                    '(define {2} #f)'
+                    .format(BACKGROUND_LAYER, LAYERS_TABLE, SCRATCH_LAYER))
+
+    def switchTo(self, expression):
+        """
+        Make atomspace returned by scheme expression current one
+
+        :return: atomspace
+        """
+        scheme_eval(self.atomspace, '(cog-set-atomspace! {0})'.format(expression))
+        atomspace = scheme_eval_as('(cog-atomspace)')
+        set_type_ctor_atomspace(atomspace)
+        return atomspace
+
+    def layerExpression(self, imageKey):
+        return '(hash-ref {0} {1})'.format(LAYERS_TABLE, _schemeString(imageKey))
+
+    def createLayer(self, imageKey, features, build):
+        scheme_eval(self.atomspace, '(hash-set! {0} {1} (cog-new-atomspace {2}))'
+                    .format(LAYERS_TABLE, _schemeString(imageKey), BACKGROUND_LAYER))
+        self.layers[imageKey] = features
+        try:
+            self.switchTo(self.layerExpression(imageKey))
+            build(features)
+        except BaseException:
+            self.dropLayer(imageKey)
+            raise
+        while len(self.layers) > self.maxsize:
+            self.dropLayer(next(iter(self.layers)))
+
+    def dropLayer(self, imageKey):
+        del self.layers[imageKey]
+        scheme_eval(self.atomspace, '(hash-remove! {0} {1})'
+                    .format(LAYERS_TABLE, _schemeString(imageKey)))
+
+    @contextlib.contextmanager
+    def scratchLayer(self, imageKey, features, build):
+        """
+        Context manager which makes scratch layer above the image layer the
+        current atomspace and restores the background atomspace on exit
+
+        :param imageKey: str
+            image id or digest of the image features
+        :param features: numpy.ndarray
+            bounding boxes features
+        :param build: Callable[[numpy.ndarray], None]
+            function which adds bounding boxes into the current atomspace,
+            it is called only if the image has no layer yet
+        :return: atomspace
+            scratch atomspace
+        """
+        try:
+            if imageKey in self.layers:
+                self.hits += 1
+                self.layers.move_to_end(imageKey)
+            else:
+                self.misses += 1
+                self.logger.debug('building layer of image %s', imageKey)
+                self.createLayer(imageKey, features, build)
+            scheme_eval(self.atomspace, '(set! {0} (cog-new-atomspace {1}))'
+                        .format(SCRATCH_LAYER, self.layerExpression(imageKey)))
+            yield self.switchTo(SCRATCH_LAYER)
+        finally:
+            self.switchTo(BACKGROUND_LAYER)
+            scheme_eval(self.atomspace, '(set! {0} #f)'.format(SCRATCH_LAYER))
+
+    def getFeatures(self, imageKey):
+        """
+        :return: numpy.ndarray
+            features of the image which has a layer, None otherwise
+        """
+        return self.layers.get(imageKey)
+
+    def clear(self):
+        for imageKey in list(self.layers):
+            self.dropLayer(imageKey)
+
+    def __len__(self):
+        return len(self.layers)
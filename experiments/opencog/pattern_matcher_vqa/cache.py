@@ -0,0 +1,162 @@
+"""
+Size bounded LRU cache and cache of answers
+"""
+
+import collections
+import hashlib
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class LruCache:
+    """
+    Thread safe least recently used cache
+
+    Size of the cache is a sum of sizes of values, by default each value has
+    size 1, so maxsize is a maximum number of values. Pass getsizeof to
+    limit the cache by other measure, e.g. by number of bytes. If ttl is set
+    values expire after ttl seconds.
+    """
+
+    def __init__(self, maxsize, getsizeof=None, ttl=None):
+        """
+        :param maxsize: int
+            maximum total size of the values
+        :param getsizeof: Callable[[Any], int]
+            function to compute size of a value
+        :param ttl: float
+            seconds to keep the value, None means until it is evicted
+        """
+        self.maxsize = maxsize
+        self.getsizeof = getsizeof if getsizeof is not None else lambda value: 1
+        self.ttl = ttl
+        self.items = collections.OrderedDict()
+        self.currsize = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.items:
+                self.misses += 1
+                return default
+            value, size, expires = self.items[key]
+            if expires is not None and expires < time.monotonic():
+                del self.items[key]
+                self.currsize -= size
+                self.misses += 1
+                return default
+            self.items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self.getsizeof(value)
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self.lock:
+            if key in self.items:
+                self.currsize -= self.items.pop(key)[1]
+            if size > self.maxsize:
+                return
+            self.items[key] = (value, size, expires)
+            self.currsize += size
+            while self.currsize > self.maxsize:
+                _, (_, evicted_size, _) = self.items.popitem(last=False)
+                self.currsize -= evicted_size
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.currsize = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, self.currsize)
+
+
+def arrayDigest(array):
+    """
+    Content hash of the numpy array, e.g. decoded image
+    """
+    digest = hashlib.md5(str(array.shape).encode())
+    digest.update(np.ascontiguousarray(array))
+    return digest.hexdigest()
+
+
+def normalizeQuestion(question, ignoreCase=True):
+    """
+    Normalize question text for using it as a cache key: collapse
+    whitespace, ignore trailing question mark and case unless ignoreCase
+    is False
+    """
+    question = re.sub(r'\s+', ' ', question).strip().rstrip('?').strip()
+    return question.casefold() if ignoreCase else question
+
+
+def versionStamp(paths):
+    """
+    Compute stamp which changes when any of the files is modified
+
+    :param paths: Iterable[str]
+        files or directories with models and knowledge base
+    :return: str
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name)
+                           for root, _, names in os.walk(path) for name in names)
+        else:
+            files = [path]
+        for fileName in files:
+            try:
+                stat = os.stat(fileName)
+                digest.update('{0}:{1}:{2};'.format(fileName, stat.st_size,
+                                                    stat.st_mtime_ns).encode())
+            except OSError:
+                digest.update('{0}:missing;'.format(fileName).encode())
+    return digest.hexdigest()
+
+
+class AnswerCache:
+    """
+    Cache of answers keyed by image, normalized question, use_pm flag,
+    number of answer candidates and version of the models and atomspace
+    """
+
+    def __init__(self, maxsize, ttl=None, version=''):
+        """
+        :param maxsize: int
+            maximum number of cached answers
+        :param ttl: float
+            seconds to keep the answer, None means until it is evicted
+        :param version: str
+            version stamp of the models and atomspace, see versionStamp()
+        """
+        self.cache = LruCache(maxsize, ttl=ttl)
+        self.version = version
+
+    def key(self, imageKey, question, use_pm, topK=1):
+        return (imageKey, normalizeQuestion(question), bool(use_pm), int(topK), self.version)
+
+    def get(self, imageKey, question, use_pm, topK=1):
+        return self.cache.get(self.key(imageKey, question, use_pm, topK))
+
+    def put(self, imageKey, question, use_pm, answer, topK=1):
+        self.cache.put(self.key(imageKey, question, use_pm, topK), answer)
+
+    def cache_info(self):
+        return self.cache.cache_info()
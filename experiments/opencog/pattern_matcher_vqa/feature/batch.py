@@ -0,0 +1,158 @@
+"""
+Extract features of the image collection into the packed store
+
+Images are read and decoded on the thread pool while the network processes
+previous images. Proposal layer of the network accepts a single image, so
+images are passed to the network one by one, decoding, nms and writing
+results are overlapped with it.
+
+Extract features of the folder or zip archive with images:
+    python3 -m feature.batch --prototxt test.prototxt \
+        --caffemodel resnet101_faster_rcnn_final.caffemodel \
+        val2014.zip val2014_features.bin
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import itertools
+import logging
+import os
+import re
+import time
+import zipfile
+
+import numpy as np
+import cv2
+
+from util import loadDataFromZipOrFolder, openArchive
+from feature.store import PackedFeatureWriter
+
+
+IMAGE_NAME = re.compile(r'(\d+)\.(jpg|jpeg|png)$', re.IGNORECASE)
+
+
+def listImages(folderOrZip):
+    """
+    :return: List[Tuple[int, str]]
+        image id and file name of each image, image id is the last number
+        in the file name, e.g. COCO_val2014_000000000042.jpg
+    """
+    if os.path.isdir(folderOrZip):
+        names = []
+        for directory, _, fileNames in os.walk(folderOrZip):
+            relative = os.path.relpath(directory, folderOrZip)
+            names.extend(os.path.normpath(os.path.join(relative, fileName))
+                         for fileName in fileNames)
+    else:
+        names = openArchive(folderOrZip).namelist()
+    images = []
+    for name in names:
+        match = IMAGE_NAME.search(os.path.basename(name))
+        if match is not None:
+            images.append((int(match.group(1)), name))
+    return sorted(images)
+
+
+def decodeImage(fileHandle):
+    data = np.frombuffer(fileHandle.read(), dtype=np.uint8)
+    image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError('cannot decode image')
+    return image
+
+
+class BatchFeatureExtractor:
+    """
+    Runs ImageFeatureExtractor on the images of the collection and writes
+    features, boxes and scores into the packed store
+    """
+
+    def __init__(self, featureExtractor, workers=4, depth=16):
+        """
+        :param featureExtractor: feature.image.ImageFeatureExtractor
+        :param workers: int
+            number of threads decoding images
+        :param depth: int
+            maximum number of images decoded ahead
+        """
+        self.featureExtractor = featureExtractor
+        self.workers = workers
+        self.depth = depth
+        self.logger = logging.getLogger('BatchFeatureExtractor')
+
+    def extract(self, folderOrZip, writer, images=None):
+        """
+        :param folderOrZip: str
+            folder or zip archive with images
+        :param writer: feature.store.PackedFeatureWriter
+        :param images: List[Tuple[int, str]]
+            image ids and file names, all images of folderOrZip by default
+        :return: int
+            number of images written
+        """
+        if images is None:
+            images = listImages(folderOrZip)
+        written = 0
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = collections.deque()
+
+            def submit(image):
+                imageId, name = image
+                pending.append((imageId, name, executor.submit(
+                    loadDataFromZipOrFolder, folderOrZip, name, decodeImage)))
+
+            images = iter(images)
+            for image in itertools.islice(images, self.depth):
+                submit(image)
+            while pending:
+                imageId, name, future = pending.popleft()
+                nextImage = next(images, None)
+                if nextImage is not None:
+                    submit(nextImage)
+                try:
+                    image = future.result()
+                    features, boxes, scores = self.featureExtractor.detect(image)
+                    # writer rejects duplicate image ids with ValueError
+                    writer.add(imageId, features, boxes=boxes, scores=scores)
+                except (ValueError, KeyError, OSError, zipfile.BadZipFile) as e:
+                    self.logger.error('skipping %s: %s', name, e)
+                    continue
+                written += 1
+                if written % 100 == 0:
+                    self.logger.info('%s images, %.1f images/s', written,
+                                     written / (time.perf_counter() - start))
+        return written
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Extract features of images into packed store')
+    parser.add_argument('images', type=str, help='folder or zip archive with images')
+    parser.add_argument('output', type=str, help='output file')
+    parser.add_argument('--prototxt', type=str, required=True,
+                        help='network definition')
+    parser.add_argument('--caffemodel', type=str, required=True,
+                        help='network weights')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='number of threads decoding images')
+    parser.add_argument('--depth', type=int, default=16,
+                        help='maximum number of images decoded ahead')
+    parser.add_argument('--dtype', type=str, default='float32', choices=['float32', 'float16'],
+                        help='type to store features')
+    return parser.parse_args()
+
+
+def main():
+    from feature.image import ImageFeatureExtractor
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    extractor = ImageFeatureExtractor(args.prototxt, args.caffemodel)
+    with PackedFeatureWriter(args.output, args.dtype) as writer:
+        written = BatchFeatureExtractor(extractor, args.workers, args.depth).extract(
+            args.images, writer)
+    print('{0} images written to {1}'.format(written, args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Cache of image features keyed by the content of the encoded image
+
+Key is a digest of the raw image bytes, so cache hit skips both image
+decoding and feature extraction. Features are kept in memory within a byte
+budget and optionally in the sqlite database which can be shared by
+several processes.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from cache import LruCache
+
+
+def imageDigest(imageData):
+    """
+    :param imageData: bytes
+        encoded image
+    :return: str
+        content hash of the image
+    """
+    return hashlib.sha256(imageData).hexdigest()
+
+
+def featuresSize(value):
+    features, boxes = value
+    return features.nbytes + boxes.nbytes
+
+
+class SqliteFeatureStore:
+    """
+    On disk feature storage, entries which were not accessed for the longest
+    time are removed when the total size exceeds maxBytes
+    """
+
+    def __init__(self, path, maxBytes=None):
+        self.path = path
+        self.maxBytes = maxBytes
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                                          isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS features ('
+                                'key TEXT PRIMARY KEY, '
+                                'num_boxes INTEGER, '
+                                'features BLOB, '
+                                'boxes BLOB, '
+                                'size INTEGER, '
+                                'accessed REAL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS features_accessed '
+                                'ON features (accessed)')
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute('SELECT num_boxes, features, boxes FROM features '
+                                          'WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute('UPDATE features SET accessed = ? WHERE key = ?',
+                                    (time.time(), key))
+        numBoxes, features, boxes = row
+        features = np.frombuffer(features, dtype=np.float32).reshape(numBoxes, -1)
+        boxes = np.frombuffer(boxes, dtype=np.float32).reshape(numBoxes, 4)
+        return features, boxes
+
+    def put(self, key, features, boxes):
+        size = features.nbytes + boxes.nbytes
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?, ?)',
+                                    (key, len(features), features.tobytes(), boxes.tobytes(),
+                                     size, time.time()))
+            if self.maxBytes is not None:
+                self.evict()
+
+    def evict(self):
+        total, = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM features').fetchone()
+        if total <= self.maxBytes:
+            return
+        excess = total - self.maxBytes
+        removed = 0
+        for key, size in self.connection.execute('SELECT key, size FROM features '
+                                                 'ORDER BY accessed').fetchall():
+            self.connection.execute('DELETE FROM features WHERE key = ?', (key,))
+            removed += size
+            if removed >= excess:
+                break
+
+    def close(self):
+        self.connection.close()
+
+
+class FeatureCache:
+    """
+    Two level cache of image features: in-process LRU cache bounded by
+    number of bytes and optional sqlite store
+    """
+
+    def __init__(self, maxBytes, path=None, diskMaxBytes=None):
+        """
+        :param maxBytes: int
+            memory budget for features and bounding boxes
+        :param path: str
+            path to the sqlite database, None to keep features only in memory
+        :param diskMaxBytes: int
+            budget for the sqlite database, None means unbounded
+        """
+        self.memory = LruCache(maxBytes, getsizeof=featuresSize)
+        self.disk = SqliteFeatureStore(path, diskMaxBytes) if path is not None else None
+        self.diskHits = 0
+        self.logger = logging.getLogger('FeatureCache')
+
+    def get(self, key):
+        """
+        :param key: str
+            image digest
+        :return: Tuple[numpy.ndarray, numpy.ndarray] or None
+            features and bounding boxes, arrays should not be modified
+        """
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return value
+        try:
+            value = self.disk.get(key)
+        except sqlite3.Error as e:
+            self.logger.warning('cannot load features from disk: %s', e)
+            return None
+        if value is not None:
+            self.diskHits += 1
+            self.memory.put(key, value)
+        return value
+
+    def put(self, key, features, boxes):
+        features = np.asarray(features, dtype=np.float32)
+        boxes = np.asarray(boxes, dtype=np.float32)
+        self.memory.put(key, (features, boxes))
+        if self.disk is not None:
+            try:
+                self.disk.put(key, features, boxes)
+            except sqlite3.Error as e:
+                self.logger.warning('cannot store features on disk: %s', e)
+        return features, boxes
+
+    def getOrCompute(self, key, compute):
+        """
+        Return cached features of the image or compute and cache them
+
+        :param key: str
+            image digest, see imageDigest()
+        :param compute: Callable[[], Tuple[features, boxes]]
+            extracts features from the image
+        :return: Tuple[numpy.ndarray, numpy.ndarray]
+        """
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, *compute())
+        return value
+
+    def cache_info(self):
+        return self.memory.cache_info()
@@ -7,11 +7,11 @@ import cv2
 import caffe
 import torch
 from fast_rcnn.test import im_detect, _get_blobs
-from fast_rcnn.nms_wrapper import nms
 from fast_rcnn.config import cfg
 
 from util import *
 from interface import FeatureExtractor
+from feature.nms import maxConfidence
 
 
 def numpyImageToBRG(rgb):
@@ -98,42 +98,48 @@ class ImageFeatureExtractor(FeatureExtractor):
         image = self.loadImageByFileName(imagePath)
         return self.getFeaturesByBRGImage(image)
 
-    @array_cache
-    def getFeaturesByBRGImage(self, image):
+    def selectBoxes(self, max_conf):
         """
-        Compute features for regions in the image
+        :return: numpy.array
+            indexes of the boxes which confidence is above conf_thresh,
+            number of boxes is between MIN_BOXES and MAX_BOXES
+        """
+        keep_boxes = np.where(max_conf >= self.conf_thresh)[0]
+        if len(keep_boxes) < self.MIN_BOXES:
+            keep_boxes = np.argsort(max_conf)[::-1][:self.MIN_BOXES]
+        elif len(keep_boxes) > self.MAX_BOXES:
+            keep_boxes = np.argsort(max_conf)[::-1][:self.MAX_BOXES]
+        return keep_boxes
+
+    def detect(self, image):
+        """
+        Compute features, coordinates and confidences of the best regions,
+        nms of all classes is done at once, see feature/test_nms.py for
+        comparison with nms of each class
         :param image: numpy.array
-        :return: tuple(list[features], list[bounding boxes])
+            BGR image
+        :return: tuple(numpy.array[features], numpy.array[bounding boxes], numpy.array[scores])
         """
         scores, boxes, attr_scores, rel_scores = im_detect(self.net, image)
-        
         # Keep the original boxes, don't worry about the regresssion bbox outputs
         rois = self.net.blobs['rois'].data.copy()
         # unscale back to raw image space
         _, im_scales = _get_blobs(image, None)
-    
         cls_boxes = rois[:, 1:5] / im_scales[0]
-        cls_prob = self.net.blobs['cls_prob'].data
-        pool5 = self.net.blobs['pool5_flat'].data
-    
-        # Keep only the best detections
-        max_conf = np.zeros((rois.shape[0]))
-        for cls_ind in range(1,cls_prob.shape[1]):
-            cls_scores = scores[:, cls_ind]
-            dets = np.hstack((cls_boxes, cls_scores[:, np.newaxis])).astype(np.float32)
-            keep = np.array(nms(dets, cfg.TEST.NMS))
-            max_conf[keep] = np.where(cls_scores[keep] > max_conf[keep], cls_scores[keep], max_conf[keep])
-
+        num_classes = self.net.blobs['cls_prob'].data.shape[1]
+        max_conf = maxConfidence(cls_boxes, scores[:, :num_classes], cfg.TEST.NMS)
+        keep_boxes = self.selectBoxes(max_conf)
+        # pool5 blob is reused by the network, so features are copied once
+        features = np.array(self.net.blobs['pool5_flat'].data[keep_boxes], dtype=np.float32)
+        return features, cls_boxes[keep_boxes], max_conf[keep_boxes]
 
-        keep_boxes = np.where(max_conf >= self.conf_thresh)[0]
-
-        if len(keep_boxes) < self.MIN_BOXES:
-            keep_boxes = np.argsort(max_conf)[::-1][:self.MIN_BOXES]
-        elif len(keep_boxes) > self.MAX_BOXES:
-            keep_boxes = np.argsort(max_conf)[::-1][:self.MAX_BOXES]
-        
-        features = []
-        for box in pool5[keep_boxes]:
-            features.append(box.tolist())
-        
-        return features, cls_boxes[keep_boxes]
+    @array_cache
+    def getFeaturesByBRGImage(self, image):
+        """
+        Compute features for regions in the image
+        :param image: numpy.array
+        :return: tuple(numpy.array[features], numpy.array[bounding boxes])
+            bounding boxes x features matrix and bounding boxes coordinates
+        """
+        features, boxes, _ = self.detect(image)
+        return features, boxes
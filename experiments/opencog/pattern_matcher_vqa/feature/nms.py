@@ -0,0 +1,85 @@
+"""
+Non maximum suppression of all classes at once
+
+Detector returns the same boxes for each class, so the overlap of each pair
+of boxes is computed once and greedy suppression is run for all classes in
+lockstep: step r takes the r-th best box of each class and suppresses its
+overlaps in the classes where it is not suppressed itself. Result is the
+same as running nms for each class separately.
+
+As cpu_nms of fast_rcnn, which feature extraction used before (GPU nms is
+turned off by the bottom-up-attention patches), a box is suppressed when
+its overlap with a better box is greater than or equal to the threshold.
+"""
+
+import numpy as np
+
+
+def boxOverlaps(boxes):
+    """
+    :param boxes: numpy.ndarray
+        N x 4 boxes, x1, y1, x2, y2
+    :return: numpy.ndarray
+        N x N intersection over union, float32
+    """
+    boxes = np.asarray(boxes, dtype=np.float32)
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    one = np.float32(1)
+    areas = (x2 - x1 + one) * (y2 - y1 + one)
+    width = np.maximum(np.float32(0), np.minimum(x2[:, np.newaxis], x2)
+                       - np.maximum(x1[:, np.newaxis], x1) + one)
+    height = np.maximum(np.float32(0), np.minimum(y2[:, np.newaxis], y2)
+                        - np.maximum(y1[:, np.newaxis], y1) + one)
+    intersection = width * height
+    return intersection / (areas[:, np.newaxis] + areas - intersection)
+
+
+def classwiseNms(boxes, scores, threshold):
+    """
+    :param boxes: numpy.ndarray
+        N x 4 boxes shared by all classes
+    :param scores: numpy.ndarray
+        N x C scores of the boxes for each class
+    :param threshold: float
+        box is suppressed if its overlap with a better box of the class is
+        greater than or equal to threshold
+    :return: numpy.ndarray
+        N x C boolean mask of the boxes kept for each class
+    """
+    # cpu_nms compares float32 overlaps with double threshold
+    suppresses = boxOverlaps(boxes).astype(np.float64) >= threshold
+    scoresByClass = np.ascontiguousarray(np.asarray(scores, dtype=np.float32).T)
+    # same ordering as nms of a single class, best box first
+    order = np.argsort(scoresByClass, axis=1)[:, ::-1]
+    classes, numBoxes = scoresByClass.shape
+    suppressed = np.zeros((classes, numBoxes), dtype=bool)
+    keep = np.zeros((classes, numBoxes), dtype=bool)
+    allClasses = np.arange(classes)
+    for rank in range(numBoxes):
+        candidates = order[:, rank]
+        active = ~suppressed[allClasses, candidates]
+        activeClasses = allClasses[active]
+        activeCandidates = candidates[active]
+        keep[activeClasses, activeCandidates] = True
+        suppressed[activeClasses] |= suppresses[activeCandidates]
+    return keep.T
+
+
+def maxConfidence(boxes, scores, threshold):
+    """
+    Maximum score of each box over the classes in which the box survives
+    nms, background class 0 is skipped
+
+    :param boxes: numpy.ndarray
+        N x 4 boxes shared by all classes
+    :param scores: numpy.ndarray
+        N x C class scores including background
+    :return: numpy.ndarray
+        N maximum confidences, float64
+    """
+    scores = np.asarray(scores, dtype=np.float32)[:, 1:]
+    if scores.shape[1] == 0:
+        return np.zeros(len(scores))
+    keep = classwiseNms(boxes, scores, threshold)
+    keptScores = np.where(keep, scores, np.float32(0))
+    return np.maximum(keptScores.max(axis=1), 0).astype(np.float64)
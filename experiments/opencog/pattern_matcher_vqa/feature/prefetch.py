@@ -0,0 +1,86 @@
+"""
+Loading features of the upcoming images in background threads
+"""
+
+import concurrent.futures
+import logging
+import threading
+
+from interface import FeatureExtractor
+
+
+class PrefetchingFeatureExtractor(FeatureExtractor):
+    """
+    Feature extractor which loads features of the scheduled images on the
+    thread pool, so reading and parsing files overlaps with answering
+    questions
+
+    Images are scheduled by schedule() in the order they are requested by
+    getFeaturesByImageId(), image scheduled several times is loaded once.
+    ImageFeatureExtractor runs the network in the calling thread, only
+    image files are loaded in background for it.
+    """
+
+    def __init__(self, featureExtractor, workers=4, depth=32):
+        """
+        :param featureExtractor: interface.FeatureExtractor
+        :param workers: int
+            number of loading threads
+        :param depth: int
+            number of questions to read ahead
+        """
+        self.featureExtractor = featureExtractor
+        self.depth = depth
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        # imageId -> [future, number of scheduled requests]
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger('PrefetchingFeatureExtractor')
+        # network is not thread safe, prefetch only images for it
+        self.loadsImages = hasattr(featureExtractor, 'getImageFileName')
+
+    def load(self, imageId):
+        if self.loadsImages:
+            return self.featureExtractor.loadImageByFileName(
+                self.featureExtractor.getImageFileName(imageId))
+        return self.featureExtractor.getFeaturesByImageId(imageId)
+
+    def schedule(self, imageId):
+        with self.lock:
+            item = self.pending.get(imageId)
+            if item is None:
+                self.pending[imageId] = [self.executor.submit(self.load, imageId), 1]
+            else:
+                item[1] += 1
+
+    def release(self, imageId):
+        """
+        Forget one scheduled request of the image, it is called instead of
+        getFeaturesByImageId() if features are taken from elsewhere
+
+        :return: concurrent.futures.Future
+            loading of the image, None if image was not scheduled
+        """
+        with self.lock:
+            item = self.pending.get(imageId)
+            if item is None:
+                return None
+            item[1] -= 1
+            if item[1] == 0:
+                del self.pending[imageId]
+            return item[0]
+
+    def getFeaturesByImageId(self, imageId):
+        future = self.release(imageId)
+        loaded = self.load(imageId) if future is None else future.result()
+        if self.loadsImages:
+            return self.featureExtractor.getFeaturesByBRGImage(loaded)
+        return loaded
+
+    def getFeaturesByImage(self, image):
+        return self.featureExtractor.getFeaturesByImage(image)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        with self.lock:
+            self.pending.clear()
@@ -0,0 +1,311 @@
+"""
+Packed store of precalculated bounding box features
+
+Features of all images are kept in one file as a contiguous rows x 2048
+array, rows of each image follow each other. The file is memory mapped, so
+loading features of the image returns a view without parsing or copying.
+
+Layout:
+    8 bytes   magic 'VQAFEATS'
+    4 bytes   format version, little endian uint32
+    4 bytes   header length, little endian uint32
+    8 bytes   header offset, little endian uint64
+    rows      raw little endian float32 or float16 features starting at
+              DATA_OFFSET
+    arrays    optional rows x 4 float32 boxes and rows float32 scores of
+              the boxes, each aligned to 64 bytes
+    header    json with dtype, number of columns, offsets of the arrays and
+              [imageId, first row, number of rows] of each image
+
+Header is written after the rows, so the store is filled in one pass.
+
+Convert parsed features folder or zip:
+    python3 -m feature.store <folder or zip> <output file> \
+        --prefix val2014_parsed_features/COCO_val2014_
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import struct
+import zipfile
+
+import numpy as np
+
+from interface import FeatureExtractor
+
+
+MAGIC = b'VQAFEATS'
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct('<8sIIQ')
+DATA_OFFSET = 64
+ALIGNMENT = 64
+# leading columns of parsed features: roi x, y, width, height and 6
+# spatial features, they are not used by the pipeline
+SPATIAL_COLUMNS = 10
+
+
+def parseTsvFeatures(fileHandle):
+    """
+    Parse file from the parsed features folder
+
+    :param fileHandle: binary file with a header line and one line of
+        whitespace separated numbers per bounding box
+    :return: numpy.ndarray
+        bounding boxes x features, float32
+    """
+    next(fileHandle)
+    lines = fileHandle.read().split(b'\n')
+    lines = [line for line in lines if line.strip()]
+    values = np.array(b' '.join(lines).split(), dtype=np.float32)
+    return values.reshape(len(lines), -1)[:, SPATIAL_COLUMNS:]
+
+
+class PackedFeatureWriter:
+    """
+    Appends features of images to the packed store
+    """
+
+    def __init__(self, path, dtype=np.float32):
+        """
+        :param path: str
+            output file
+        :param dtype: numpy.dtype
+            float32 or float16
+        """
+        self.path = path
+        self.dtype = np.dtype(dtype).newbyteorder('<')
+        self.columns = None
+        self.rows = 0
+        self.images = []
+        self.imageIds = set()
+        self.boxes = []
+        self.scores = []
+        self.file = open(path, 'wb')
+        self.file.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, 0))
+        self.file.seek(DATA_OFFSET)
+
+    def add(self, imageId, features, boxes=None, scores=None):
+        """
+        :param imageId: int
+        :param features: numpy.ndarray
+            bounding boxes x features
+        :param boxes: numpy.ndarray
+            bounding boxes x 4 coordinates, either all images or none
+            have boxes
+        :param scores: numpy.ndarray
+            bounding boxes detection scores, either all images or none
+            have scores
+        """
+        imageId = int(imageId)
+        if imageId in self.imageIds:
+            raise ValueError('features of image {0} are already added'.format(imageId))
+        for name, values, collected in (('boxes', boxes, self.boxes),
+                                        ('scores', scores, self.scores)):
+            if self.images and (values is not None) != bool(collected):
+                raise ValueError('{0} should be passed for all images or for none'
+                                 .format(name))
+            if values is not None and len(values) != len(features):
+                raise ValueError('image {0} has {1} {2} for {3} bounding boxes'
+                                 .format(imageId, len(values), name, len(features)))
+        features = np.ascontiguousarray(features, dtype=self.dtype)
+        if self.columns is None:
+            self.columns = features.shape[1]
+        elif features.shape[1] != self.columns:
+            raise ValueError('image {0} has {1} features per bounding box, expected {2}'
+                             .format(imageId, features.shape[1], self.columns))
+        self.file.write(features.tobytes())
+        if boxes is not None:
+            self.boxes.append(np.asarray(boxes, dtype='<f4').reshape(-1, 4))
+        if scores is not None:
+            self.scores.append(np.asarray(scores, dtype='<f4').reshape(-1))
+        self.images.append([imageId, self.rows, len(features)])
+        self.imageIds.add(imageId)
+        self.rows += len(features)
+
+    def writeArray(self, arrays, shape):
+        offset = (self.file.tell() + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+        self.file.seek(offset)
+        for array in arrays:
+            self.file.write(array.tobytes())
+        return {'dtype': '<f4', 'shape': shape, 'offset': offset}
+
+    def close(self):
+        arrays = {}
+        if self.boxes:
+            arrays['boxes'] = self.writeArray(self.boxes, [self.rows, 4])
+        if self.scores:
+            arrays['scores'] = self.writeArray(self.scores, [self.rows])
+        header = json.dumps({'dtype': self.dtype.str,
+                             'columns': self.columns or 0,
+                             'rows': self.rows,
+                             'arrays': arrays,
+                             'images': self.images}).encode('utf-8')
+        headerOffset = self.file.tell()
+        self.file.write(header)
+        self.file.seek(0)
+        self.file.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header), headerOffset))
+        self.file.close()
+
+    def abort(self):
+        """
+        Close and remove the incomplete store, so it cannot be mistaken for
+        a store of all images
+        """
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class PackedFeatureStore(FeatureExtractor):
+    """
+    Feature extractor which returns features from the packed store as
+    views of the memory mapped file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            magic, version, headerLength, headerOffset = PREAMBLE.unpack(
+                file.read(PREAMBLE.size))
+            if magic != MAGIC:
+                raise ValueError('{0} is not a packed features file'.format(path))
+            if version != FORMAT_VERSION:
+                raise ValueError('{0} has unsupported format version {1}'
+                                 .format(path, version))
+            file.seek(headerOffset)
+            header = json.loads(file.read(headerLength).decode('utf-8'))
+        self.rowsByImageId = {imageId: (start, start + count)
+                              for imageId, start, count in header['images']}
+        self.features = np.memmap(path, dtype=np.dtype(header['dtype']), mode='r',
+                                  offset=DATA_OFFSET,
+                                  shape=(header['rows'], header['columns']))
+        self.arrays = {name: np.memmap(path, dtype=np.dtype(description['dtype']), mode='r',
+                                       offset=description['offset'],
+                                       shape=tuple(description['shape']))
+                       for name, description in header.get('arrays', {}).items()}
+
+    def __contains__(self, imageId):
+        return int(imageId) in self.rowsByImageId
+
+    def __len__(self):
+        return len(self.rowsByImageId)
+
+    def imageIds(self):
+        return list(self.rowsByImageId.keys())
+
+    def rows(self, imageId):
+        try:
+            return self.rowsByImageId[int(imageId)]
+        except KeyError:
+            raise KeyError('no features for image {0} in {1}'.format(imageId, self.path))
+
+    def getFeaturesByImageId(self, imageId):
+        """
+        :return: numpy.ndarray
+            bounding boxes x features view of the store
+        """
+        start, end = self.rows(imageId)
+        return self.features[start:end]
+
+    def getBoxesByImageId(self, imageId):
+        """
+        :return: numpy.ndarray
+            bounding boxes x 4 coordinates, None if store has no boxes
+        """
+        if 'boxes' not in self.arrays:
+            return None
+        start, end = self.rows(imageId)
+        return self.arrays['boxes'][start:end]
+
+    def getScoresByImageId(self, imageId):
+        """
+        :return: numpy.ndarray
+            detection scores of bounding boxes, None if store has no scores
+        """
+        if 'scores' not in self.arrays:
+            return None
+        start, end = self.rows(imageId)
+        return self.arrays['scores'][start:end]
+
+
+def listTsvFeatures(names, prefix):
+    """
+    :return: List[Tuple[int, str]]
+        image id and name of each file with features
+    """
+    pattern = re.compile(re.escape(prefix) + r'(\d+)\.tsv$')
+    result = []
+    for name in names:
+        match = pattern.match(name)
+        if match is not None:
+            result.append((int(match.group(1)), name))
+    return sorted(result)
+
+
+def convertTsvFeatures(folderOrZip, prefix, output, dtype=np.float32):
+    """
+    Convert parsed features folder or zip archive into packed store
+
+    :param folderOrZip: str
+    :param prefix: str
+        prefix of feature files, image id and '.tsv' follow it
+    :param output: str
+        packed store file
+    :return: int
+        number of images converted
+    """
+    logger = logging.getLogger('convertTsvFeatures')
+    with PackedFeatureWriter(output, dtype) as writer:
+        if os.path.isdir(folderOrZip):
+            names = []
+            for directory, _, fileNames in os.walk(folderOrZip):
+                relative = os.path.relpath(directory, folderOrZip)
+                names.extend(os.path.normpath(os.path.join(relative, fileName))
+                             for fileName in fileNames)
+            for imageId, name in listTsvFeatures(names, prefix):
+                with open(os.path.join(folderOrZip, name), 'rb') as file:
+                    writer.add(imageId, parseTsvFeatures(file))
+        else:
+            with zipfile.ZipFile(folderOrZip, 'r') as archive:
+                for imageId, name in listTsvFeatures(archive.namelist(), prefix):
+                    with archive.open(name) as file:
+                        writer.add(imageId, parseTsvFeatures(file))
+        logger.info('%s images, %s bounding boxes are written into %s',
+                    len(writer.images), writer.rows, output)
+        return len(writer.images)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Convert parsed features into packed store')
+    parser.add_argument('features', type=str,
+                        help='parsed features folder or zip archive')
+    parser.add_argument('output', type=str, help='output file')
+    parser.add_argument('--prefix', type=str, default='val2014_parsed_features/COCO_val2014_',
+                        help='prefix of feature files in the folder or archive')
+    parser.add_argument('--dtype', type=str, default='float32', choices=['float32', 'float16'],
+                        help='type to store features')
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    convertTsvFeatures(args.features, args.prefix, args.output, args.dtype)
+
+
+if __name__ == '__main__':
+    main()
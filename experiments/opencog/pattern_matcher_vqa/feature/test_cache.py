@@ -0,0 +1,84 @@
+"""
+Image feature cache tests
+
+Run from pattern_matcher_vqa directory:
+    python3 -m unittest feature.test_cache
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from feature.cache import FeatureCache, SqliteFeatureStore, imageDigest
+
+
+def features(value, numBoxes=3):
+    return (np.full((numBoxes, 8), value, dtype=np.float32),
+            np.full((numBoxes, 4), value, dtype=np.float32))
+
+
+class FeatureCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'features.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_image_digest(self):
+        self.assertEqual(imageDigest(b'image'), imageDigest(b'image'))
+        self.assertNotEqual(imageDigest(b'image'), imageDigest(b'other image'))
+
+    def test_compute_once(self):
+        cache = FeatureCache(10000)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return features(1.0)
+
+        first = cache.getOrCompute('a', compute)
+        second = cache.getOrCompute('a', compute)
+        self.assertEqual(len(calls), 1)
+        self.assertIs(first[0], second[0])
+        self.assertEqual(cache.cache_info().hits, 1)
+
+    def test_memory_budget(self):
+        # each value takes 3 * 8 * 4 + 3 * 4 * 4 = 144 bytes
+        cache = FeatureCache(300)
+        for i in range(3):
+            cache.put(str(i), *features(i))
+        self.assertIsNone(cache.get('0'))
+        self.assertIsNotNone(cache.get('2'))
+        self.assertEqual(cache.cache_info().currsize, 288)
+
+    def test_disk_store(self):
+        cache = FeatureCache(10000, self.path)
+        cache.put('a', *features(2.0))
+        cache.disk.close()
+        # new process has empty memory cache and reads the database
+        cache = FeatureCache(10000, self.path)
+        value = cache.get('a')
+        self.assertEqual(cache.diskHits, 1)
+        np.testing.assert_array_equal(value[0], features(2.0)[0])
+        np.testing.assert_array_equal(value[1], features(2.0)[1])
+        cache.get('a')
+        self.assertEqual(cache.diskHits, 1)
+        cache.disk.close()
+
+    def test_disk_budget(self):
+        store = SqliteFeatureStore(self.path, maxBytes=300)
+        for i in range(3):
+            store.put(str(i), *features(i))
+        self.assertIsNone(store.get('0'))
+        self.assertIsNotNone(store.get('1'))
+        self.assertIsNotNone(store.get('2'))
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+"""
+Compare nms of all classes at once with nms of each class
+
+Run from pattern_matcher_vqa directory:
+    python3 -m unittest feature.test_nms
+Benchmark:
+    python3 -m feature.test_nms
+"""
+
+import time
+import unittest
+
+import numpy as np
+
+from feature.nms import boxOverlaps, classwiseNms, maxConfidence
+
+
+def py_cpu_nms(dets, thresh):
+    """
+    Pure python nms of fast_rcnn/nms/py_cpu_nms.py, boxes with overlap equal
+    to thresh are suppressed as in fast_rcnn/nms/cpu_nms.pyx
+    """
+    x1 = dets[:, 0]
+    y1 = dets[:, 1]
+    x2 = dets[:, 2]
+    y2 = dets[:, 3]
+    scores = dets[:, 4]
+
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+
+        w = np.maximum(0.0, xx2 - xx1 + 1)
+        h = np.maximum(0.0, yy2 - yy1 + 1)
+        inter = w * h
+        ovr = inter / (areas[i] + areas[order[1:]] - inter)
+
+        inds = np.where(ovr.astype(np.float64) < thresh)[0]
+        order = order[inds + 1]
+
+    return keep
+
+
+def referenceMaxConfidence(cls_boxes, scores, thresh):
+    """
+    Loop which was used in ImageFeatureExtractor.getFeaturesByBRGImage
+    """
+    max_conf = np.zeros((cls_boxes.shape[0]))
+    for cls_ind in range(1, scores.shape[1]):
+        cls_scores = scores[:, cls_ind]
+        dets = np.hstack((cls_boxes, cls_scores[:, np.newaxis])).astype(np.float32)
+        keep = np.array(py_cpu_nms(dets, thresh))
+        max_conf[keep] = np.where(cls_scores[keep] > max_conf[keep], cls_scores[keep], max_conf[keep])
+    return max_conf
+
+
+def selectBoxes(max_conf, conf_thresh=0.2, min_boxes=36, max_boxes=36):
+    keep_boxes = np.where(max_conf >= conf_thresh)[0]
+    if len(keep_boxes) < min_boxes:
+        keep_boxes = np.argsort(max_conf)[::-1][:min_boxes]
+    elif len(keep_boxes) > max_boxes:
+        keep_boxes = np.argsort(max_conf)[::-1][:max_boxes]
+    return keep_boxes
+
+
+def randomDetections(random, numBoxes, numClasses, width=640, height=480):
+    """
+    :return: Tuple[numpy.ndarray, numpy.ndarray]
+        boxes and softmax scores of the classes, background class included
+    """
+    x1 = random.uniform(0, width - 20, numBoxes)
+    y1 = random.uniform(0, height - 20, numBoxes)
+    x2 = np.minimum(x1 + random.uniform(10, width / 2, numBoxes), width - 1)
+    y2 = np.minimum(y1 + random.uniform(10, height / 2, numBoxes), height - 1)
+    boxes = np.stack([x1, y1, x2, y2], axis=1).astype(np.float32)
+    logits = random.normal(0, 3, (numBoxes, numClasses))
+    scores = np.exp(logits - logits.max(axis=1, keepdims=True))
+    scores /= scores.sum(axis=1, keepdims=True)
+    return boxes, scores.astype(np.float32)
+
+
+class NmsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.random = np.random.RandomState(42)
+
+    def assertSameSelection(self, boxes, scores, thresh=0.3):
+        expected = referenceMaxConfidence(boxes, scores, thresh)
+        actual = maxConfidence(boxes, scores, thresh)
+        np.testing.assert_array_equal(actual, expected)
+        np.testing.assert_array_equal(selectBoxes(actual), selectBoxes(expected))
+
+    def test_overlaps(self):
+        boxes = np.array([[0, 0, 9, 9], [5, 0, 14, 9], [20, 20, 29, 29]], dtype=np.float32)
+        overlaps = boxOverlaps(boxes)
+        np.testing.assert_allclose(overlaps, [[1, 50 / 150, 0],
+                                              [50 / 150, 1, 0],
+                                              [0, 0, 1]], rtol=1e-6)
+
+    def test_overlap_equal_to_threshold(self):
+        # overlap of the boxes is exactly 0.5
+        boxes = np.array([[0, 0, 9, 9], [0, 0, 9, 4]], dtype=np.float32)
+        scores = np.array([[0.1, 0.9], [0.2, 0.8]], dtype=np.float32)
+        self.assertEqual(boxOverlaps(boxes)[0, 1], 0.5)
+        np.testing.assert_array_equal(classwiseNms(boxes, scores[:, 1:], 0.5), [[True], [False]])
+        np.testing.assert_array_equal(classwiseNms(boxes, scores[:, 1:], 0.51), [[True], [True]])
+        self.assertSameSelection(boxes, scores, 0.5)
+        self.assertSameSelection(boxes, scores, 0.51)
+
+    def test_random_detections(self):
+        for numBoxes, numClasses in [(1, 2), (10, 3), (100, 20), (300, 1601)]:
+            boxes, scores = randomDetections(self.random, numBoxes, numClasses)
+            self.assertSameSelection(boxes, scores)
+
+    def test_thresholds(self):
+        boxes, scores = randomDetections(self.random, 100, 50)
+        for thresh in [0.0, 0.3, 0.7, 1.0]:
+            self.assertSameSelection(boxes, scores, thresh)
+
+    def test_clustered_boxes(self):
+        # many heavily overlapping boxes as produced by region proposals
+        centers = self.random.uniform(100, 300, (5, 2))
+        boxes = []
+        for center in centers:
+            for _ in range(20):
+                size = self.random.uniform(40, 60, 2)
+                shift = self.random.normal(0, 3, 2)
+                boxes.append(np.concatenate([center + shift - size / 2, center + shift + size / 2]))
+        boxes = np.array(boxes, dtype=np.float32)
+        _, scores = randomDetections(self.random, len(boxes), 100)
+        self.assertSameSelection(boxes, scores)
+
+    def test_equal_scores(self):
+        boxes, _ = randomDetections(self.random, 50, 2)
+        scores = np.full((50, 10), 0.1, dtype=np.float32)
+        self.assertSameSelection(boxes, scores)
+
+
+def benchmark(numBoxes=300, numClasses=1601, repeat=3):
+    boxes, scores = randomDetections(np.random.RandomState(0), numBoxes, numClasses)
+    for name, function in [('per class loop', referenceMaxConfidence),
+                           ('all classes', maxConfidence)]:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function(boxes, scores, 0.3)
+            times.append(time.perf_counter() - start)
+        print('{0}: {1:.1f} ms ({2} boxes, {3} classes)'.format(
+            name, min(times) * 1000, numBoxes, numClasses))
+
+
+if __name__ == '__main__':
+    benchmark()
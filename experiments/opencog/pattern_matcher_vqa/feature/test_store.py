@@ -0,0 +1,98 @@
+"""
+Packed feature store tests
+
+Run from pattern_matcher_vqa directory:
+    python3 -m unittest feature.test_store
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from feature.store import PackedFeatureWriter, PackedFeatureStore, parseTsvFeatures, \
+    SPATIAL_COLUMNS
+
+
+class PackedFeatureStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.random = np.random.RandomState(0)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'features.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def randomImages(self, count):
+        return [(imageId, self.random.rand(self.random.randint(1, 5), 16).astype(np.float32),
+                 self.random.rand(4 * (imageId + 1), 4).astype(np.float32))
+                for imageId in range(count)]
+
+    def test_round_trip(self):
+        images = self.randomImages(3)
+        with PackedFeatureWriter(self.path) as writer:
+            for imageId, features, _ in images:
+                writer.add(imageId * 10, features)
+        store = PackedFeatureStore(self.path)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(sorted(store.imageIds()), [0, 10, 20])
+        for imageId, features, _ in images:
+            self.assertIn(imageId * 10, store)
+            np.testing.assert_array_equal(store.getFeaturesByImageId(imageId * 10), features)
+        self.assertIsNone(store.getBoxesByImageId(0))
+        self.assertIsNone(store.getScoresByImageId(0))
+        with self.assertRaises(KeyError):
+            store.getFeaturesByImageId(5)
+
+    def test_boxes_and_scores(self):
+        with PackedFeatureWriter(self.path, np.float16) as writer:
+            for imageId in range(3):
+                features = self.random.rand(imageId + 2, 16)
+                boxes = self.random.rand(imageId + 2, 4)
+                scores = self.random.rand(imageId + 2)
+                writer.add(imageId, features, boxes=boxes, scores=scores)
+        store = PackedFeatureStore(self.path)
+        np.testing.assert_allclose(store.getFeaturesByImageId(2), features, rtol=1e-3)
+        self.assertEqual(store.getFeaturesByImageId(2).dtype, np.float16)
+        np.testing.assert_allclose(store.getBoxesByImageId(2), boxes, rtol=1e-6)
+        np.testing.assert_allclose(store.getScoresByImageId(2), scores, rtol=1e-6)
+
+    def test_invalid_images(self):
+        with PackedFeatureWriter(self.path) as writer:
+            writer.add(1, np.zeros((2, 16)), boxes=np.zeros((2, 4)))
+            with self.assertRaises(ValueError):
+                writer.add(1, np.zeros((2, 16)), boxes=np.zeros((2, 4)))
+            with self.assertRaises(ValueError):
+                writer.add(2, np.zeros((2, 8)), boxes=np.zeros((2, 4)))
+            with self.assertRaises(ValueError):
+                writer.add(3, np.zeros((2, 16)), boxes=np.zeros((3, 4)))
+            with self.assertRaises(ValueError):
+                writer.add(4, np.zeros((2, 16)))
+        self.assertEqual(len(PackedFeatureStore(self.path)), 1)
+
+    def test_interrupted_writer_leaves_no_store(self):
+        with self.assertRaises(KeyboardInterrupt):
+            with PackedFeatureWriter(self.path) as writer:
+                writer.add(1, np.zeros((2, 16)))
+                raise KeyboardInterrupt()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_wrong_file(self):
+        with open(self.path, 'wb') as file:
+            file.write(b'x' * 64)
+        with self.assertRaises(ValueError):
+            PackedFeatureStore(self.path)
+
+    def test_parse_tsv(self):
+        values = self.random.rand(3, SPATIAL_COLUMNS + 5)
+        lines = ['header'] + [' '.join(str(value) for value in row) for row in values]
+        features = parseTsvFeatures(io.BytesIO('\n'.join(lines).encode() + b'\n'))
+        np.testing.assert_allclose(features, values[:, SPATIAL_COLUMNS:], rtol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
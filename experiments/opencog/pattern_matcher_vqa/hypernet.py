@@ -1,10 +1,12 @@
 import logging
+import numpy
 import torch
 from torch.autograd import Variable
 
 from hypernetimpl.dataset import Dictionary
 from hypernetimpl.model import build_baseline_model
 from interface import NeuralNetworkRunner
+from cache import LruCache
 
 #pathToDictionary = '/mnt/fileserver/shared/datasets/at-on-at-data/dictionary.pkl'
 #pathToGlove = '/mnt/fileserver/shared/datasets/at-on-at-data/glove6b_init_300d.npy'
@@ -12,11 +14,17 @@ from interface import NeuralNetworkRunner
 
 class HyperNetNeuralNetworkRunner(NeuralNetworkRunner):
     
-    def __init__(self, pathToDictionary, pathToGlove, pathToModel):
+    def __init__(self, pathToDictionary, pathToGlove, pathToModel,
+                 questionVectorCacheSize=4096):
+        """
+        :param questionVectorCacheSize: int
+            number of known words which q_fc_net outputs are kept
+        """
         self.logger = logging.getLogger('HyperNetNeuralNetworkRunner')
         self.device = device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.dictionary = Dictionary.load_from_file(pathToDictionary)
         self.model = self.loadModel(pathToGlove, pathToModel)
+        self.questionVectors = LruCache(questionVectorCacheSize)
 
     def loadModel(self, pathToGlove, pathToModel):
         model = build_baseline_model(19901, [300, 1280], [2048, 1280], 
@@ -32,17 +40,76 @@ class HyperNetNeuralNetworkRunner(NeuralNetworkRunner):
         return model
 
     def getTensorByWord(self, word):
-        try:
-            index = self.dictionary.idx2word.index(word.lower())
-            tensor = torch.LongTensor([index])
-            return Variable(tensor).to(self.device)
-        except ValueError:
+        index = self.dictionary.word2idx.get(word.lower())
+        if index is None:
             return None
+        tensor = torch.LongTensor([index])
+        return Variable(tensor).to(self.device)
 
-    def runNeuralNetwork(self, features, word):
+    @property
+    def network(self):
+        # DataParallel keeps the model in module attribute
+        return getattr(self.model, 'module', self.model)
+
+    def getQuestionVector(self, word):
+        """
+        Output of q_fc_net for the word, it doesn't depend on the bounding
+        box so it is computed once per word
+
+        :return: torch.Tensor or None if word is unknown
+        """
+        vector = self.questionVectors.get(word)
+        if vector is not None:
+            return vector
         wordTensor = self.getTensorByWord(word)
         if wordTensor is None:
+            # unknown words are not cached, otherwise the cache would
+            # be filled by typos and rare tokens
             self.logger.debug("Unknown word: %s", word)
-            return torch.zeros(1);
-        featuresTensor = torch.Tensor(features)
-        return self.model(wordTensor, featuresTensor)
\ No newline at end of file
+            return None
+        with torch.no_grad():
+            vector = self.network.q_fc_net(self.network.w_embed(wordTensor))[0]
+        self.questionVectors.put(word, vector)
+        return vector
+
+    def score(self, words, boxes):
+        """
+        Compute probabilities of all words for all bounding boxes
+
+        v_fc_net is run once for all bounding boxes, then all pairs are
+        passed through prob_net in one batch.
+
+        :param words: List[str]
+        :param boxes: numpy.ndarray
+            bounding boxes x features
+        :return: Tuple[numpy.ndarray, numpy.ndarray]
+            words x bounding boxes probabilities and mask of known words,
+            probabilities of unknown words are zeros
+        """
+        vectors = [self.getQuestionVector(word) for word in words]
+        known = numpy.array([vector is not None for vector in vectors], dtype=bool)
+        scores = numpy.zeros((len(words), len(boxes)), dtype=numpy.float32)
+        if not known.any():
+            return scores, known
+        with torch.no_grad():
+            boxesTensor = torch.as_tensor(numpy.asarray(boxes, dtype=numpy.float32),
+                                          device=self.device)
+            visual = self.network.v_fc_net(boxesTensor)
+            question = torch.stack([vector for vector in vectors if vector is not None])
+            joint = question[:, None, :] * visual[None, :, :]
+            probability = self.network.prob_net(joint.view(-1, joint.shape[-1]))
+            scores[known] = probability.view(len(question), len(boxes)).cpu().numpy()
+        return scores, known
+
+    def runNeuralNetwork(self, features, word):
+        scores, _ = self.score([word], [features])
+        return torch.tensor(scores[0])
+
+    def runNeuralNetworkBatch(self, features, word):
+        return self.score([word], features)[0][0]
+
+    def runNeuralNetworkWords(self, features, words):
+        scores, _ = self.score(words, features)
+        # unknown words get zero probabilities with full certainty, the same
+        # as runNeuralNetwork and runNeuralNetworkBatch return for them
+        return scores, numpy.ones(len(words), dtype=bool)
@@ -1,11 +1,26 @@
 from abc import ABC
 
+import numpy
+
 
 class NeuralNetworkRunner(ABC):
 
     def runNeuralNetwork(self, features, word):
         pass
 
+    def runNeuralNetworkBatch(self, features, word):
+        """
+        Run network for the word on several bounding boxes at once
+
+        :param features: numpy.ndarray
+            bounding boxes x features
+        :param word: str
+        :return: numpy.ndarray
+            one score per bounding box
+        :raises NoModelException: if there is no model for the word
+        """
+        return numpy.array([float(self.runNeuralNetwork(row, word).item()) for row in features])
+
 
 class AnswerHandler(ABC):
 
@@ -31,7 +46,23 @@ class ChainAnswerHandler(AnswerHandler):
         self.notifyAll(lambda handler: handler.onAnswer(record, answer))
 
     def notifyAll(self, methodToCall):
-        map(methodToCall, answerHandlerList)
+        for handler in self.answerHandlerList:
+            methodToCall(handler)
+
+
+class QuestionProcessingListener(ABC):
+    """
+    Receives intermediate results of question processing
+    """
+
+    def onFeatures(self, features, boxes):
+        pass
+
+    def onRelexFormula(self, relexFormula, questionType):
+        pass
+
+    def onQuery(self, query):
+        pass
 
 
 class FeatureExtractor(ABC):
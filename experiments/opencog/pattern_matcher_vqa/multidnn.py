@@ -1,5 +1,6 @@
 import sys
 import logging
+import numpy
 import torch
 import torch.nn.functional as F
 
@@ -29,3 +30,11 @@ class NetsVocabularyNeuralNetworkRunner(NeuralNetworkRunner):
             return torch.zeros(1)
         # TODO: F.sigmoid should part of NN
         return F.sigmoid(model(torch.Tensor(features)))
+
+    def runNeuralNetworkBatch(self, features, word):
+        model = self.netsVocabulary.getModelByWord(word)
+        if model is None:
+            self.logger.debug('no model found, return FALSE')
+            return numpy.zeros(len(features))
+        with torch.no_grad():
+            return F.sigmoid(model(torch.as_tensor(features, dtype=torch.float32))).view(-1).cpu().numpy()
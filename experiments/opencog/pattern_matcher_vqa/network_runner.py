@@ -1,5 +1,8 @@
 """
 This module is used to pass around neural network runner
+and scores of the words for the current image
 """
 
 runner = None
+
+scores = None
@@ -3,18 +3,33 @@ import logging
 import datetime
 import argparse
 import abc
+import collections
+import contextlib
+import functools
+import itertools
 
 import jpype
 import numpy as np
 import opencog.logger
 import network_runner
+import stages
 
 from opencog.atomspace import TruthValue
 from opencog.type_constructors import *
 from opencog.scheme_wrapper import *
+try:
+    # keeps references to numpy arrays in the atomspace without copying
+    from opencog.neuralnet import PtrValue, valueToPtrValue
+except ImportError:
+    PtrValue = None
 
 from util import *
-from interface import FeatureExtractor, AnswerHandler, NoModelException
+from interface import FeatureExtractor, AnswerHandler, NoModelException, QuestionProcessingListener
+from cache import LruCache, arrayDigest
+from atomspace_layers import ImageLayerCache
+from question_converter import CachingQuestionConverter
+from word_scores import WordScoreTable, groundedFormulaWords, groundedFormulaRelations, \
+    boundingBoxIndex, bestBoxesByWords
 from multidnn import NetsVocabularyNeuralNetworkRunner
 from hypernet import HyperNetNeuralNetworkRunner
 from splitnet.splitmultidnnmodel import SplitMultidnnRunner
@@ -24,6 +39,11 @@ sys.path.insert(0, currentDir(__file__) + '/../question2atomese')
 from record import Record
 
 logger = logging.getLogger(__name__)
+# strengths of results which differ less are compared by the second strength
+STRENGTH_TOLERANCE = 0.000001
+# templates answered from word scores of the image when pattern matcher is used
+YES_NO_PREDADJ = '_predadj(A, B)'
+OTHER_DET_OBJ_SUBJ = '_det(A, B);_obj(C, D);_subj(C, A)'
 ### Reusable code (no dependency on global vars)
 
 def initializeRootAndOpencogLogger(opencogLogLevel, pythonLogLevel):
@@ -108,9 +128,54 @@ class StatisticsAnswerHandler(AnswerHandler):
     def getUnanswered(self):
         return self._dont_know_queries
 
+    def merge(self, other):
+        """
+        Add counts and unanswered questions of other handler, used to
+        combine statistics of several processes
+        """
+        self.processedQuestions += other.processedQuestions
+        self.questionsAnswered += other.questionsAnswered
+        self.correctAnswers += other.correctAnswers
+        self.dont_know += other.dont_know
+        self._dont_know_queries.extend(other._dont_know_queries)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['logger']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.logger = logging.getLogger('StatisticsAnswerHandler')
+
 
 ### Pipeline code
 
+def boundingBoxFeaturesValue(features):
+    """
+    Value to keep features of the bounding box in the atomspace
+
+    :param features: numpy.ndarray
+        features of the bounding box, it is referenced without copying
+        if PtrValue is available
+    """
+    if PtrValue is not None:
+        return PtrValue(features)
+    return FloatValue(features.tolist())
+
+
+def getBoundingBoxFeatures(boundingBox):
+    """
+    :return: numpy.ndarray or None if bounding box has no features
+    """
+    featuresValue = boundingBox.get_value(PredicateNode('features'))
+    if featuresValue is None:
+        return None
+    if PtrValue is not None:
+        return valueToPtrValue(featuresValue).value()
+    return np.array(featuresValue.to_list())
+
+
 def runNeuralNetwork(boundingBox, conceptNode):
     """
     Callback for running from within the atomspace from ground predicate
@@ -122,23 +187,28 @@ def runNeuralNetwork(boundingBox, conceptNode):
     logger = logging.getLogger('runNeuralNetwork')
     try:
         logger.debug('runNeuralNetwork: %s, %s', boundingBox.name, conceptNode.name)
-
-        featuresValue = boundingBox.get_value(PredicateNode('features'))
-        if featuresValue is None:
-            logger.error('no features found, return FALSE')
-            return TruthValue(0.0, 0.0)
-        features = np.array(featuresValue.to_list())
         word = conceptNode.name
+        scores = network_runner.scores
+        boxIndex = boundingBoxIndex(boundingBox.name)
+        if scores is not None and boxIndex is not None:
+            with stages.stage('runNeuralNetwork'):
+                result, certainty = scores.getScore(boxIndex, word)
+        else:
+            features = getBoundingBoxFeatures(boundingBox)
+            if features is None:
+                logger.error('no features found, return FALSE')
+                return TruthValue(0.0, 0.0)
 
-        certainty = 1.0
-        neuralNetworkRunner = network_runner.runner
-        try:
-            resultTensor = neuralNetworkRunner.runNeuralNetwork(features, word)
-        except NoModelException as e:
-            import torch
-            resultTensor = torch.zeros(1)
-            certainty = 0.0
-        result = resultTensor.item()
+            certainty = 1.0
+            neuralNetworkRunner = network_runner.runner
+            try:
+                with stages.stage('runNeuralNetwork'):
+                    resultTensor = neuralNetworkRunner.runNeuralNetwork(features, word)
+            except NoModelException as e:
+                import torch
+                resultTensor = torch.zeros(1)
+                certainty = 0.0
+            result = resultTensor.item()
 
         logger.debug('bb: %s, word: %s, result: %s', boundingBox.name, word, str(result))
         # Return matching values from PatternMatcher by adding
@@ -157,6 +227,8 @@ def runNeuralNetwork(boundingBox, conceptNode):
 
 
 class OtherDetSubjObj:
+    __slots__ = []
+
     @abc.abstractmethod
     def get_predicate_name(self):
         pass
@@ -167,14 +239,44 @@ class OtherDetSubjObj:
     def get_expression(self):
         pass
 
+    def get_strength(self):
+        pass
+
+    def get_confidence(self):
+        pass
+
+
+class AnswerCandidate:
+    """
+    One of the best answers of the query
+
+    For the results of pattern matcher strength and confidence are the
+    truth value of the conjunction, for (bounding box, attribute, object)
+    results of ure they are probabilities of the attribute and of the object
+    in the bounding box
+    """
+    __slots__ = ["answer", "strength", "confidence", "answerBox"]
+
+    def __init__(self, answer, strength, confidence, answerBox):
+        self.answer = answer
+        self.strength = strength
+        self.confidence = confidence
+        self.answerBox = answerBox
+
+    def __repr__(self):
+        return "AnswerCandidate({0}, {1}, {2}, {3})".format(self.answer, self.strength,
+                                                            self.confidence, self.answerBox)
+
 
 class QueryProcessingData:
     """
     Holds different intermediate results for query computation
     """
-    __slots__ = ["relexFormula", "query", "answer", "boundingBoxes", "answerBox", "answerExpression", "ok"]
+    __slots__ = ["relexFormula", "query", "answer", "boundingBoxes", "answerBox", "answerExpression", "ok",
+                 "candidates"]
 
-    def __init__(self, relexFormula, query, answer, boundingBoxes, answerBox, answerExpression):
+    def __init__(self, relexFormula, query, answer, boundingBoxes, answerBox, answerExpression,
+                 candidates=None):
         self.relexFormula = relexFormula
         self.query = query
         self.answer = answer
@@ -182,6 +284,8 @@ class QueryProcessingData:
         self.answerBox = answerBox
         self.answerExpression = answerExpression
         self.ok = True
+        # List[AnswerCandidate] best distinct answers, best first
+        self.candidates = [] if candidates is None else candidates
 
     def __str__(self):
         return self.answer
@@ -201,19 +305,26 @@ class FailedProcessingData(QueryProcessingData):
     def __init__(self, error_message):
         self.error_message = error_message
         self.ok = False
+        self.candidates = []
 
 
 class OtherDetSubjObjResult(OtherDetSubjObj):
+    __slots__ = ["bb", "attribute", "object", "attributeProbability", "objectProbability"]
 
-    def __init__(self, bounding_box, attribute, object):
+    def __init__(self, bounding_box, attribute, object,
+                 attributeProbability=None, objectProbability=None):
         self.bb = bounding_box
         self.attribute = attribute
         self.object = object
-        self.attributeProbability = bounding_box.get_value(attribute).to_list()[0]
-        self.objectProbability = bounding_box.get_value(object).to_list()[0]
+        if attributeProbability is None:
+            attributeProbability = bounding_box.get_value(attribute).to_list()[0]
+        if objectProbability is None:
+            objectProbability = bounding_box.get_value(object).to_list()[0]
+        self.attributeProbability = attributeProbability
+        self.objectProbability = objectProbability
 
     def __lt__(self, other):
-        if abs(self.objectProbability - other.objectProbability) > 0.000001:
+        if abs(self.objectProbability - other.objectProbability) > STRENGTH_TOLERANCE:
             return self.objectProbability < other.objectProbability
         else:
             return self.attributeProbability < other.attributeProbability
@@ -231,15 +342,29 @@ class OtherDetSubjObjResult(OtherDetSubjObj):
     def get_predicate_name(self):
         return self.attribute.name
 
+    def get_bounding_box_id(self):
+        return boundingBoxIndex(self.bb.name)
+
+    def get_strength(self):
+        return self.attributeProbability
+
+    def get_confidence(self):
+        return self.objectProbability
+
 
 class ConjunctionResult(OtherDetSubjObj):
-    def __init__(self, atom):
+    __slots__ = ["atom", "strength", "confidence"]
+
+    def __init__(self, atom, strength=None, confidence=None):
         self.atom = atom
-        self.strength = atom.tv.mean
-        self.confidence = atom.tv.confidence
+        if strength is None or confidence is None:
+            tv = atom.tv
+            strength, confidence = tv.mean, tv.confidence
+        self.strength = strength
+        self.confidence = confidence
 
     def __lt__(self, other):
-        if abs(self.strength - other.strength) > 0.000001:
+        if abs(self.strength - other.strength) > STRENGTH_TOLERANCE:
             return self.strength < other.strength
         else:
             return self.confidence < other.confidence
@@ -256,6 +381,109 @@ class ConjunctionResult(OtherDetSubjObj):
     def get_expression(self):
         return self.atom
 
+    def get_strength(self):
+        return self.strength
+
+    def get_confidence(self):
+        return self.confidence
+
+
+def result_strengths(results):
+    """
+    Read strengths of pattern matcher or ure results in one pass
+
+    :param results: List[Atom]
+        AndLink conjunctions or (bounding box, attribute, object) links
+    :return: Tuple[numpy.ndarray, numpy.ndarray]
+        primary and secondary strength of each result: strength and
+        confidence of conjunction, object and attribute probability of the
+        bounding box
+    """
+    primary = np.empty(len(results))
+    secondary = np.empty(len(results))
+    for i, result in enumerate(results):
+        if result.type == opencog.atomspace.types.AndLink:
+            tv = result.tv
+            primary[i] = tv.mean
+            secondary[i] = tv.confidence
+        else:
+            bounding_box, attribute, object = result.out[:3]
+            primary[i] = bounding_box.get_value(object).to_list()[0]
+            secondary[i] = bounding_box.get_value(attribute).to_list()[0]
+    return primary, secondary
+
+
+def iter_best_result_indexes(primary, secondary, passes):
+    """
+    Indexes of results from the best one, results are compared as by
+    __lt__ of the result wrappers: by primary strength and by secondary
+    strength if primary strengths differ by STRENGTH_TOLERANCE at most,
+    first result wins a tie
+
+    First indexes are selected by argmax over the remaining results, so
+    taking k <= passes indexes costs k passes instead of sorting all
+    results. If more indexes are taken the rest is sorted at once.
+
+    :return: Iterator[int]
+    """
+    available = np.ones(len(primary), dtype=bool)
+    for _ in range(min(passes, len(primary))):
+        best = primary[available].max()
+        candidates = np.flatnonzero(available & (primary >= best - STRENGTH_TOLERANCE))
+        index = int(candidates[np.argmax(secondary[candidates])])
+        available[index] = False
+        yield index
+
+    def compare(i, j):
+        if abs(primary[i] - primary[j]) > STRENGTH_TOLERANCE:
+            return -1 if primary[i] < primary[j] else 1
+        return int(secondary[i] > secondary[j]) - int(secondary[i] < secondary[j])
+
+    rest = [int(i) for i in np.flatnonzero(available)]
+    yield from sorted(rest, key=functools.cmp_to_key(compare), reverse=True)
+
+
+def best_result_indexes(primary, secondary, k=1):
+    """
+    :return: List[int]
+        indexes of k best results, best first
+    """
+    return list(itertools.islice(iter_best_result_indexes(primary, secondary, k), k))
+
+
+def wrap_result(result, primary, secondary):
+    """
+    Wrap result using strengths read by result_strengths()
+
+    :return: OtherDetSubjObj
+    """
+    if result.type == opencog.atomspace.types.AndLink:
+        # result is AndLink with random order of conjucts
+        return ConjunctionResult(result, primary, secondary)
+    out = result.out
+    return OtherDetSubjObjResult(out[0], out[1], out[2], secondary, primary)
+
+
+def yes_no_answer(result):
+    return 'yes' if result.get_strength() > 0.5 else 'no'
+
+
+def predicate_answer(result):
+    return result.get_predicate_name()
+
+
+def answer_candidates(results, answer):
+    """
+    :param results: List[OtherDetSubjObj]
+        selected results, best first
+    :param answer: Callable[[OtherDetSubjObj], str]
+        answer given by the result
+    :return: List[AnswerCandidate]
+    """
+    return [AnswerCandidate(answer(result), float(result.get_strength()),
+                            float(result.get_confidence()), result.get_bounding_box_id())
+            for result in results]
+
 
 def extract_predicate(atoms):
     for atom in atoms:
@@ -273,47 +501,137 @@ def extract_bb_id(atoms):
                 return int(predicate_name.split('-')[-1])
 
 
+def readRecords(questionsFileName):
+    """
+    :return: Iterator[Record]
+        records of the questions file, comments are skipped
+    """
+    with open(questionsFileName, 'r') as questionFile:
+        for line in questionFile:
+            if not PatternMatcherVqaPipeline.is_record(line):
+                continue
+            try:
+                yield Record.fromString(line.rstrip('\n'))
+            except ValueError as e:
+                logger.error('cannot parse record %s: %s', line.strip(), e)
+
+
 class PatternMatcherVqaPipeline:
 
-    def __init__(self, featureExtractor, questionConverter, atomspace, answerHandler):
+    def __init__(self, featureExtractor, questionConverter, atomspace, answerHandler,
+                 answerCache=None, imageLayerCacheSize=0, wordScoreCacheSize=0,
+                 simpleAnswers=False):
         """
         Construct pattern matcher object
 
         :param featureExtractor: interface.FeatureExtractor
             feature extractor for images
         :param questionConverter: org.opencog.vqa.relex.QuestionToOpencogConverter
-            converter from text to atomese queries
+            converter from text to atomese queries, or CachingQuestionConverter
         :param atomspace: atomspace
             atomspace with background knowledge
         :param answerHandler: interface.AnswerHandler
             answer handler for statistics
+        :param answerCache: cache.AnswerCache
+            optional cache of answers for answerQuestionByImage
+        :param imageLayerCacheSize: int
+            number of images which bounding boxes are kept in child
+            atomspaces between questions, values which word networks set on
+            the bounding boxes are kept too, 0 means bounding boxes are added
+            for each question
+        :param wordScoreCacheSize: int
+            number of images which word scores are kept between questions,
+            0 means word networks are run for each question
+        :param simpleAnswers: bool
+            answer questions of YES_NO_PREDADJ and OTHER_DET_OBJ_SUBJ
+            templates from word scores instead of running pattern matcher
+            query, answers have no answerExpression and bounding box of
+            the answer may differ from the one pattern matcher returns
         """
         self.featureExtractor = featureExtractor
         self.questionConverter = questionConverter
         self.atomspace = atomspace
         self.answerHandler = answerHandler
+        self.answerCache = answerCache
+        self.imageLayers = None
+        if imageLayerCacheSize > 0:
+            self.imageLayers = ImageLayerCache(atomspace, imageLayerCacheSize)
+        self.wordScores = None
+        if wordScoreCacheSize > 0:
+            self.wordScores = LruCache(wordScoreCacheSize)
+        self.simpleAnswers = simpleAnswers
+        # background knowledge is not changed, members of each category
+        # are read once
+        self.categoryMembers = {}
         self.logger = logging.getLogger('PatternMatcherVqaPipeline')
 
+    @contextlib.contextmanager
+    def questionAtomspace(self, imageKey, features):
+        """
+        Make child atomspace with bounding boxes of the image current
+        while the question is answered
+
+        If image layers are cached bounding boxes are added only for the
+        first question about the image, otherwise child atomspace is pushed
+        and popped each time to not pollute background atomspace by
+        temporary bounding boxes.
+        """
+        if self.imageLayers is None:
+            self.atomspace = pushAtomspace(self.atomspace)
+            try:
+                self.addBoundingBoxesIntoAtomspace(features)
+                yield self.atomspace
+            finally:
+                self.atomspace = popAtomspace(self.atomspace)
+            return
+        background = self.atomspace
+        try:
+            with self.imageLayers.scratchLayer(imageKey, features,
+                                               self.addBoundingBoxesIntoAtomspace) as scratch:
+                self.atomspace = scratch
+                yield scratch
+        finally:
+            self.atomspace = background
+
+    def getFeaturesByImageId(self, imageId):
+        """
+        :return: Tuple[str, numpy.ndarray]
+            image layer key and features of the image
+        """
+        imageKey = 'image-{0}'.format(imageId)
+        features = None
+        if self.imageLayers is not None:
+            features = self.imageLayers.getFeatures(imageKey)
+            if features is not None and hasattr(self.featureExtractor, 'release'):
+                self.featureExtractor.release(imageId)
+        if features is None:
+            features = np.asarray(self.featureExtractor.getFeaturesByImageId(imageId),
+                                  dtype=np.float32)
+        return imageKey, features
+
     # TODO: pass atomspace as parameter to exclude necessity of set_type_ctor_atomspace
     def addBoundingBoxesIntoAtomspace(self, features):
         """
         populate atomspace with bounding boxes, that is concept nodes
 
-        Each bounding box node holds FloatValue, which in turn holds array of float values -
-        activations of neural network on the corresponding image area.
+        Each bounding box node holds activations of neural network on the
+        corresponding image area. If opencog.neuralnet is available the value
+        is PtrValue referencing the row of the features matrix, otherwise
+        FloatValue with a copy of the features.
 
         Parameters
         ----------
         features : Iterable
-            iterable with bounding box features
+            bounding boxes x features matrix or iterable with bounding box features
 
         Returns
         -------
         None
         """
+        features = np.asarray(features, dtype=np.float32)
         boundingBoxNumber = 0
         for boundingBoxFeatures in features:
-            imageFeatures = FloatValue(boundingBoxFeatures)
+            imageFeatures = boundingBoxFeaturesValue(boundingBoxFeatures)
             boundingBoxInstance = ConceptNode(
                 'BoundingBox-' + str(boundingBoxNumber))
             inh = InheritanceLink(boundingBoxInstance, ConceptNode('BoundingBox'))
@@ -322,14 +640,95 @@ class PatternMatcherVqaPipeline:
             boundingBoxInstance.set_value(PredicateNode('features'), imageFeatures)
             boundingBoxNumber += 1
 
-    def answerQuery(self, questionType, query):
+    def prepareWordScores(self, features, relexFormula, imageKey=None):
+        """
+        Evaluate networks of the question words on all bounding boxes at once,
+        runNeuralNetwork callback looks up the scores, networks for other
+        words are evaluated on the first request
+
+        :param imageKey: str
+            key of the image to reuse word scores of the previous questions
+            about it, None to score words for this question only
+        """
+        scores = None
+        if self.wordScores is not None and imageKey is not None:
+            scores = self.wordScores.get(imageKey)
+        if scores is None:
+            scores = WordScoreTable(network_runner.runner, features)
+            if self.wordScores is not None and imageKey is not None:
+                self.wordScores.put(imageKey, scores)
+        scores.precompute(groundedFormulaWords(str(relexFormula.getGroundedFormula())))
+        network_runner.scores = scores
+
+    def getCategoryMembers(self, category):
+        """
+        :param category: str
+            name of the concept, for instance 'color'
+        :return: List[str]
+            names of the concepts which inherit from the category
+        """
+        members = self.categoryMembers.get(category)
+        if members is None:
+            categoryNode = ConceptNode(category)
+            links = categoryNode.incoming_by_type(opencog.atomspace.types.InheritanceLink)
+            members = sorted(set(link.out[0].name for link in links
+                                 if link.out[1] == categoryNode and
+                                 link.out[0].type == opencog.atomspace.types.ConceptNode))
+            self.categoryMembers[category] = members
+        return members
+
+    def answerSimpleQuestion(self, relexFormula, topK=1):
+        """
+        Answer question of YES_NO_PREDADJ or OTHER_DET_OBJ_SUBJ template by
+        max/argmax over word scores of the bounding boxes, the same way as
+        pattern matcher query of the template: the answer is given by a
+        bounding box where networks of both words return more than 0.5.
+        Prepared word scores are used, so networks of the words which were
+        already scored for the image are not run.
+
+        :param relexFormula: org.opencog.vqa.relex.RelexFormula
+        :param topK: int
+            number of answer candidates to return
+        :return: Tuple[str, int, None, List[AnswerCandidate]]
+            answer, bounding box id, no expression and answer candidates,
+            None if the question should be answered by the query
+        """
+        scores = network_runner.scores
+        template = str(relexFormula.getFullFormula())
+        if scores is None or template not in (YES_NO_PREDADJ, OTHER_DET_OBJ_SUBJ):
+            return None
+        relations = groundedFormulaRelations(str(relexFormula.getGroundedFormula()))
+        if relations is None:
+            return None
+        if template == YES_NO_PREDADJ:
+            _, object, state = relations[0]
+            words = [state]
+        else:
+            # _det(attribute, _$qVar);_obj(verb, object);_subj(verb, attribute)
+            attribute, object = relations[0][1], relations[1][2]
+            words = self.getCategoryMembers(attribute)
+            if not words:
+                return None
+        objectScores, objectCertainty = scores.getScores(object)
+        wordScores, certainties = scores.getScoreMatrix(words)
+        best = bestBoxesByWords(objectScores, wordScores, topK)
+        candidates = [AnswerCandidate('yes' if template == YES_NO_PREDADJ else words[column],
+                                      strength, objectCertainty * float(certainties[column]),
+                                      box)
+                      for column, box, strength in best]
+        if not candidates:
+            return ('no' if template == YES_NO_PREDADJ else None), None, None, []
+        return candidates[0].answer, candidates[0].answerBox, None, candidates
+
+    def answerQuery(self, questionType, query, topK=1):
         if questionType == 'yes/no':
-            answer = self.answerYesNoQuestion(query)
+            answer = self.answerYesNoQuestion(query, topK)
         else:
-            answer = self.answerOtherQuestion(query)
+            answer = self.answerOtherQuestion(query, topK)
         return answer
 
-    def answerQuestionByImage(self, image, question, use_pm=True) -> QueryProcessingData:
+    def answerQuestionByImage(self, image, question, use_pm=True, listener=None,
+                              topK=1) -> QueryProcessingData:
         """
         Get answer from image and text
         :param image: numpy.array
@@ -339,71 +738,181 @@ class PatternMatcherVqaPipeline:
         :param use_pm: bool
             if use_pm == True, pattern matcher will be used to compute the answer
             otherwise unified rule engine will be used
+        :param listener: interface.QuestionProcessingListener
+            optional listener which is notified when each stage is finished,
+            listener is not notified if answer is taken from the cache
+        :param topK: int
+            number of answer candidates to return
         :return: QueryProcessingData
         """
-        self.atomspace = pushAtomspace(self.atomspace)
+        if self.answerCache is not None:
+            imageKey = arrayDigest(image)
+            result = self.answerCache.get(imageKey, question, use_pm, topK)
+            if result is not None:
+                return result
+        if listener is None:
+            listener = QuestionProcessingListener()
         try:
-            features, boxes = self.featureExtractor.getFeaturesByImage(image)
-            self.addBoundingBoxesIntoAtomspace(features)
-            parsedQuestion = self.questionConverter.parseQuestionAndType(question)
-            relexFormula = parsedQuestion.relexFormula
-            if use_pm:
-                queryInScheme = self.questionConverter.convertToOpencogSchemePM(relexFormula)
-            else:
-                queryInScheme = self.questionConverter.convertToOpencogSchemeURE(relexFormula)
-            if queryInScheme is None:
-                self.logger.error('unsuported question type {0}'.format(str(relexFormula)))
-                return FailedProcessingData('unsuported question type')
-            self.logger.debug('Scheme query: %s', queryInScheme)
-            questionType = parsedQuestion.questionType
-            if questionType is None:
-                return FailedProcessingData('unsuported question type')
-            answer, bb_id, expr = self.answerQuery(questionType, queryInScheme)
-            result = QueryProcessingData(relexFormula, queryInScheme, answer, boxes,
-                                         answerBox=bb_id, answerExpression=expr)
-            return result
+            with stages.stage('getFeaturesByImage'):
+                features, boxes = self.featureExtractor.getFeaturesByImage(image)
         except RuntimeError as e:
             self.logger.error(e)
             return FailedProcessingData("RuntimeError {0}".format(str(e)))
-        finally:
-            self.atomspace = popAtomspace(self.atomspace)
+        listener.onFeatures(features, boxes)
+        result = self.answerQuestionByFeatures(features, boxes, question, use_pm=use_pm,
+                                               listener=listener, topK=topK)
+        if self.answerCache is not None and result.ok:
+            self.answerCache.put(imageKey, question, use_pm, result, topK)
+        return result
+
+    def answerQuestionsByImage(self, image, questions, use_pm=True):
+        """
+        Get answers for several questions about the same image,
+        features are extracted only once
 
-    def answerQuestion(self, record, use_pm=True):
-        self.logger.debug('processing question: %s', record.question)
-        self.answerHandler.onNewQuestion(record)
-        # Push/pop atomspace each time to not pollute it by temporary
-        # bounding boxes
-        self.atomspace = pushAtomspace(self.atomspace)
+        :param image: numpy.array
+            height x width x num channels
+            expected type = numpy.uint8
+        :param questions: Iterable[str]
+        :param use_pm: bool
+            if use_pm == True, pattern matcher will be used to compute the answer
+            otherwise unified rule engine will be used
+        :return: List[QueryProcessingData]
+            answers in the same order as questions
+        """
         try:
-            features = self.featureExtractor.getFeaturesByImageId(record.imageId)
-            self.addBoundingBoxesIntoAtomspace(features)
+            with stages.stage('getFeaturesByImage'):
+                features, boxes = self.featureExtractor.getFeaturesByImage(image)
+        except RuntimeError as e:
+            self.logger.error(e)
+            return [FailedProcessingData("RuntimeError {0}".format(str(e)))
+                    for _ in questions]
+        return [self.answerQuestionByFeatures(features, boxes, question, use_pm=use_pm)
+                for question in questions]
+
+    def answerQuestionByFeatures(self, features, boxes, question, use_pm=True,
+                                 listener=None, parsedQuestion=None,
+                                 topK=1) -> QueryProcessingData:
+        """
+        Get answer from precomputed bounding boxes features and text
+        :param features: Iterable
+            iterable with bounding box features
+        :param boxes: numpy.array
+            bounding boxes coordinates
+        :param question: str
+        :param use_pm: bool
+            if use_pm == True, pattern matcher will be used to compute the answer
+            otherwise unified rule engine will be used
+        :param listener: interface.QuestionProcessingListener
+            optional listener which is notified when each stage is finished
+        :param parsedQuestion: question_converter.ParsedQuestion
+            result of parseQuestionAndType if the question was parsed
+            while features were extracted, None to parse the question here
+        :param topK: int
+            number of answer candidates to return
+        :return: QueryProcessingData
+        """
+        if listener is None:
+            listener = QuestionProcessingListener()
+        features = np.asarray(features, dtype=np.float32)
+        imageKey = None
+        if self.imageLayers is not None or self.wordScores is not None:
+            imageKey = 'features-' + arrayDigest(features)
+        try:
+            with self.questionAtomspace(imageKey, features):
+                return self.answerParsedQuestion(features, boxes, question, use_pm, listener,
+                                                 parsedQuestion, topK, imageKey)
+        except RuntimeError as e:
+            self.logger.error(e)
+            return FailedProcessingData("RuntimeError {0}".format(str(e)))
+        finally:
+            network_runner.scores = None
 
-            relexFormula = self.questionConverter.parseQuestion(record.question)
+    def answerParsedQuestion(self, features, boxes, question, use_pm, listener,
+                             parsedQuestion=None, topK=1, imageKey=None):
+        """
+        Answer question in the atomspace which already has bounding boxes,
+        questions of simple templates are answered from word scores
+        """
+        if parsedQuestion is None:
+            with stages.stage('parseQuestionAndType'):
+                parsedQuestion = self.questionConverter.parseQuestionAndType(question)
+        elif hasattr(self.questionConverter, 'cacheParsedQuestion'):
+            # queries of questions parsed by the parser process are cached too
+            parsedQuestion = self.questionConverter.cacheParsedQuestion(parsedQuestion)
+        relexFormula = parsedQuestion.relexFormula
+        self.prepareWordScores(features, relexFormula, imageKey)
+        listener.onRelexFormula(relexFormula, parsedQuestion.questionType)
+        with stages.stage('convertToOpencogScheme'):
             if use_pm:
                 queryInScheme = self.questionConverter.convertToOpencogSchemePM(relexFormula)
             else:
                 queryInScheme = self.questionConverter.convertToOpencogSchemeURE(relexFormula)
-            if queryInScheme is None:
-                self.logger.error('Question was not parsed')
-                return
-            self.logger.debug('Scheme query: %s', queryInScheme)
-            answer, _, _ = self.answerQuery(record.questionType, queryInScheme)
+        if queryInScheme is None:
+            self.logger.error('unsuported question type {0}'.format(str(relexFormula)))
+            return FailedProcessingData('unsuported question type')
+        self.logger.debug('Scheme query: %s', queryInScheme)
+        listener.onQuery(queryInScheme)
+        questionType = parsedQuestion.questionType
+        if questionType is None:
+            return FailedProcessingData('unsuported question type')
+        simpleAnswer = None
+        if use_pm and self.simpleAnswers:
+            with stages.stage('answerSimpleQuestion'):
+                simpleAnswer = self.answerSimpleQuestion(relexFormula, topK)
+        if simpleAnswer is not None:
+            answer, bb_id, expr, candidates = simpleAnswer
+        else:
+            with stages.stage('patternMatcher' if use_pm else 'unifiedRuleEngine'):
+                answer, bb_id, expr, candidates = self.answerQuery(questionType, queryInScheme,
+                                                                   topK)
+        result = QueryProcessingData(relexFormula, queryInScheme, answer, boxes,
+                                     answerBox=bb_id, answerExpression=expr,
+                                     candidates=candidates)
+        return result
+
+    def answerQuestion(self, record, use_pm=True):
+        self.logger.debug('processing question: %s', record.question)
+        self.answerHandler.onNewQuestion(record)
+        try:
+            imageKey, features = self.getFeaturesByImageId(record.imageId)
+            with self.questionAtomspace(imageKey, features):
+                relexFormula = self.questionConverter.parseQuestion(record.question)
+                self.prepareWordScores(features, relexFormula, imageKey)
+                simpleAnswer = None
+                if use_pm and self.simpleAnswers:
+                    simpleAnswer = self.answerSimpleQuestion(relexFormula)
+                if simpleAnswer is not None:
+                    answer, _, _, _ = simpleAnswer
+                else:
+                    if use_pm:
+                        queryInScheme = self.questionConverter.convertToOpencogSchemePM(relexFormula)
+                    else:
+                        queryInScheme = self.questionConverter.convertToOpencogSchemeURE(relexFormula)
+                    if queryInScheme is None:
+                        self.logger.error('Question was not parsed')
+                        return
+                    self.logger.debug('Scheme query: %s', queryInScheme)
+                    answer, _, _, _ = self.answerQuery(record.questionType, queryInScheme)
             self.answerHandler.onAnswer(record, answer)
 
             print('{}::{}::{}::{}::{}'.format(record.questionId, record.question,
                 answer, record.answer, record.imageId))
 
         finally:
-            self.atomspace = popAtomspace(self.atomspace)
+            network_runner.scores = None
 
-    def answerYesNoQuestion(self, queryInScheme):
+    def answerYesNoQuestion(self, queryInScheme, topK=1):
         """
         Find answer for question with formula _predadj(A, B)
 
         :param queryInScheme: str
             query to pattern matcher or ure
-        :return: Tuple[str, int, str]
-            if answer was found Tuple[None, None, None] otherwise
+        :param topK: int
+            maximum number of candidates, there are at most two of them:
+            best result which gives 'yes' and best result which gives 'no'
+        :return: Tuple[str, int, str, List[AnswerCandidate]]
+            answer, bounding box id, expression and answer candidates
         """
         start = datetime.datetime.now()
 
@@ -412,52 +921,84 @@ class PatternMatcherVqaPipeline:
         self.logger.debug('The result of pattern matching is: '
                           '%s, time: %s microseconds',
                           result, delta.microseconds)
-        results = self.sort_results(result, a_extract_predicate=False)
+        results = self.select_results(result, min(topK, 2), distinct=yes_no_answer)
         if not results:
-            return 'no', None, None
+            return 'no', None, None, []
         maxResult = results[0]
         bb_id = maxResult.get_bounding_box_id()
         expression = maxResult.get_expression()
         answer = 'yes' if expression.tv.mean > 0.5 else 'no'
-        return answer, bb_id, expression
+        return answer, bb_id, expression, answer_candidates(results, yes_no_answer)
 
-    def answerOtherQuestion(self, queryInScheme):
+    def answerOtherQuestion(self, queryInScheme, topK=1):
         """
         Find answer for question with formula _det(A, B);_obj(C, D);_subj(C, A)
 
         :param queryInScheme: str
             query to pattern matcher or ure
-        :return: Tuple[str, int, str]
-            if answer was found Tuple[None, None, None] otherwise
+        :param topK: int
+            maximum number of candidates with distinct predicates
+        :return: Tuple[str, int, str, List[AnswerCandidate]]
+            answer, bounding box id, expression and answer candidates if
+            answer was found Tuple[None, None, None, []] otherwise
         """
         start = datetime.datetime.now()
         resultsData = scheme_eval_h(self.atomspace, queryInScheme)
         delta = datetime.datetime.now() - start
-        self.logger.debug('The resultsData of pattern matching contains: '
-                          '%s records, time: %s microseconds',
-                          len(resultsData.out), delta.microseconds)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug('The resultsData of pattern matching contains: '
+                              '%s records, time: %s microseconds',
+                              len(resultsData.out), delta.microseconds)
 
-        results = self.sort_results(resultsData, a_extract_predicate=True)
+        results = self.select_results(resultsData, topK, distinct=predicate_answer)
         if not results:
-            return None, None, None
+            return None, None, None, []
         maxResult = results[0]
         return maxResult.get_predicate_name(), \
                maxResult.get_bounding_box_id(), \
-               maxResult.get_expression()
+               maxResult.get_expression(), \
+               answer_candidates(results, predicate_answer)
 
-    def sort_results(self, resultsData, a_extract_predicate=False):
+    def select_results(self, resultsData, k=1, distinct=None):
+        """
+        Select k best results without sorting all of them, only selected
+        results are wrapped
+
+        :param resultsData: Atom
+            SetLink with results of the query
+        :param distinct: Callable[[OtherDetSubjObj], Any]
+            if set, result is skipped when a better result has the same
+            value of distinct(result)
+        :return: List[OtherDetSubjObj]
+            best results, best first, the same as first k results of all
+            results sorted in descending order if distinct is not set
+        """
+        resultsData = resultsData.out
+        if not resultsData:
+            return []
+        primary, secondary = result_strengths(resultsData)
         results = []
-        for resultData in resultsData.out:
-            out = resultData.out
-            if resultData.type == opencog.atomspace.types.AndLink:
-                # resultData is AndLink with random order of conjucts
-                results.append(ConjunctionResult(resultData))
-            else:
-                results.append(OtherDetSubjObjResult(out[0], out[1], out[2]))
-        results.sort(reverse=True)
+        keys = set()
+        # a few more passes in case some results are not distinct
+        passes = k if distinct is None else 2 * k
+        for i in iter_best_result_indexes(primary, secondary, passes):
+            if len(results) >= k:
+                break
+            result = wrap_result(resultsData[i], primary[i], secondary[i])
+            if distinct is not None:
+                key = distinct(result)
+                if key in keys:
+                    continue
+                keys.add(key)
+            results.append(result)
+        self.log_results(results)
+        return results
+
+    def log_results(self, results):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
         for result in results:
             self.logger.debug(str(result))
-        return results
 
     def answerSingleQuestion(self, question, imageId):
         questionRecord = Record()
@@ -473,16 +1014,28 @@ class PatternMatcherVqaPipeline:
         return True
 
     def answerQuestionsFromFile(self, questionsFileName, use_pm=True):
-        questionFile = open(questionsFileName, 'r')
-        for line in questionFile:
-            if not self.is_record(line):
-                continue
-            try:
-                record = Record.fromString(line)
-                self.answerQuestion(record, use_pm=use_pm)
-            except BaseException as e:
-                logger.exception('Unexpected exception %s', e)
-                continue
+        """
+        Answer questions from file, if feature extractor supports
+        prefetching features of the next questions are loaded in background
+        """
+        depth = 0
+        if hasattr(self.featureExtractor, 'schedule'):
+            depth = self.featureExtractor.depth
+        upcoming = collections.deque()
+        for record in readRecords(questionsFileName):
+            if depth > 0:
+                self.featureExtractor.schedule(record.imageId)
+            upcoming.append(record)
+            if len(upcoming) > depth:
+                self.answerRecord(upcoming.popleft(), use_pm)
+        while upcoming:
+            self.answerRecord(upcoming.popleft(), use_pm)
+
+    def answerRecord(self, record, use_pm):
+        try:
+            self.answerQuestion(record, use_pm=use_pm)
+        except BaseException as e:
+            logger.exception('Unexpected exception %s', e)
 
 
 ### MAIN
@@ -490,7 +1043,7 @@ question2atomeseLibraryPath = (currentDir(__file__) +
     '/../question2atomese/target/question2atomese-1.0-SNAPSHOT.jar')
 
 
-def parse_args():
+def createArgumentParser():
     parser = argparse.ArgumentParser(description='Load pretrained words models '
        'and answer questions using OpenCog PatternMatcher')
     parser.add_argument('--model-kind', '-k', dest='kindOfModel',
@@ -515,12 +1068,14 @@ def parse_args():
         help='word embeddings')
     parser.add_argument('--features-extractor-kind', dest='kindOfFeaturesExtractor',
         action='store', type=str, required=True,
-        choices=['PRECALCULATED', 'IMAGE'],
+        choices=['PRECALCULATED', 'PACKED', 'IMAGE'],
         help='features extractor type: (1) PRECALCULATED loads precalculated features; '
-        '(2) IMAGE extract features from images on the fly')
+        '(2) PACKED loads precalculated features converted by feature/store.py; '
+        '(3) IMAGE extract features from images on the fly')
     parser.add_argument('--precalculated-features', '-f', dest='precalculatedFeaturesPath',
         action='store', type=str,
-        help='precalculated features path (it can be either zip archive or folder name)')
+        help='precalculated features path (it can be either zip archive or folder name, '
+        'or packed features file for PACKED extractor)')
     parser.add_argument('--precalculated-features-prefix', dest='precalculatedFeaturesPrefix',
         action='store', type=str, default='val2014_parsed_features/COCO_val2014_',
         help='precalculated features prefix to be merged with path to open feature')
@@ -550,8 +1105,118 @@ def parse_args():
     parser.add_argument('--no-use-pm', dest='use_pm', action='store_false',
                         help='use URE instead of pattern matcher')
     parser.set_defaults(use_pm=True)
-    args = parser.parse_args()
-    return args
+    parser.add_argument('--question-cache-size', dest='questionCacheSize',
+        action='store', type=int, default=0,
+        help='number of parsed questions to cache, 0 disables the cache')
+    parser.add_argument('--question-cache-preload', dest='questionCachePreloadFileName',
+        action='store', type=str,
+        help='file with frequent questions to parse at startup')
+    parser.add_argument('--image-layer-cache-size', dest='imageLayerCacheSize',
+        action='store', type=int, default=0,
+        help='number of images which bounding boxes are kept in the atomspace '
+        'between questions, values computed for one question stay on the '
+        'bounding boxes, 0 adds bounding boxes for each question (default)')
+    parser.add_argument('--word-score-cache-size', dest='wordScoreCacheSize',
+        action='store', type=int, default=4,
+        help='number of images which word scores are kept between questions, '
+        '0 runs word networks for each question')
+    parser.add_argument('--simple-answers', dest='simpleAnswers', action='store_true',
+                        help='answer _predadj and _det/_obj/_subj questions from word scores')
+    parser.add_argument('--no-simple-answers', dest='simpleAnswers', action='store_false',
+                        help='answer all questions by pattern matcher queries')
+    parser.set_defaults(simpleAnswers=False)
+    parser.add_argument('--prefetch-workers', dest='prefetchWorkers',
+        action='store', type=int, default=4,
+        help='number of threads loading features of the next questions, 0 disables prefetching')
+    parser.add_argument('--prefetch-depth', dest='prefetchDepth',
+        action='store', type=int, default=32,
+        help='number of questions to prefetch features for')
+    return parser
+
+
+def parse_args():
+    return createArgumentParser().parse_args()
+
+
+def buildPipeline(args, answerHandler):
+    """
+    Create pipeline using command line arguments, JVM should be started
+    by caller
+
+    :param args: argparse.Namespace
+        arguments parsed by parser from createArgumentParser()
+    :param answerHandler: interface.AnswerHandler
+    :return: PatternMatcherVqaPipeline
+    """
+    if args.kindOfFeaturesExtractor == 'IMAGE':
+        from feature.image import ImageFeatureExtractor
+        featureExtractor = ImageFeatureExtractor(
+            # TODO: replace by arguments
+            '/mnt/fileserver/shared/vital/image-features/test.prototxt',
+            '/mnt/fileserver/shared/vital/image-features/resnet101_faster_rcnn_final_iter_320000_for_36_bboxes.caffemodel',
+            args.imagesPath,
+            args.imagesPrefix
+            )
+    elif args.kindOfFeaturesExtractor == 'PRECALCULATED':
+        featureExtractor = TsvFileFeatureLoader(args.precalculatedFeaturesPath,
+                                         args.precalculatedFeaturesPrefix)
+    elif args.kindOfFeaturesExtractor == 'PACKED':
+        from feature.store import PackedFeatureStore
+        featureExtractor = PackedFeatureStore(args.precalculatedFeaturesPath)
+    else:
+        raise ValueError('Unexpected args.kindOfFeaturesExtractor value: {}'
+                         .format(args.kindOfFeaturesExtractor))
+    # packed features are memory mapped, there is nothing to prefetch
+    if args.prefetchWorkers > 0 and args.kindOfFeaturesExtractor != 'PACKED':
+        from feature.prefetch import PrefetchingFeatureExtractor
+        featureExtractor = PrefetchingFeatureExtractor(featureExtractor, args.prefetchWorkers,
+                                                       args.prefetchDepth)
+
+    questionConverter = jpype.JClass('org.opencog.vqa.relex.QuestionToOpencogConverter')()
+    if args.questionCacheSize > 0:
+        questionConverter = CachingQuestionConverter(questionConverter,
+                                                     args.questionCacheSize)
+        if args.questionCachePreloadFileName is not None:
+            questionConverter.preload(args.questionCachePreloadFileName, use_pm=args.use_pm)
+    if args.use_pm:
+        atomspace = initialize_atomspace_by_facts(args.atomspaceFileName)
+    else:
+        scheme_directories = ["~/projects/opencog/examples/pln/conjunction/",
+                              "~/projects/atomspace/examples/rule-engine/rules/",
+                              "~/projects/opencog/opencog/pln/rules/"]
+
+        atomspace = initialize_atomspace_by_facts(args.atomspaceFileName,
+                                                  "conjunction-rule-base-config.scm",
+                                                  [os.path.expanduser(x) for x in scheme_directories])
+    if (args.kindOfModel == 'MULTIDNN'):
+        network_runner.runner = NetsVocabularyNeuralNetworkRunner(args.multidnnModelFileName)
+    elif (args.kindOfModel == 'SPLITMULTIDNN'):
+        network_runner.runner = SplitMultidnnRunner(args.multidnnModelFileName)
+    elif (args.kindOfModel == 'HYPERNET'):
+        network_runner.runner = HyperNetNeuralNetworkRunner(args.hypernetWordsFileName,
+                        args.hypernetWordEmbeddingsFileName, args.hypernetModelFileName)
+    else:
+        raise ValueError('Unexpected args.kindOfModel value: {}'.format(args.kindOfModel))
+
+    return PatternMatcherVqaPipeline(featureExtractor,
+                                     questionConverter,
+                                     atomspace,
+                                     answerHandler,
+                                     imageLayerCacheSize=args.imageLayerCacheSize,
+                                     wordScoreCacheSize=args.wordScoreCacheSize,
+                                     simpleAnswers=args.simpleAnswers)
+
+
+def printStatistics(statisticsAnswerHandler, unansweredFileName='unanswered.txt'):
+    print('Questions processed: {0}, answered: {1}, correct answers: {2}% ({3}), unaswered {4}%'
+          .format(statisticsAnswerHandler.processedQuestions,
+                  statisticsAnswerHandler.questionsAnswered,
+                  statisticsAnswerHandler.correctAnswerPercent(),
+                  statisticsAnswerHandler.correctAnswers,
+                  statisticsAnswerHandler.unanswered_percent()))
+    with open(unansweredFileName, 'w') as f:
+        for record in statisticsAnswerHandler.getUnanswered():
+            f.write(record.toString() + '\n')
 
 
 def main():
@@ -564,60 +1229,10 @@ def main():
     jpype.startJVM(jpype.getDefaultJVMPath(),
                    '-Djava.class.path=' + str(args.q2aJarFilenName))
     try:
-
-        if args.kindOfFeaturesExtractor == 'IMAGE':
-            from feature.image import ImageFeatureExtractor
-            featureExtractor = ImageFeatureExtractor(
-                # TODO: replace by arguments
-                '/mnt/fileserver/shared/vital/image-features/test.prototxt',
-                '/mnt/fileserver/shared/vital/image-features/resnet101_faster_rcnn_final_iter_320000_for_36_bboxes.caffemodel',
-                args.imagesPath,
-                args.imagesPrefix
-                )
-        elif args.kindOfFeaturesExtractor == 'PRECALCULATED':
-            featureExtractor = TsvFileFeatureLoader(args.precalculatedFeaturesPath,
-                                             args.precalculatedFeaturesPrefix)
-        else:
-            raise ValueError('Unexpected args.kindOfFeaturesExtractor value: {}'
-                             .format(args.kindOfFeaturesExtractor))
-
-        questionConverter = jpype.JClass('org.opencog.vqa.relex.QuestionToOpencogConverter')()
-        if args.use_pm:
-            atomspace = initialize_atomspace_by_facts(args.atomspaceFileName)
-        else:
-            scheme_directories = ["~/projects/opencog/examples/pln/conjunction/",
-                                  "~/projects/atomspace/examples/rule-engine/rules/",
-                                  "~/projects/opencog/opencog/pln/rules/"]
-
-            atomspace = initialize_atomspace_by_facts(args.atomspaceFileName,
-                                                      "conjunction-rule-base-config.scm",
-                                                      [os.path.expanduser(x) for x in scheme_directories])
         statisticsAnswerHandler = StatisticsAnswerHandler()
-        if (args.kindOfModel == 'MULTIDNN'):
-            network_runner.runner = NetsVocabularyNeuralNetworkRunner(args.multidnnModelFileName)
-        elif (args.kindOfModel == 'SPLITMULTIDNN'):
-            network_runner.runner = SplitMultidnnRunner(args.multidnnModelFileName)
-        elif (args.kindOfModel == 'HYPERNET'):
-            network_runner.runner = HyperNetNeuralNetworkRunner(args.hypernetWordsFileName,
-                            args.hypernetWordEmbeddingsFileName, args.hypernetModelFileName)
-        else:
-            raise ValueError('Unexpected args.kindOfModel value: {}'.format(args.kindOfModel))
-
-        pmVqaPipeline = PatternMatcherVqaPipeline(featureExtractor,
-                                                  questionConverter,
-                                                  atomspace,
-                                                  statisticsAnswerHandler)
+        pmVqaPipeline = buildPipeline(args, statisticsAnswerHandler)
         pmVqaPipeline.answerQuestionsFromFile(args.questionsFileName, use_pm=args.use_pm)
-
-        print('Questions processed: {0}, answered: {1}, correct answers: {2}% ({3}), unaswered {4}%'
-              .format(statisticsAnswerHandler.processedQuestions,
-                      statisticsAnswerHandler.questionsAnswered,
-                      statisticsAnswerHandler.correctAnswerPercent(),
-                      statisticsAnswerHandler.correctAnswers,
-                      statisticsAnswerHandler.unanswered_percent()))
-        with open("unanswered.txt", 'w') as f:
-            for record in statisticsAnswerHandler.getUnanswered():
-                f.write(record.toString() + '\n')
+        printStatistics(statisticsAnswerHandler)
     finally:
         jpype.shutdownJVM()
 
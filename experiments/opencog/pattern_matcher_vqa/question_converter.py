@@ -0,0 +1,162 @@
+"""
+Memoizing wrapper for QuestionToOpencogConverter
+
+Parsing question and converting it into scheme query cross the jpype
+bridge and run relex, while the questions are often repeated. Results are
+cached by normalized question text and query kind (PM or URE).
+"""
+
+import logging
+import re
+
+from cache import LruCache, normalizeQuestion
+
+
+class CachedRelexFormula:
+    """
+    Relex formula from the cache, it behaves like the wrapped
+    org.opencog.vqa.relex.RelexFormula and keeps scheme queries already
+    computed for the formula
+    """
+
+    def __init__(self, formula, questionType):
+        self.formula = formula
+        self.questionType = questionType
+        self.queries = {}
+
+    def __str__(self):
+        return str(self.formula)
+
+    def __getattr__(self, name):
+        return getattr(self.formula, name)
+
+
+class ParsedQuestion:
+    __slots__ = ['relexFormula', 'questionType']
+
+    def __init__(self, relexFormula, questionType):
+        self.relexFormula = relexFormula
+        self.questionType = questionType
+
+
+class CachingQuestionConverter:
+    """
+    Drop-in replacement of QuestionToOpencogConverter which caches the most
+    recently used questions
+
+    Cache key is the question with collapsed whitespace and without
+    trailing question mark, case is kept because relex parses capitalized
+    words as proper nouns. Question is parsed as it came on a cache miss, so
+    the formula is the same as the wrapped converter returns.
+    """
+
+    def __init__(self, converter, maxsize):
+        """
+        :param converter: org.opencog.vqa.relex.QuestionToOpencogConverter
+            converter to delegate cache misses to
+        :param maxsize: int
+            maximum number of cached questions
+        """
+        self.converter = converter
+        self.cache = LruCache(maxsize)
+        self.logger = logging.getLogger('CachingQuestionConverter')
+
+    def getFormula(self, question):
+        key = normalizeQuestion(question, ignoreCase=False)
+        formula = self.cache.get(key)
+        if formula is None:
+            parsedQuestion = self.converter.parseQuestionAndType(question)
+            formula = CachedRelexFormula(parsedQuestion.relexFormula,
+                                         parsedQuestion.questionType)
+            self.cache.put(key, formula)
+        return formula
+
+    def cacheParsedQuestion(self, parsedQuestion):
+        """
+        Put the question parsed elsewhere, e.g. by the question parser
+        process, into the cache, so its scheme queries are cached too
+
+        :param parsedQuestion: ParsedQuestion
+            question which formula is question_parser.RelexFormulaSnapshot
+        :return: ParsedQuestion
+            question with CachedRelexFormula
+        """
+        formula = parsedQuestion.relexFormula
+        if isinstance(formula, CachedRelexFormula) or not hasattr(formula, 'question'):
+            return parsedQuestion
+        key = normalizeQuestion(formula.question, ignoreCase=False)
+        cached = self.cache.get(key)
+        if cached is None:
+            cached = CachedRelexFormula(formula, parsedQuestion.questionType)
+            self.cache.put(key, cached)
+        return ParsedQuestion(cached, cached.questionType)
+
+    def parseQuestion(self, question):
+        return self.getFormula(question)
+
+    def parseQuestionAndType(self, question):
+        formula = self.getFormula(question)
+        return ParsedQuestion(formula, formula.questionType)
+
+    def convert(self, kind, formula, convert):
+        if not isinstance(formula, CachedRelexFormula):
+            return convert(formula)
+        if kind not in formula.queries:
+            formula.queries[kind] = convert(formula.formula)
+        return formula.queries[kind]
+
+    def convertToOpencogScheme(self, formula):
+        return self.convert('default', formula, self.converter.convertToOpencogScheme)
+
+    def convertToOpencogSchemePM(self, formula):
+        return self.convert('PM', formula, self.converter.convertToOpencogSchemePM)
+
+    def convertToOpencogSchemeURE(self, formula):
+        return self.convert('URE', formula, self.converter.convertToOpencogSchemeURE)
+
+    def preload(self, fileName, use_pm=True):
+        """
+        Parse questions from file and put them into the cache
+
+        File contains either parsed questions records (see record.py) or one
+        question per line optionally prefixed by a count, like output of
+        'uniq -c'. Most frequent questions are expected first, only first
+        maxsize questions are loaded.
+
+        :param fileName: str
+        :param use_pm: bool
+            kind of scheme queries to precompute
+        :return: int
+            number of loaded questions
+        """
+        questions = []
+        keys = set()
+        with open(fileName, 'r') as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                if '::' in line:
+                    # questionId::questionType::question::...
+                    question = line.split('::')[2]
+                else:
+                    question = re.sub(r'^\d+\s+', '', line)
+                key = normalizeQuestion(question, ignoreCase=False)
+                if key in keys:
+                    continue
+                keys.add(key)
+                questions.append(question)
+                if len(questions) >= self.cache.maxsize:
+                    break
+        # load in reverse order to evict the least frequent questions first
+        for question in reversed(questions):
+            try:
+                formula = self.getFormula(question)
+                if use_pm:
+                    self.convertToOpencogSchemePM(formula)
+                else:
+                    self.convertToOpencogSchemeURE(formula)
+            except Exception as e:
+                self.logger.warning('cannot parse question "%s": %s', question, e)
+        self.logger.info('%d questions preloaded from %s', len(questions), fileName)
+        return len(questions)
@@ -0,0 +1,265 @@
+"""
+Question parser process which owns the JVM
+
+jpype is not thread safe and JVM takes a lot of memory, so instead of
+starting JVM in each VQA worker, one parser process runs
+QuestionToOpencogConverter and answers requests over a Unix socket.
+QuestionParserClient implements the same interface as the converter and
+does not need jpype.
+
+Start the parser:
+    python3 question_parser.py --address /tmp/question-parser.sock
+"""
+
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+
+from multiprocessing.connection import Listener, Client
+
+from question_converter import CachingQuestionConverter, ParsedQuestion
+
+
+question2atomeseLibraryPath = ('../question2atomese/target/question2atomese-1.0-SNAPSHOT.jar')
+
+
+class RelexFormulaSnapshot:
+    """
+    Copy of org.opencog.vqa.relex.RelexFormula which can be passed between
+    processes, it keeps the question to convert the formula into query
+    """
+    __slots__ = ['question', 'fullFormula', 'shortFormula', 'groundedFormula', 'text']
+
+    def __init__(self, question, fullFormula, shortFormula, groundedFormula, text):
+        self.question = question
+        self.fullFormula = fullFormula
+        self.shortFormula = shortFormula
+        self.groundedFormula = groundedFormula
+        self.text = text
+
+    @classmethod
+    def fromFormula(cls, question, formula):
+        return cls(question, str(formula.getFullFormula()), str(formula.getShortFormula()),
+                   str(formula.getGroundedFormula()), str(formula.toString()))
+
+    def getFullFormula(self):
+        return self.fullFormula
+
+    def getShortFormula(self):
+        return self.shortFormula
+
+    def getGroundedFormula(self):
+        return self.groundedFormula
+
+    def toString(self):
+        return self.text
+
+    def __str__(self):
+        return self.text
+
+
+class QuestionParserServer:
+    """
+    Serves parse and convert requests, JVM is used only from the thread
+    which calls serveForever()
+
+    Each client message is a list of calls, reply is a list of
+    ('ok', result) or ('error', message) in the same order. Calls are
+    ('parse', question) and ('convert', kind, question) where kind is
+    'PM', 'URE' or 'default'.
+    """
+
+    def __init__(self, converter, address, maxBatch=64):
+        """
+        :param converter: CachingQuestionConverter
+        :param address: str
+            path to the Unix socket
+        :param maxBatch: int
+            maximum number of client messages processed at once
+        """
+        self.converter = converter
+        self.address = address
+        self.maxBatch = maxBatch
+        self.requests = queue.Queue()
+        self.logger = logging.getLogger('QuestionParserServer')
+
+    def serveForever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        # messages are pickled, allow only the current user to connect, the
+        # socket is created already restricted so there is no window to connect
+        umask = os.umask(0o177)
+        try:
+            listener = Listener(self.address, family='AF_UNIX')
+        finally:
+            os.umask(umask)
+        os.chmod(self.address, 0o600)
+        threading.Thread(target=self.accept, args=(listener,), name='accept',
+                         daemon=True).start()
+        self.logger.info('listening at %s', self.address)
+        while True:
+            batch = [self.requests.get()]
+            while len(batch) < self.maxBatch:
+                try:
+                    batch.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+            for connection, calls in batch:
+                replies = [self.process(call) for call in calls]
+                try:
+                    connection.send(replies)
+                except (OSError, EOFError) as e:
+                    self.logger.warning('cannot send reply: %s', e)
+
+    def accept(self, listener):
+        while True:
+            connection = listener.accept()
+            threading.Thread(target=self.receive, args=(connection,), name='receive',
+                             daemon=True).start()
+
+    def receive(self, connection):
+        while True:
+            try:
+                calls = connection.recv()
+            except (OSError, EOFError):
+                connection.close()
+                return
+            self.requests.put((connection, calls))
+
+    def process(self, call):
+        try:
+            if call[0] == 'parse':
+                question = call[1]
+                formula = self.converter.getFormula(question)
+                questionType = formula.questionType
+                return ('ok', ParsedQuestion(
+                    RelexFormulaSnapshot.fromFormula(question, formula.formula),
+                    None if questionType is None else str(questionType)))
+            if call[0] == 'convert':
+                kind, question = call[1], call[2]
+                formula = self.converter.getFormula(question)
+                if kind == 'PM':
+                    query = self.converter.convertToOpencogSchemePM(formula)
+                elif kind == 'URE':
+                    query = self.converter.convertToOpencogSchemeURE(formula)
+                else:
+                    query = self.converter.convertToOpencogScheme(formula)
+                return ('ok', None if query is None else str(query))
+            return ('error', 'unknown call {0}'.format(call[0]))
+        except Exception as e:
+            self.logger.exception(e)
+            return ('error', str(e))
+
+
+class QuestionParserClient:
+    """
+    Client of QuestionParserServer with the interface of
+    QuestionToOpencogConverter, each thread uses its own connection
+    """
+
+    def __init__(self, address, connectTimeout=60):
+        """
+        :param address: str
+            path to the Unix socket
+        :param connectTimeout: float
+            seconds to wait for the parser to start
+        """
+        self.address = address
+        self.connectTimeout = connectTimeout
+        self.local = threading.local()
+
+    @property
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            deadline = time.monotonic() + self.connectTimeout
+            while True:
+                try:
+                    connection = Client(self.address, family='AF_UNIX')
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.1)
+            self.local.connection = connection
+        return connection
+
+    def call(self, calls):
+        """
+        Send several calls in one message
+
+        :return: List[Any]
+            results in the same order as calls
+        :raises RuntimeError: if any call failed
+        """
+        connection = self.connection
+        try:
+            connection.send(calls)
+            replies = connection.recv()
+        except (OSError, EOFError) as e:
+            self.local.connection = None
+            raise RuntimeError('question parser is not available: {0}'.format(e))
+        results = []
+        for status, result in replies:
+            if status != 'ok':
+                raise RuntimeError('question parser: {0}'.format(result))
+            results.append(result)
+        return results
+
+    def parseQuestionAndType(self, question):
+        return self.call([('parse', question)])[0]
+
+    def parseQuestionsAndTypes(self, questions):
+        return self.call([('parse', question) for question in questions])
+
+    def parseQuestion(self, question):
+        return self.parseQuestionAndType(question).relexFormula
+
+    def convertToOpencogScheme(self, formula):
+        return self.call([('convert', 'default', formula.question)])[0]
+
+    def convertToOpencogSchemePM(self, formula):
+        return self.call([('convert', 'PM', formula.question)])[0]
+
+    def convertToOpencogSchemeURE(self, formula):
+        return self.call([('convert', 'URE', formula.question)])[0]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Question parser process')
+    parser.add_argument('--address', type=str, required=True,
+                        help='path to the Unix socket')
+    parser.add_argument('--question2atomese-java-library', dest='q2aJarFilenName',
+                        type=str, default=question2atomeseLibraryPath,
+                        help='path to question2atomese-<version>.jar')
+    parser.add_argument('--cache-size', type=int, default=100000,
+                        help='number of parsed questions to cache (default=100000)')
+    parser.add_argument('--preload', type=str, default=None,
+                        help='file with frequent questions to parse at startup')
+    parser.add_argument('--max-batch', type=int, default=64,
+                        help='maximum number of client messages processed at once')
+    return parser.parse_args()
+
+
+def main():
+    import jpype
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    jpype.startJVM(jpype.getDefaultJVMPath(),
+                   '-Djava.class.path=' + str(args.q2aJarFilenName))
+    try:
+        converter = CachingQuestionConverter(
+            jpype.JClass('org.opencog.vqa.relex.QuestionToOpencogConverter')(),
+            args.cache_size)
+        if args.preload is not None:
+            converter.preload(args.preload)
+        QuestionParserServer(converter, args.address, args.max_batch).serveForever()
+    finally:
+        jpype.shutdownJVM()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+Answer questions file by several processes
+
+Questions are sharded by imageId, so all questions about the image are
+answered by the same worker and per-image caches are reused. Each worker
+starts its own JVM, atomspace and neural network runner. Answered questions
+are written to the checkpoint directory, when the run is restarted with the
+same checkpoint directory answered questions are not processed again but
+are counted in statistics.
+
+Run with the arguments of pattern_matcher_vqa.py and:
+    python3 sharded_evaluation.py ... --workers 32 --checkpoint checkpoint
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import zlib
+
+import jpype
+
+from interface import AnswerHandler, ChainAnswerHandler
+from pattern_matcher_vqa import (StatisticsAnswerHandler, readRecords,
+                                 createArgumentParser, buildPipeline,
+                                 printStatistics, initializeRootAndOpencogLogger)
+
+
+# seconds to wait before checking that workers are alive
+POLL_TIMEOUT = 1.0
+
+
+def shardOf(imageId, shards):
+    """
+    :return: int
+        index of the worker which answers questions about the image
+    """
+    imageId = imageId.strip()
+    if imageId.isdigit():
+        return int(imageId) % shards
+    return zlib.crc32(imageId.encode('utf-8')) % shards
+
+
+class CheckpointAnswerHandler(AnswerHandler):
+    """
+    Appends each answer to the checkpoint file as json line with
+    questionId and answer
+    """
+
+    def __init__(self, fileName):
+        self.file = open(fileName, 'a', buffering=1)
+
+    def onAnswer(self, record, answer):
+        self.file.write(json.dumps({'questionId': record.questionId,
+                                    'answer': answer}) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+def loadCheckpoint(checkpointDirectory):
+    """
+    :return: Dict[str, str]
+        answer by questionId of the answered questions
+    """
+    answers = {}
+    if checkpointDirectory is None or not os.path.isdir(checkpointDirectory):
+        return answers
+    for fileName in sorted(os.listdir(checkpointDirectory)):
+        with open(os.path.join(checkpointDirectory, fileName), 'r') as file:
+            for line in file:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    # line is not complete if worker was killed while writing
+                    continue
+                answers[item['questionId']] = item['answer']
+    return answers
+
+
+def checkpointFileName(checkpointDirectory, shard):
+    return os.path.join(checkpointDirectory, 'answers-{0}-{1}.jsonl'.format(shard, os.getpid()))
+
+
+def workerMain(args, shard, records, results, checkpointDirectory):
+    """
+    Answer records from the queue until None is received, then put
+    (shard, StatisticsAnswerHandler) into results queue
+    """
+    logger = logging.getLogger('ShardWorker')
+    statisticsAnswerHandler = StatisticsAnswerHandler()
+    handlers = [statisticsAnswerHandler]
+    checkpoint = None
+    if checkpointDirectory is not None:
+        checkpoint = CheckpointAnswerHandler(checkpointFileName(checkpointDirectory, shard))
+        handlers.append(checkpoint)
+    jpype.startJVM(jpype.getDefaultJVMPath(),
+                   '-Djava.class.path=' + str(args.q2aJarFilenName))
+    try:
+        pipeline = buildPipeline(args, ChainAnswerHandler(handlers))
+        while True:
+            record = records.get()
+            if record is None:
+                break
+            try:
+                pipeline.answerQuestion(record, use_pm=args.use_pm)
+            except BaseException as e:
+                logger.exception('Unexpected exception %s', e)
+        results.put((shard, statisticsAnswerHandler))
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        jpype.shutdownJVM()
+
+
+class ShardedEvaluation:
+    """
+    Distributes questions between worker processes and merges statistics
+    """
+
+    def __init__(self, args, workers, checkpointDirectory=None, queueSize=1000):
+        """
+        :param args: argparse.Namespace
+            arguments of pattern_matcher_vqa.py, each worker builds the
+            pipeline using them
+        :param workers: int
+            number of worker processes
+        :param checkpointDirectory: str
+            directory to keep answered questions, None disables resuming
+        :param queueSize: int
+            maximum number of questions waiting in the queue of each worker
+        """
+        self.args = args
+        self.workers = workers
+        self.checkpointDirectory = checkpointDirectory
+        self.queueSize = queueSize
+        self.logger = logging.getLogger('ShardedEvaluation')
+
+    def run(self, questionsFileName):
+        """
+        :return: StatisticsAnswerHandler
+            statistics of all questions including the ones loaded from
+            the checkpoint
+        """
+        if self.checkpointDirectory is not None:
+            os.makedirs(self.checkpointDirectory, exist_ok=True)
+        answered = loadCheckpoint(self.checkpointDirectory)
+        if answered:
+            self.logger.info('%s questions are loaded from checkpoint', len(answered))
+        statistics = StatisticsAnswerHandler()
+        results = multiprocessing.Queue()
+        queues = [multiprocessing.Queue(self.queueSize) for _ in range(self.workers)]
+        processes = [multiprocessing.Process(target=workerMain, name='shard-{0}'.format(shard),
+                                             args=(self.args, shard, queues[shard], results,
+                                                   self.checkpointDirectory))
+                     for shard in range(self.workers)]
+        for process in processes:
+            process.start()
+        try:
+            for record in readRecords(questionsFileName):
+                if record.questionId in answered:
+                    statistics.onNewQuestion(record)
+                    statistics.onAnswer(record, answered[record.questionId])
+                    continue
+                shard = shardOf(record.imageId, self.workers)
+                self.put(queues[shard], record, processes[shard])
+            for shard in range(self.workers):
+                self.put(queues[shard], None, processes[shard])
+            pending = set(range(self.workers))
+            while pending:
+                try:
+                    shard, shardStatistics = results.get(timeout=POLL_TIMEOUT)
+                except queue.Empty:
+                    self.checkAlive(processes[shard] for shard in pending)
+                    continue
+                statistics.merge(shardStatistics)
+                pending.discard(shard)
+        except BaseException:
+            for process in processes:
+                process.terminate()
+            raise
+        for process in processes:
+            process.join()
+        return statistics
+
+    def put(self, workerQueue, record, process):
+        while True:
+            try:
+                workerQueue.put(record, timeout=POLL_TIMEOUT)
+                return
+            except queue.Full:
+                self.checkAlive([process])
+
+    def checkAlive(self, processes):
+        # worker exits successfully only after its statistics are sent
+        for process in processes:
+            if not process.is_alive() and process.exitcode != 0:
+                raise RuntimeError('{0} exited with code {1}'.format(process.name,
+                                                                     process.exitcode))
+
+
+def parse_args():
+    parser = createArgumentParser()
+    parser.add_argument('--workers', dest='workers', action='store', type=int,
+        default=multiprocessing.cpu_count(),
+        help='number of worker processes (default is number of cpus)')
+    parser.add_argument('--checkpoint', dest='checkpointDirectory', action='store', type=str,
+        help='directory to save answered questions, run is resumed if it exists')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    initializeRootAndOpencogLogger(args.opencogLogLevel, args.pythonLogLevel)
+    statistics = ShardedEvaluation(args, args.workers, args.checkpointDirectory).run(
+        args.questionsFileName)
+    printStatistics(statistics)
+
+
+if __name__ == '__main__':
+    main()
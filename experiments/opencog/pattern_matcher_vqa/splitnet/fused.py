@@ -0,0 +1,116 @@
+"""
+Fused inference of all split multidnn word networks
+
+Each word network is Linear(2048, 64) -> ReLU -> Linear(64, 32) -> ReLU ->
+Linear(32, 1) -> Sigmoid. Weights of all networks are stacked into
+K x 2048 x 64, K x 64 x 32 and K x 32 x 1 arrays, so any subset of words is
+scored against any set of bounding boxes with a few batched matrix
+multiplications instead of one module call per word.
+
+Computation is done in numpy, so the weights may be memory mapped arrays.
+"""
+
+import numpy
+
+
+WEIGHT_NAMES = ['w1', 'b1', 'w2', 'b2', 'w3', 'b3']
+
+
+class FusedSplitNets:
+
+    def __init__(self, words, weights, thresholds):
+        """
+        :param words: List[str]
+            word of each stacked network
+        :param weights: Dict[str, numpy.ndarray]
+            w1: K x 2048 x 64, b1: K x 64, w2: K x 64 x 32, b2: K x 32,
+            w3: K x 32 x 1, b3: K x 1
+        :param thresholds: numpy.ndarray
+            threshold of each word network
+        """
+        self.words = list(words)
+        self.row_by_word = {word: i for i, word in enumerate(self.words)}
+        self.weights = weights
+        self.thresholds = numpy.asarray(thresholds, dtype=numpy.float32)
+        # f(x) > threshold is checked as f(x) - delta > 0.5
+        self.deltas = self.thresholds - numpy.float32(0.5)
+
+    @classmethod
+    def from_nets_vocab(cls, nets_vocab):
+        """
+        Stack weights of the networks loaded by SplitNetsVocab
+
+        :param nets_vocab: splitnet.splitmultidnnmodel.SplitNetsVocab
+        :return: FusedSplitNets
+        """
+        ids = sorted(nets_vocab.models.keys())
+        layers = {name: [] for name in WEIGHT_NAMES}
+        for word_id in ids:
+            linear = [module for module in nets_vocab.models[word_id]
+                      if hasattr(module, 'weight')]
+            for i, module in enumerate(linear, 1):
+                # nn.Linear computes x * weight^T + bias
+                layers['w{0}'.format(i)].append(module.weight.detach().cpu().numpy().T)
+                layers['b{0}'.format(i)].append(module.bias.detach().cpu().numpy())
+        weights = {name: numpy.ascontiguousarray(numpy.stack(arrays), dtype=numpy.float32)
+                   for name, arrays in layers.items()}
+        words = [nets_vocab.dictionary.idx2word[word_id] for word_id in ids]
+        thresholds = [nets_vocab.thresholds_by_id[word_id] for word_id in ids]
+        return cls(words, weights, thresholds)
+
+    def __len__(self):
+        return len(self.words)
+
+    def rows(self, words):
+        """
+        :return: List[int]
+            row of each word, None if there is no network for the word
+        """
+        return [self.row_by_word.get(word) for word in words]
+
+    def score_rows(self, features, rows):
+        """
+        Score bounding boxes by the networks in rows
+
+        :param features: numpy.ndarray
+            bounding boxes x 2048
+        :param rows: numpy.ndarray or slice
+            indexes of the networks
+        :return: numpy.ndarray
+            len(rows) x bounding boxes, thresholded scores
+        """
+        x = numpy.asarray(features, dtype=numpy.float32)
+        w = self.weights
+        # (B x 2048) x (k x 2048 x 64) -> k x B x 64
+        hidden = numpy.matmul(x, w['w1'][rows]) + w['b1'][rows][:, numpy.newaxis, :]
+        numpy.maximum(hidden, 0, out=hidden)
+        hidden = numpy.matmul(hidden, w['w2'][rows]) + w['b2'][rows][:, numpy.newaxis, :]
+        numpy.maximum(hidden, 0, out=hidden)
+        logits = numpy.matmul(hidden, w['w3'][rows])[:, :, 0] + w['b3'][rows]
+        with numpy.errstate(over='ignore'):
+            probabilities = 1.0 / (1.0 + numpy.exp(-logits))
+        # take max to keep values in valid range (0, 1)
+        return numpy.maximum(probabilities - self.deltas[rows][:, numpy.newaxis], 0)
+
+    def score_all(self, features):
+        """
+        :return: numpy.ndarray
+            all networks x bounding boxes
+        """
+        return self.score_rows(features, slice(None))
+
+    def score(self, features, words):
+        """
+        Score bounding boxes by the networks of the words
+
+        :return: Tuple[numpy.ndarray, numpy.ndarray]
+            len(words) x bounding boxes scores and boolean mask of the words
+            which have networks, scores of the unknown words are zeros
+        """
+        rows = self.rows(words)
+        known = numpy.array([row is not None for row in rows], dtype=bool)
+        scores = numpy.zeros((len(words), len(features)), dtype=numpy.float32)
+        if known.any():
+            scores[known] = self.score_rows(features, numpy.array(
+                [row for row in rows if row is not None]))
+        return scores, known
@@ -0,0 +1,111 @@
+"""
+Single file format for the split multidnn models
+
+Layout:
+    8 bytes   magic 'SPLITNET'
+    4 bytes   format version, little endian uint32
+    4 bytes   header length, little endian uint32
+    header    json with words, thresholds and array descriptions
+    arrays    raw little endian arrays, each aligned to 64 bytes
+
+Arrays are memory mapped read-only, so loading is fast and several
+processes loading the same file share memory pages.
+
+Convert models directory:
+    python3 -m splitnet.packed <models directory> <output file>
+"""
+
+import argparse
+import json
+import struct
+
+import numpy
+
+from splitnet.fused import FusedSplitNets, WEIGHT_NAMES
+
+
+MAGIC = b'SPLITNET'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+PREAMBLE = struct.Struct('<8sII')
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save_packed(path, fused):
+    """
+    :param path: str
+        output file
+    :param fused: splitnet.fused.FusedSplitNets
+    """
+    arrays = [(name, numpy.ascontiguousarray(fused.weights[name], dtype='<f4'))
+              for name in WEIGHT_NAMES]
+    descriptions = {}
+    offset = 0
+    for name, array in arrays:
+        descriptions[name] = {'dtype': array.dtype.str, 'shape': list(array.shape),
+                              'offset': offset}
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({'words': fused.words,
+                         'thresholds': [float(th) for th in fused.thresholds],
+                         'arrays': descriptions}).encode('utf-8')
+    data_start = _align(PREAMBLE.size + len(header))
+    with open(path, 'wb') as file:
+        file.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        file.write(header)
+        for name, array in arrays:
+            file.seek(data_start + descriptions[name]['offset'])
+            file.write(array.tobytes())
+
+
+def load_packed(path):
+    """
+    :param path: str
+        file written by save_packed
+    :return: splitnet.fused.FusedSplitNets
+        engine with memory mapped weights
+    """
+    with open(path, 'rb') as file:
+        magic, version, header_length = PREAMBLE.unpack(file.read(PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError('{0} is not a packed split multidnn model'.format(path))
+        if version != FORMAT_VERSION:
+            raise ValueError('{0} has unsupported format version {1}'.format(path, version))
+        header = json.loads(file.read(header_length).decode('utf-8'))
+    data_start = _align(PREAMBLE.size + header_length)
+    weights = {}
+    for name, description in header['arrays'].items():
+        weights[name] = numpy.memmap(path, dtype=numpy.dtype(description['dtype']), mode='r',
+                                     offset=data_start + description['offset'],
+                                     shape=tuple(description['shape']))
+    return FusedSplitNets(header['words'], weights, header['thresholds'])
+
+
+def is_packed(path):
+    try:
+        with open(path, 'rb') as file:
+            return file.read(len(MAGIC)) == MAGIC
+    except (IsADirectoryError, FileNotFoundError):
+        return False
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Pack split multidnn models into one file')
+    parser.add_argument('models', type=str,
+                        help='models directory with dictionary.pkl, networks and thresholds')
+    parser.add_argument('output', type=str, help='output file')
+    return parser.parse_args()
+
+
+def main():
+    from splitnet.splitmultidnnmodel import SplitNetsVocab
+    args = parse_args()
+    fused = FusedSplitNets.from_nets_vocab(SplitNetsVocab(args.models))
+    save_packed(args.output, fused)
+    print('{0} networks written to {1}'.format(len(fused), args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,8 @@ import sys
 import logging
 
 from splitnet.dictionary import Dictionary
+from splitnet.fused import FusedSplitNets
+from splitnet.packed import load_packed, is_packed
 
 from interface import NeuralNetworkRunner, NoModelException
 import numpy
@@ -105,28 +107,33 @@ class SplitNetsVocab(INetsVocab):
 class SplitMultidnnRunner(NeuralNetworkRunner):
     """
     Class for running multi-nn models with custom thresholds
+
+    Models are loaded either from the models directory or from the single
+    file written by splitnet.packed. All networks are run by the fused
+    engine, pytorch modules loaded from the directory are released once
+    their weights are stacked, so the weights are kept in memory once.
     """
     def __init__(self, models_directory):
-        self.nets_vocabulary = SplitNetsVocab(models_directory)
+        if is_packed(models_directory):
+            self.fused = load_packed(models_directory)
+        else:
+            self.fused = FusedSplitNets.from_nets_vocab(SplitNetsVocab(models_directory))
 
     def runNeuralNetwork(self, features, word):
-        logger.debug("processing word {0}".format(word))
-        try:
-            model = self.nets_vocabulary.get_model_by_word(word)
-        except KeyError as e:
-            logger.debug("No model for word {0}".format(word))
-            model = None
-
-        if model is None:
-            logger.debug('no model found, return FALSE')
+        return torch.tensor(float(self.runNeuralNetworkBatch([features], word)[0]))
+
+    def runNeuralNetworkBatch(self, features, word):
+        row = self.fused.rows([word])[0]
+        if row is None:
             raise NoModelException("No model for word: {0}".format(word))
+        return self.fused.score_rows(features, [row])[0]
+
+    def runNeuralNetworkWords(self, features, words):
+        """
+        Score bounding boxes by networks of several words at once
 
-        # todo: threshold should be part of the model
-        threshold = self.nets_vocabulary.get_threshold_by_word(word)
-        # use threshold = 0.5 + delta
-        # instead of f(x) > 0.5 + delta
-        # we will check for f(x) - delta > 0.5, where delta = threshold - 0.5
-        delta = threshold - 0.5
-        result = model(torch.Tensor(features))
-        # take max to keep values in valid range (0, 1)
-        return max(torch.tensor(0.0), result - delta)
+        :return: Tuple[numpy.ndarray, numpy.ndarray]
+            words x bounding boxes scores and mask of the words which have
+            networks
+        """
+        return self.fused.score(features, words)
@@ -0,0 +1,178 @@
+"""
+Compare fused inference with running the word networks one by one
+
+Run from pattern_matcher_vqa directory:
+    python3 -m unittest splitnet.test_fused
+"""
+
+import gc
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from splitnet.fused import FusedSplitNets
+
+try:
+    import torch
+    import torch.nn as nn
+    from splitnet.dictionary import Dictionary
+    from splitnet.splitmultidnnmodel import SplitMultidnnRunner
+except ImportError:
+    torch = None
+
+
+def randomFused(random, words, inputs=2048):
+    weights = {
+        'w1': random.normal(0, 0.05, (len(words), inputs, 64)),
+        'b1': random.normal(0, 0.1, (len(words), 64)),
+        'w2': random.normal(0, 0.2, (len(words), 64, 32)),
+        'b2': random.normal(0, 0.1, (len(words), 32)),
+        'w3': random.normal(0, 0.5, (len(words), 32, 1)),
+        'b3': random.normal(0, 0.1, (len(words), 1)),
+    }
+    weights = {name: array.astype(numpy.float32) for name, array in weights.items()}
+    thresholds = random.uniform(0.3, 0.7, len(words))
+    return FusedSplitNets(words, weights, thresholds)
+
+
+def referenceScores(fused, features, word):
+    """
+    Network of one word applied to each bounding box separately
+    """
+    row = fused.words.index(word)
+    w = {name: array[row] for name, array in fused.weights.items()}
+    scores = []
+    for x in numpy.asarray(features, dtype=numpy.float64):
+        hidden = numpy.maximum(x.dot(w['w1']) + w['b1'], 0)
+        hidden = numpy.maximum(hidden.dot(w['w2']) + w['b2'], 0)
+        probability = 1.0 / (1.0 + numpy.exp(-(hidden.dot(w['w3']) + w['b3'])[0]))
+        scores.append(max(0.0, probability - (fused.thresholds[row] - 0.5)))
+    return numpy.array(scores)
+
+
+def torchNetwork():
+    return nn.Sequential(nn.Linear(2048, 64), nn.ReLU(),
+                         nn.Linear(64, 32), nn.ReLU(),
+                         nn.Linear(32, 1), nn.Sigmoid())
+
+
+def torchScores(model, threshold, features):
+    """
+    Network of one word run by pytorch on each bounding box, as
+    SplitMultidnnRunner.runNeuralNetwork did before the fused engine
+    """
+    delta = threshold - 0.5
+    return [max(torch.tensor(0.0), model(torch.Tensor(x)) - delta).item() for x in features]
+
+
+def liveLinearModules():
+    gc.collect()
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, nn.Linear))
+
+
+class FakeDictionary:
+
+    def __init__(self, words):
+        self.idx2word = list(words)
+
+
+class FakeNetsVocab:
+    """
+    The attributes of SplitNetsVocab which are used by from_nets_vocab
+    """
+
+    def __init__(self, words, models, thresholds):
+        self.dictionary = FakeDictionary(words)
+        self.models = models
+        self.thresholds_by_id = thresholds
+
+
+class FusedSplitNetsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.random = numpy.random.RandomState(42)
+        self.words = ['red', 'blue', 'shirt', 'zebra', 'striped']
+        self.fused = randomFused(self.random, self.words)
+        self.features = self.random.uniform(0, 2, (7, 2048)).astype(numpy.float32)
+
+    def test_score_rows(self):
+        for row, word in enumerate(self.words):
+            numpy.testing.assert_allclose(self.fused.score_rows(self.features, [row])[0],
+                                          referenceScores(self.fused, self.features, word),
+                                          rtol=1e-4, atol=1e-6)
+
+    def test_score_words(self):
+        words = ['zebra', 'unknown', 'red', 'zebra']
+        scores, known = self.fused.score(self.features, words)
+        self.assertEqual(scores.shape, (4, 7))
+        numpy.testing.assert_array_equal(known, [True, False, True, True])
+        numpy.testing.assert_array_equal(scores[1], numpy.zeros(7))
+        for i in [0, 2, 3]:
+            numpy.testing.assert_allclose(scores[i],
+                                          referenceScores(self.fused, self.features, words[i]),
+                                          rtol=1e-4, atol=1e-6)
+
+    def test_unknown_words(self):
+        scores, known = self.fused.score(self.features, ['unknown'])
+        self.assertFalse(known.any())
+        numpy.testing.assert_array_equal(scores, numpy.zeros((1, 7)))
+
+    def test_score_all(self):
+        numpy.testing.assert_allclose(self.fused.score_all(self.features),
+                                      self.fused.score(self.features, self.words)[0])
+
+    def test_scores_are_in_range(self):
+        scores = self.fused.score_all(self.features)
+        self.assertTrue((scores >= 0).all())
+        self.assertTrue((scores < 1).all())
+
+    @unittest.skipIf(torch is None, 'torch is required')
+    def test_same_as_torch_networks(self):
+        models = {}
+        thresholds = {}
+        for word_id in range(len(self.words)):
+            models[word_id] = torchNetwork()
+            thresholds[word_id] = float(self.random.uniform(0.3, 0.7))
+        fused = FusedSplitNets.from_nets_vocab(FakeNetsVocab(self.words, models, thresholds))
+        scores, known = fused.score(self.features, self.words)
+        self.assertTrue(known.all())
+        for word_id, word in enumerate(self.words):
+            expected = torchScores(models[word_id], thresholds[word_id], self.features)
+            numpy.testing.assert_allclose(scores[word_id], expected, rtol=1e-4, atol=1e-6)
+
+    @unittest.skipIf(torch is None, 'torch is required')
+    def test_runner_releases_torch_modules(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        os.makedirs(os.path.join(directory, 'networks'))
+        os.makedirs(os.path.join(directory, 'thresholds'))
+        Dictionary({word: i for i, word in enumerate(self.words)},
+                   list(self.words)).dump_to_file(os.path.join(directory, 'dictionary.pkl'))
+        thresholds = {}
+        expected = {}
+        for word_id, word in enumerate(self.words):
+            model = torchNetwork()
+            torch.save(model.state_dict(), os.path.join(
+                directory, 'networks', 'best_loss_model_{0}.pth'.format(word_id)))
+            thresholds[str(word_id)] = float(self.random.uniform(0.3, 0.7))
+            expected[word] = torchScores(model, thresholds[str(word_id)], self.features)
+        with open(os.path.join(directory, 'thresholds', 'best_th.json'), 'w') as file:
+            json.dump(thresholds, file)
+        del model
+        before = liveLinearModules()
+        runner = SplitMultidnnRunner(directory)
+        self.assertEqual(liveLinearModules(), before)
+        scores, known = runner.runNeuralNetworkWords(self.features, self.words)
+        self.assertTrue(known.all())
+        for row, word in enumerate(self.words):
+            numpy.testing.assert_allclose(scores[row], expected[word], rtol=1e-4, atol=1e-6)
+            self.assertAlmostEqual(runner.runNeuralNetwork(self.features[3], word).item(),
+                                   expected[word][3], places=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Save and load packed split multidnn models
+
+Run from pattern_matcher_vqa directory:
+    python3 -m unittest splitnet.test_packed
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from splitnet.fused import WEIGHT_NAMES
+from splitnet.packed import save_packed, load_packed, is_packed
+from splitnet.test_fused import randomFused
+
+
+class PackedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.random = numpy.random.RandomState(0)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'models.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        fused = randomFused(self.random, ['red', 'blue', 'shirt'], inputs=16)
+        save_packed(self.path, fused)
+        loaded = load_packed(self.path)
+        self.assertEqual(loaded.words, fused.words)
+        numpy.testing.assert_array_equal(loaded.thresholds, fused.thresholds)
+        for name in WEIGHT_NAMES:
+            self.assertIsInstance(loaded.weights[name], numpy.memmap)
+            numpy.testing.assert_array_equal(loaded.weights[name], fused.weights[name])
+        features = self.random.uniform(0, 2, (5, 16)).astype(numpy.float32)
+        words = ['shirt', 'unknown', 'red']
+        expected, expectedKnown = fused.score(features, words)
+        scores, known = loaded.score(features, words)
+        numpy.testing.assert_array_equal(known, expectedKnown)
+        numpy.testing.assert_array_equal(scores, expected)
+
+    def test_arrays_are_aligned(self):
+        save_packed(self.path, randomFused(self.random, ['a', 'b', 'c'], inputs=7))
+        loaded = load_packed(self.path)
+        for name in WEIGHT_NAMES:
+            self.assertEqual(loaded.weights[name].offset % 64, 0)
+
+    def test_is_packed(self):
+        save_packed(self.path, randomFused(self.random, ['red'], inputs=4))
+        self.assertTrue(is_packed(self.path))
+        self.assertFalse(is_packed(self.directory))
+        self.assertFalse(is_packed(os.path.join(self.directory, 'missing')))
+
+    def test_wrong_file(self):
+        with open(self.path, 'wb') as file:
+            file.write(b'not a model at all')
+        self.assertFalse(is_packed(self.path))
+        with self.assertRaises(ValueError):
+            load_packed(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+"""
+This module is used to report duration of the pipeline stages
+
+Set observer to a function which accepts stage name and duration in
+seconds to collect timings, by default timings are not measured.
+"""
+
+import contextlib
+import time
+
+observer = None
+
+
+@contextlib.contextmanager
+def stage(name):
+    if observer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observer(name, time.perf_counter() - start)
@@ -0,0 +1,116 @@
+"""
+Size bounded LRU cache and answer cache tests
+
+Run from pattern_matcher_vqa directory:
+    python3 -m unittest test_cache
+"""
+
+import time
+import unittest
+
+import numpy as np
+
+from cache import LruCache, AnswerCache, arrayDigest, normalizeQuestion
+
+
+class LruCacheTest(unittest.TestCase):
+
+    def test_least_recently_used_is_evicted(self):
+        cache = LruCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_put_replaces_value(self):
+        cache = LruCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.put('a', 10)
+        cache.put('c', 3)
+        self.assertEqual(cache.get('a'), 10)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.cache_info().currsize, 2)
+
+    def test_size_of_values(self):
+        cache = LruCache(10, getsizeof=len)
+        cache.put('a', 'xxxx')
+        cache.put('b', 'yyyy')
+        cache.put('c', 'zzzz')
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.cache_info().currsize, 8)
+        # value larger than the cache is not stored
+        cache.put('d', 'w' * 11)
+        self.assertNotIn('d', cache)
+        self.assertIn('c', cache)
+
+    def test_hits_and_misses(self):
+        cache = LruCache(2)
+        cache.put('a', 1)
+        cache.get('a')
+        cache.get('a')
+        cache.get('b')
+        self.assertEqual(cache.cache_info(), (2, 1, 2, 1))
+
+    def test_default(self):
+        cache = LruCache(2)
+        self.assertEqual(cache.get('a', 'default'), 'default')
+
+    def test_ttl(self):
+        cache = LruCache(2, ttl=0.05)
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('a'))
+        info = cache.cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 1, 0))
+
+    def test_clear(self):
+        cache = LruCache(2)
+        cache.put('a', 1)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.cache_info().currsize, 0)
+
+
+class AnswerCacheTest(unittest.TestCase):
+
+    def test_same_question(self):
+        cache = AnswerCache(10)
+        cache.put('image', 'What color is the shirt?', True, 'red')
+        self.assertEqual(cache.get('image', 'what  color is the shirt', True), 'red')
+        self.assertIsNone(cache.get('other image', 'what color is the shirt', True))
+
+    def test_key_parts(self):
+        cache = AnswerCache(10, version='v1')
+        cache.put('image', 'is it red', True, 'yes')
+        self.assertIsNone(cache.get('image', 'is it red', False))
+        self.assertIsNone(cache.get('image', 'is it red', True, topK=3))
+        self.assertIsNone(AnswerCache(10, version='v2').get('image', 'is it red', True))
+        cache.put('image', 'is it red', True, 'candidates', topK=3)
+        self.assertEqual(cache.get('image', 'is it red', True), 'yes')
+        self.assertEqual(cache.get('image', 'is it red', True, topK=3), 'candidates')
+
+
+class KeysTest(unittest.TestCase):
+
+    def test_normalize_question(self):
+        self.assertEqual(normalizeQuestion('  What color  is\tthe Shirt ? '),
+                         normalizeQuestion('what color is the shirt'))
+        self.assertEqual(normalizeQuestion('  Is  Mary happy ? ', ignoreCase=False),
+                         'Is Mary happy')
+
+    def test_array_digest(self):
+        array = np.arange(12, dtype=np.uint8)
+        self.assertEqual(arrayDigest(array), arrayDigest(array.copy()))
+        self.assertNotEqual(arrayDigest(array.reshape(3, 4)), arrayDigest(array.reshape(4, 3)))
+        self.assertEqual(arrayDigest(array.reshape(3, 4).T),
+                         arrayDigest(np.ascontiguousarray(array.reshape(3, 4).T)))
+
+
+if __name__ == '__main__':
+    unittest.main()
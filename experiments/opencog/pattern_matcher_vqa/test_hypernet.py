@@ -0,0 +1,84 @@
+"""
+Batched HyperNet scores tests
+
+Run from pattern_matcher_vqa directory:
+    python3 -m unittest test_hypernet
+"""
+
+import logging
+import unittest
+
+import numpy
+
+from cache import LruCache
+
+try:
+    import torch
+    import torch.nn as nn
+    # hypernetimpl needs h5py and PIL besides torch
+    from hypernetimpl.dataset import Dictionary
+    from hypernet import HyperNetNeuralNetworkRunner
+    missingDependency = None
+except ImportError as e:
+    missingDependency = str(e)
+
+
+class TinyHyperNet(nn.Module if missingDependency is None else object):
+
+    def __init__(self, words, features=8, hidden=6):
+        super().__init__()
+        self.w_embed = nn.Embedding(words, 4)
+        self.q_fc_net = nn.Linear(4, hidden)
+        self.v_fc_net = nn.Linear(features, hidden)
+        self.prob_net = nn.Sequential(nn.Linear(hidden, 1), nn.Sigmoid())
+
+
+def tinyRunner():
+    torch.manual_seed(0)
+    runner = HyperNetNeuralNetworkRunner.__new__(HyperNetNeuralNetworkRunner)
+    runner.logger = logging.getLogger('HyperNetNeuralNetworkRunner')
+    runner.device = torch.device('cpu')
+    runner.dictionary = Dictionary({'red': 0, 'shirt': 1}, ['red', 'shirt'])
+    runner.model = TinyHyperNet(2)
+    runner.questionVectors = LruCache(2)
+    return runner
+
+
+@unittest.skipIf(missingDependency is not None, 'hypernet dependencies are required: {0}'.format(
+    missingDependency))
+class HyperNetRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.runner = tinyRunner()
+        self.features = numpy.random.RandomState(0).rand(3, 8).astype(numpy.float32)
+
+    def test_words_match_word_by_word(self):
+        scores, known = self.runner.runNeuralNetworkWords(self.features, ['Shirt', 'red'])
+        self.assertTrue(known.all())
+        for row, word in enumerate(['Shirt', 'red']):
+            numpy.testing.assert_allclose(
+                scores[row], self.runner.runNeuralNetworkBatch(self.features, word), rtol=1e-6)
+            numpy.testing.assert_allclose(
+                scores[row, 1], self.runner.runNeuralNetwork(self.features[1], word).item(),
+                rtol=1e-6)
+
+    def test_unknown_word(self):
+        # unknown words score zero with full certainty, as before batching
+        scores, known = self.runner.runNeuralNetworkWords(self.features, ['red', 'zebra'])
+        numpy.testing.assert_array_equal(scores[1], numpy.zeros(3))
+        numpy.testing.assert_array_equal(known, [True, True])
+        numpy.testing.assert_array_equal(
+            self.runner.runNeuralNetworkBatch(self.features, 'zebra'), numpy.zeros(3))
+        _, mask = self.runner.score(['red', 'zebra'], self.features)
+        numpy.testing.assert_array_equal(mask, [True, False])
+
+    def test_only_known_words_are_cached(self):
+        self.runner.score(['red', 'zebra', 'Shirt', 'shirt'], self.features)
+        # cache keeps the last two known words
+        self.assertEqual(len(self.runner.questionVectors), 2)
+        self.assertNotIn('zebra', self.runner.questionVectors)
+        self.assertNotIn('red', self.runner.questionVectors)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+Caching question converter tests
+
+Run from pattern_matcher_vqa directory:
+    python3 -m unittest test_question_converter
+"""
+
+import unittest
+
+from question_converter import CachingQuestionConverter, ParsedQuestion
+
+
+class Formula:
+    """
+    Formula of the question, capitalized words are proper nouns as in relex
+    """
+
+    def __init__(self, question):
+        self.question = question
+        words = question.rstrip('?').split()
+        self.groundedFormula = ';'.join('_name({0})'.format(word) if word[0].isupper()
+                                        and index > 0 else '_word({0})'.format(word.lower())
+                                        for index, word in enumerate(words))
+
+    def getGroundedFormula(self):
+        return self.groundedFormula
+
+
+class Converter:
+
+    def __init__(self):
+        self.parsed = []
+        self.converted = []
+
+    def parseQuestionAndType(self, question):
+        self.parsed.append(question)
+        return ParsedQuestion(Formula(question), 'yes/no')
+
+    def convertToOpencogSchemePM(self, formula):
+        self.converted.append(formula.question)
+        return 'query of ' + formula.getGroundedFormula()
+
+
+class CachingQuestionConverterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.converter = Converter()
+        self.cache = CachingQuestionConverter(self.converter, 10)
+
+    def test_same_formula_as_uncached(self):
+        for question in ['Is Mary happy?', 'is mary happy?', 'Is the dog of Mary brown?']:
+            with self.subTest(question=question):
+                expected = Converter().parseQuestionAndType(question)
+                parsed = self.cache.parseQuestionAndType(question)
+                self.assertEqual(parsed.relexFormula.getGroundedFormula(),
+                                 expected.relexFormula.getGroundedFormula())
+                self.assertEqual(parsed.questionType, expected.questionType)
+        self.assertEqual(self.converter.parsed,
+                         ['Is Mary happy?', 'is mary happy?', 'Is the dog of Mary brown?'])
+
+    def test_whitespace_and_question_mark(self):
+        first = self.cache.getFormula('Is  Mary happy?')
+        self.assertIs(self.cache.getFormula('Is Mary happy'), first)
+        self.assertIs(self.cache.getFormula(' Is Mary\thappy ? '), first)
+        self.assertEqual(self.converter.parsed, ['Is  Mary happy?'])
+
+    def test_queries_are_cached(self):
+        formula = self.cache.getFormula('Is Mary happy?')
+        query = self.cache.convertToOpencogSchemePM(formula)
+        self.assertEqual(self.cache.convertToOpencogSchemePM(
+            self.cache.getFormula('Is Mary happy')), query)
+        self.assertEqual(query, 'query of _word(is);_name(Mary);_word(happy)')
+        self.assertEqual(self.converter.converted, ['Is Mary happy?'])
+
+    def test_parsed_question(self):
+        parsed = self.cache.cacheParsedQuestion(
+            ParsedQuestion(Formula('Is Mary happy?'), 'yes/no'))
+        self.assertIs(self.cache.getFormula('Is Mary happy'), parsed.relexFormula)
+        self.assertIsNot(self.cache.getFormula('is mary happy'), parsed.relexFormula)
+
+
+if __name__ == '__main__':
+    unittest.main()
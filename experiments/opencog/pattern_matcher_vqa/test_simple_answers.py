@@ -0,0 +1,223 @@
+"""
+Compare answers from word scores with answers of pattern matcher queries
+
+Requires opencog, run from pattern_matcher_vqa directory:
+    python3 -m unittest test_simple_answers
+"""
+
+import unittest
+
+import numpy as np
+
+from interface import NoModelException
+
+try:
+    import __main__
+    import network_runner
+    from opencog.type_constructors import *
+    from util import initialize_atomspace_by_facts
+    from pattern_matcher_vqa import PatternMatcherVqaPipeline, runNeuralNetwork
+    from question_converter import ParsedQuestion
+    from question_parser import RelexFormulaSnapshot
+    missingDependency = None
+except ImportError as e:
+    missingDependency = str(e)
+
+
+# scores of the words for four bounding boxes, only box 2 is both shirt
+# and red, no box is both shirt and striped or a hat
+WORD_SCORES = {
+    'shirt': [0.9, 0.2, 0.8, 0.1],
+    'hat': [0.1, 0.3, 0.2, 0.4],
+    'red': [0.3, 0.9, 0.7, 0.2],
+    'blue': [0.4, 0.6, 0.3, 0.9],
+    'green': [0.2, 0.1, 0.1, 0.1],
+    'striped': [0.1, 0.9, 0.2, 0.95],
+}
+COLORS = ['red', 'blue', 'green', 'purple']
+
+
+def predadjQuery(object, state):
+    """
+    Query of YesNoPredadjToSchemeQueryConverter.getSchemeQueryPM()
+    """
+    andLink = ('  (AndLink\n'
+               '    (InheritanceLink (VariableNode "$X") (ConceptNode "BoundingBox"))\n'
+               '    (EvaluationLink (GroundedPredicateNode "py:runNeuralNetwork") '
+               '(ListLink (VariableNode "$X") (ConceptNode "{0}")) )\n'
+               '    (EvaluationLink (GroundedPredicateNode "py:runNeuralNetwork") '
+               '(ListLink (VariableNode "$X") (ConceptNode "{1}")) )\n'
+               '  )\n').format(object, state)
+    return ('(cog-execute! (BindLink\n'
+            '  (TypedVariableLink (VariableNode "$X") (TypeNode "ConceptNode"))\n' +
+            andLink + andLink + ')\n)')
+
+
+def detObjSubjQuery(attribute, object):
+    """
+    Query of WhatOtherDetObjSubjToSchemeQueryConverter.getSchemeQueryPM()
+    """
+    andLink = ('  (AndLink\n'
+               '    (InheritanceLink (VariableNode "$B") (ConceptNode "BoundingBox"))\n'
+               '    (InheritanceLink (VariableNode "$X") (ConceptNode "{0}"))\n'
+               '    (EvaluationLink (GroundedPredicateNode "py:runNeuralNetwork") '
+               '(ListLink (VariableNode "$B") (ConceptNode "{1}")) )\n'
+               '    (EvaluationLink (GroundedPredicateNode "py:runNeuralNetwork") '
+               '(ListLink (VariableNode "$B") (VariableNode "$X")) )\n'
+               '  )\n').format(attribute, object)
+    return ('(cog-execute! (BindLink\n'
+            '  (VariableList\n'
+            '    (TypedVariableLink (VariableNode "$B") (TypeNode "ConceptNode"))\n'
+            '    (TypedVariableLink (VariableNode "$X") (TypeNode "ConceptNode"))\n'
+            '  )\n' + andLink + andLink + ')\n)')
+
+
+class FixedScoresRunner:
+
+    def runNeuralNetworkBatch(self, features, word):
+        if word not in WORD_SCORES:
+            raise NoModelException('No model for word: {0}'.format(word))
+        return np.array(WORD_SCORES[word], dtype=np.float32)
+
+
+class FixtureConverter:
+    """
+    Returns queries of the grounded formulas, replaces JVM converter
+    """
+
+    def __init__(self, queries):
+        self.queries = queries
+
+    def convertToOpencogSchemePM(self, formula):
+        return self.queries[formula.getGroundedFormula()]
+
+
+def parsedQuestion(question, fullFormula, groundedFormula, questionType):
+    formula = RelexFormulaSnapshot(question, fullFormula, fullFormula, groundedFormula,
+                                   fullFormula)
+    return ParsedQuestion(formula, questionType)
+
+
+# question, full formula, grounded formula, question type, query and
+# expected answer and bounding box
+FIXTURES = [
+    ('is the shirt red', '_predadj(A, B)', '_predadj(shirt, red)', 'yes/no',
+     predadjQuery('shirt', 'red'), ('yes', 2)),
+    ('is the shirt striped', '_predadj(A, B)', '_predadj(shirt, striped)', 'yes/no',
+     predadjQuery('shirt', 'striped'), ('no', None)),
+    ('what color is the shirt', '_det(A, B);_obj(C, D);_subj(C, A)',
+     '_det(color, _$qVar);_obj(be, shirt);_subj(be, color)', 'other',
+     detObjSubjQuery('color', 'shirt'), ('red', 2)),
+    ('what color is the hat', '_det(A, B);_obj(C, D);_subj(C, A)',
+     '_det(color, _$qVar);_obj(be, hat);_subj(be, color)', 'other',
+     detObjSubjQuery('color', 'hat'), (None, None)),
+]
+
+
+@unittest.skipIf(missingDependency is not None, 'opencog is required: {0}'.format(
+    missingDependency))
+class FixturesTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # grounded predicate is looked up in __main__
+        __main__.runNeuralNetwork = runNeuralNetwork
+        network_runner.runner = FixedScoresRunner()
+        cls.atomspace = initialize_atomspace_by_facts()
+        set_type_ctor_atomspace(cls.atomspace)
+        for color in COLORS:
+            InheritanceLink(ConceptNode(color), ConceptNode('color'))
+        cls.converter = FixtureConverter({fixture[2]: fixture[4] for fixture in FIXTURES})
+        cls.features = np.zeros((4, 8), dtype=np.float32)
+        cls.boxes = np.zeros((4, 4), dtype=np.float32)
+
+    def pipeline(self, **kwargs):
+        return PatternMatcherVqaPipeline(None, self.converter, self.atomspace, None, **kwargs)
+
+    def answer(self, pipeline, question, fullFormula, groundedFormula, questionType):
+        return pipeline.answerQuestionByFeatures(
+            self.features, self.boxes, question, use_pm=True,
+            parsedQuestion=parsedQuestion(question, fullFormula, groundedFormula,
+                                          questionType))
+
+    def assertSameCandidates(self, first, second):
+        self.assertEqual([(candidate.answer, candidate.answerBox)
+                          for candidate in first.candidates],
+                         [(candidate.answer, candidate.answerBox)
+                          for candidate in second.candidates])
+
+
+class SimpleAnswersTest(FixturesTest):
+
+    def answer(self, simpleAnswers, *fixture):
+        return super().answer(self.pipeline(simpleAnswers=simpleAnswers), *fixture)
+
+    def test_same_answers(self):
+        for question, fullFormula, groundedFormula, questionType, _, expected in FIXTURES:
+            with self.subTest(question=question):
+                query = self.answer(False, question, fullFormula, groundedFormula,
+                                    questionType)
+                simple = self.answer(True, question, fullFormula, groundedFormula,
+                                     questionType)
+                self.assertEqual((query.answer, query.answerBox), expected)
+                self.assertEqual((simple.answer, simple.answerBox), expected)
+                self.assertEqual(simple.query, query.query)
+                self.assertSameCandidates(simple, query)
+
+
+class ImageLayerCacheTest(FixturesTest):
+
+    def test_same_answers_as_without_cache(self):
+        uncached = self.pipeline()
+        cached = self.pipeline(imageLayerCacheSize=2)
+        # each question is asked twice about the same image, bounding boxes
+        # keep values computed for the previous questions
+        for _ in range(2):
+            for question, fullFormula, groundedFormula, questionType, _, expected in FIXTURES:
+                with self.subTest(question=question):
+                    fixture = (question, fullFormula, groundedFormula, questionType)
+                    expectedAnswer = self.answer(uncached, *fixture)
+                    answer = self.answer(cached, *fixture)
+                    self.assertEqual((expectedAnswer.answer, expectedAnswer.answerBox),
+                                     expected)
+                    self.assertEqual((answer.answer, answer.answerBox), expected)
+                    self.assertSameCandidates(answer, expectedAnswer)
+        self.assertEqual((cached.imageLayers.misses, len(cached.imageLayers)), (1, 1))
+        self.assertEqual(cached.imageLayers.hits, 2 * len(FIXTURES) - 1)
+        cached.imageLayers.clear()
+
+
+@unittest.skipIf(missingDependency is not None, 'opencog is required: {0}'.format(
+    missingDependency))
+class OtherQuestionCandidatesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.atomspace = initialize_atomspace_by_facts()
+        set_type_ctor_atomspace(self.atomspace)
+        self.pipeline = PatternMatcherVqaPipeline(None, None, self.atomspace, None)
+
+    def boxResult(self, box, attribute, object):
+        """
+        (bounding box, attribute, object) result as returned by ure
+        """
+        boundingBox = ConceptNode('BoundingBox-{0}'.format(box))
+        for word in [attribute, object]:
+            boundingBox.set_value(ConceptNode(word), FloatValue(WORD_SCORES[word][box]))
+        return ('(ListLink (ConceptNode "BoundingBox-{0}") (ConceptNode "{1}") '
+                '(ConceptNode "{2}"))').format(box, attribute, object)
+
+    def test_box_results_have_box_ids(self):
+        results = [self.boxResult(box, attribute, 'shirt')
+                   for box, attribute in [(0, 'blue'), (2, 'red'), (1, 'red')]]
+        answer, box, _, candidates = self.pipeline.answerOtherQuestion(
+            '(SetLink {0})'.format(' '.join(results)), topK=3)
+        self.assertEqual((answer, box), ('blue', 0))
+        self.assertEqual([(candidate.answer, candidate.answerBox) for candidate in candidates],
+                         [('blue', 0), ('red', 2)])
+        # strength is probability of the attribute, confidence of the object
+        self.assertAlmostEqual(candidates[1].strength, WORD_SCORES['red'][2], places=6)
+        self.assertAlmostEqual(candidates[1].confidence, WORD_SCORES['shirt'][2], places=6)
+
+
+if __name__ == '__main__':
+    unittest.main()
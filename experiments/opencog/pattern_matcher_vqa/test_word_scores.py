@@ -0,0 +1,140 @@
+"""
+Word score table and answers from word scores tests
+
+Run from pattern_matcher_vqa directory:
+    python3 -m unittest test_word_scores
+"""
+
+import unittest
+
+import numpy as np
+
+from interface import NoModelException
+from word_scores import WordScoreTable, bestBoxesByWords, boundingBoxIndex, \
+    groundedFormulaRelations, groundedFormulaWords
+
+
+SCORES = {
+    'shirt': [0.9, 0.2, 0.8, 0.1],
+    'red': [0.3, 0.9, 0.7, 0.2],
+    'blue': [0.4, 0.6, 0.3, 0.9],
+}
+
+
+class OneWordRunner:
+
+    def __init__(self):
+        self.calls = []
+
+    def runNeuralNetworkBatch(self, features, word):
+        self.calls.append(word)
+        if word not in SCORES:
+            raise NoModelException('No model for word: {0}'.format(word))
+        return np.array(SCORES[word], dtype=np.float32)
+
+
+class WordsRunner(OneWordRunner):
+
+    def runNeuralNetworkWords(self, features, words):
+        self.calls.append(list(words))
+        scores = np.array([SCORES.get(word, [0.0] * len(features)) for word in words])
+        return scores, [word in SCORES for word in words]
+
+
+class WordScoreTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.features = np.zeros((4, 8), dtype=np.float32)
+
+    def test_words_are_scored_in_one_batch(self):
+        runner = WordsRunner()
+        table = WordScoreTable(runner, self.features)
+        table.precompute(['shirt', 'red', 'shirt', 'unknown'])
+        table.precompute(['red', 'blue'])
+        self.assertEqual(runner.calls, [['shirt', 'red', 'unknown'], ['blue']])
+        scores, certainty = table.getScores('unknown')
+        np.testing.assert_array_equal(scores, np.zeros(4))
+        self.assertEqual(certainty, 0.0)
+        self.assertEqual(table.getScore(2, 'shirt'), (np.float32(0.8), 1.0))
+        self.assertEqual(len(table), 4)
+
+    def test_words_are_scored_one_by_one(self):
+        runner = OneWordRunner()
+        table = WordScoreTable(runner, self.features)
+        table.precompute(['shirt', 'unknown'])
+        table.getScores('shirt')
+        self.assertEqual(runner.calls, ['shirt', 'unknown'])
+        self.assertEqual(table.getScores('unknown')[1], 0.0)
+        np.testing.assert_allclose(table.getScores('shirt')[0], SCORES['shirt'])
+
+    def test_score_matrix(self):
+        table = WordScoreTable(WordsRunner(), self.features)
+        table.precompute(['shirt'])
+        matrix, certainties = table.getScoreMatrix(['blue', 'unknown', 'red'])
+        np.testing.assert_allclose(matrix, np.array([SCORES['blue'], [0.0] * 4,
+                                                     SCORES['red']]).T)
+        np.testing.assert_array_equal(certainties, [1.0, 0.0, 1.0])
+
+    def test_matrix_grows(self):
+        runner = WordsRunner()
+        table = WordScoreTable(runner, self.features)
+        words = ['word{0}'.format(i) for i in range(40)]
+        for word in words:
+            table.getScores(word)
+        table.precompute(['shirt'])
+        self.assertEqual(len(table), 41)
+        np.testing.assert_allclose(table.getScores('shirt')[0], SCORES['shirt'])
+        matrix, certainties = table.getScoreMatrix(words)
+        self.assertEqual(matrix.shape, (4, 40))
+        self.assertFalse(certainties.any())
+
+
+class BestBoxesByWordsTest(unittest.TestCase):
+
+    def test_boxes_where_both_words_hold(self):
+        objectScores = np.array(SCORES['shirt'])
+        wordScores = np.array([SCORES['red'], SCORES['blue']]).T
+        # only box 2 is both shirt and red, no box is both shirt and blue
+        self.assertEqual(bestBoxesByWords(objectScores, wordScores, 2),
+                         [(0, 2, 0.8 * 0.7)])
+
+    def test_best_words_first(self):
+        objectScores = np.array([0.9, 0.6, 0.2])
+        wordScores = np.array([[0.6, 0.9, 0.1],
+                               [0.99, 0.99, 0.9],
+                               [0.8, 0.4, 0.1]])
+        best = bestBoxesByWords(objectScores, wordScores, 3)
+        self.assertEqual([(column, box) for column, box, _ in best], [(1, 0), (0, 1), (2, 1)])
+        np.testing.assert_allclose([strength for _, _, strength in best],
+                                   [0.81, 0.594, 0.54])
+        self.assertEqual(bestBoxesByWords(objectScores, wordScores, 1)[0][:2], (1, 0))
+
+    def test_threshold(self):
+        # pattern matcher accepts predicates with mean above 0.5 only
+        self.assertEqual(bestBoxesByWords(np.array([0.5]), np.array([[0.9]])), [])
+        self.assertEqual(len(bestBoxesByWords(np.array([0.51]), np.array([[0.9]]))), 1)
+
+    def test_no_words(self):
+        self.assertEqual(bestBoxesByWords(np.array([0.9]), np.zeros((1, 0)), 3), [])
+
+
+class GroundedFormulaTest(unittest.TestCase):
+
+    def test_words(self):
+        self.assertEqual(groundedFormulaWords('_predadj(zebra, striped);_det(color, _$qVar)'),
+                         ['zebra', 'striped', 'color'])
+
+    def test_relations(self):
+        self.assertEqual(
+            groundedFormulaRelations('_det(color, _$qVar);_obj(be, shirt);_subj(be, color)'),
+            [('_det', 'color', '_$qVar'), ('_obj', 'be', 'shirt'), ('_subj', 'be', 'color')])
+        self.assertIsNone(groundedFormulaRelations('_predadj(zebra)'))
+
+    def test_bounding_box_index(self):
+        self.assertEqual(boundingBoxIndex('BoundingBox-12'), 12)
+        self.assertIsNone(boundingBoxIndex('BoundingBox'))
+        self.assertIsNone(boundingBoxIndex('red'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import os
 import math
+import threading
 import zipfile
 from opencog.scheme_wrapper import scheme_eval_as, scheme_eval
 
@@ -16,14 +17,35 @@ def addLeadingZeros(number, requriedLength):
     return result + str(number)
 
 
+# (pid, archive path) -> ZipFile, forked process opens its own handle
+# because file position is shared with the parent
+_archives = {}
+_archivesLock = threading.Lock()
+
+
+def openArchive(zipFileName):
+    """
+    Return ZipFile which is kept open and shared by the threads of the
+    process, so central directory of the archive is read only once
+    """
+    key = (os.getpid(), os.path.realpath(zipFileName))
+    with _archivesLock:
+        archive = _archives.get(key)
+        if archive is None:
+            for staleKey in [k for k in _archives if k[0] != key[0]]:
+                del _archives[staleKey]
+            archive = zipfile.ZipFile(zipFileName, 'r')
+            _archives[key] = archive
+        return archive
+
+
 def loadDataFromZipOrFolder(folderOrZip, fileName, loadProcedure):
     if (os.path.isdir(folderOrZip)):
         with open(folderOrZip + '/' + fileName, 'rb') as file:
             return loadProcedure(file)
     else:
-        with zipfile.ZipFile(folderOrZip, 'r') as archive:
-            with archive.open(fileName) as file:
-                return loadProcedure(file)
+        with openArchive(folderOrZip).open(fileName) as file:
+            return loadProcedure(file)
 
 
 def initialize_atomspace_by_facts(atomspaceFileName=None, ure_config=None, directories=[]):
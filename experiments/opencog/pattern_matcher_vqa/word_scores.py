@@ -0,0 +1,192 @@
+"""
+Batched evaluation of the word networks for all bounding boxes
+
+Scores are kept in a dense bounding boxes x words matrix per image, so
+simple questions can be answered by max/argmax over its columns without
+querying the atomspace.
+"""
+
+import collections
+import logging
+import re
+
+import numpy as np
+
+import stages
+from interface import NoModelException
+
+GROUNDED_RELATION = re.compile(r'^([^\(]+)\((.*), (.*)\)$')
+# pattern matcher accepts grounded predicate which mean is above it
+TRUTH_THRESHOLD = 0.5
+
+
+def groundedFormulaWords(groundedFormula):
+    """
+    Words of the grounded relex formula
+
+    :param groundedFormula: str
+        formula like '_predadj(zebra, striped);_det(color, _$qVar)'
+    :return: List[str]
+    """
+    words = re.split(r'^[^\(]+\(|\)[^\(]+\(|, |\)[^\(]*$', groundedFormula)
+    return [word for word in map(str.strip, words) if word and not word.startswith('_$')]
+
+
+def groundedFormulaRelations(groundedFormula):
+    """
+    Relations of the grounded relex formula in the order of the full formula
+
+    :param groundedFormula: str
+        formula like '_predadj(zebra, striped)'
+    :return: List[Tuple[str, str, str]]
+        relation name and its two arguments, None if formula cannot be
+        parsed
+    """
+    relations = []
+    for predicate in groundedFormula.split(';'):
+        match = GROUNDED_RELATION.match(predicate.strip())
+        if match is None:
+            return None
+        relations.append(match.groups())
+    return relations
+
+
+def bestBoxesByWords(objectScores, wordScores, k=1):
+    """
+    Best bounding box of each word among the boxes which are both the
+    object and the word, as pattern matcher grounds the conjunction of
+    their predicates, and k words with the best boxes
+
+    :param objectScores: numpy.ndarray
+        scores of the object word for each bounding box
+    :param wordScores: numpy.ndarray
+        bounding boxes x words scores
+    :param k: int
+    :return: List[Tuple[int, int, float]]
+        word column, bounding box index and strength, product of the
+        object and word scores, best word first, words without boxes are
+        skipped
+    """
+    objectScores = objectScores[:, np.newaxis]
+    holds = (objectScores > TRUTH_THRESHOLD) & (wordScores > TRUTH_THRESHOLD)
+    strengths = np.where(holds, objectScores * wordScores, -1.0)
+    boxes = strengths.argmax(axis=0)
+    best = strengths[boxes, np.arange(strengths.shape[1])]
+    return [(int(column), int(boxes[column]), float(best[column]))
+            for column in np.argsort(-best, kind='stable')[:k] if best[column] >= 0.0]
+
+
+def boundingBoxIndex(boundingBoxName):
+    """
+    :param boundingBoxName: str
+        name of the bounding box node, 'BoundingBox-<index>'
+    :return: int or None
+    """
+    prefix, _, index = boundingBoxName.rpartition('-')
+    if prefix != 'BoundingBox' or not index.isdigit():
+        return None
+    return int(index)
+
+
+class WordScoreTable:
+    """
+    Scores of the words for all bounding boxes of the image
+
+    Word network is run on all bounding boxes in one batch when the word is
+    requested first time, so the grounded predicate callback only looks up
+    the score. Scores are columns of the bounding boxes x words matrix
+    which grows as new words are requested, the table is kept between
+    questions about the same image.
+    """
+
+    def __init__(self, runner, features):
+        """
+        :param runner: interface.NeuralNetworkRunner
+        :param features: Iterable
+            bounding box features in the order of bounding box indexes
+        """
+        self.runner = runner
+        self.features = np.asarray(features, dtype=np.float32)
+        self.columns = {}
+        self.matrix = np.zeros((len(self.features), 16), dtype=np.float32)
+        self.certainties = np.zeros(16, dtype=np.float32)
+        self.logger = logging.getLogger('WordScoreTable')
+
+    def __len__(self):
+        """
+        :return: int
+            number of words scored
+        """
+        return len(self.columns)
+
+    def addColumns(self, words, scores, certainties):
+        """
+        :param scores: numpy.ndarray
+            words x bounding boxes scores
+        """
+        size = len(self.columns)
+        capacity = self.matrix.shape[1]
+        if size + len(words) > capacity:
+            capacity = max(2 * capacity, size + len(words))
+            matrix = np.zeros((len(self.features), capacity), dtype=np.float32)
+            matrix[:, :size] = self.matrix[:, :size]
+            self.matrix = matrix
+            self.certainties = np.resize(self.certainties, capacity)
+        self.matrix[:, size:size + len(words)] = np.asarray(scores, dtype=np.float32).T
+        self.certainties[size:size + len(words)] = certainties
+        for column, word in enumerate(words, size):
+            self.columns[word] = column
+
+    def precompute(self, words):
+        words = [word for word in collections.OrderedDict.fromkeys(words)
+                 if word not in self.columns]
+        if not words:
+            return
+        if not hasattr(self.runner, 'runNeuralNetworkWords'):
+            for word in words:
+                self.getScores(word)
+            return
+        # runner scores several words in one call
+        with stages.stage('runNeuralNetworkBatch'):
+            scores, known = self.runner.runNeuralNetworkWords(self.features, words)
+        self.addColumns(words, np.reshape(scores, (len(words), len(self.features))),
+                        [1.0 if isKnown else 0.0 for isKnown in known])
+
+    def getScores(self, word):
+        """
+        :return: Tuple[numpy.ndarray, float]
+            scores for each bounding box and certainty, certainty is 0.0
+            if there is no model for the word
+        """
+        column = self.columns.get(word)
+        if column is None:
+            try:
+                with stages.stage('runNeuralNetworkBatch'):
+                    scores, certainty = self.runner.runNeuralNetworkBatch(self.features, word), 1.0
+            except NoModelException as e:
+                self.logger.debug(e)
+                scores, certainty = np.zeros(len(self.features)), 0.0
+            self.addColumns([word], np.reshape(scores, (1, len(self.features))), [certainty])
+            column = self.columns[word]
+        return self.matrix[:, column], float(self.certainties[column])
+
+    def getScoreMatrix(self, words):
+        """
+        Scores of several words, networks of the words which are not
+        scored yet are run in one batch
+
+        :param words: List[str]
+        :return: Tuple[numpy.ndarray, numpy.ndarray]
+            bounding boxes x words scores and certainty of each word
+        """
+        self.precompute(words)
+        columns = [self.columns[word] for word in words]
+        return self.matrix[:, columns], self.certainties[columns]
+
+    def getScore(self, boxIndex, word):
+        """
+        :return: Tuple[float, float]
+            score of the word for the bounding box and certainty
+        """
+        scores, certainty = self.getScores(word)
+        return float(scores[boxIndex]), certainty
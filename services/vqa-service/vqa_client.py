@@ -15,6 +15,7 @@ def main():
     request = service_pb2.VqaRequest()
     request.question = "How many zebras are there?"
     request.use_pm = True
+    request.top_k = 3
     with open('/home/relex/projects/data/coco/COCO_val2014_000000999999.jpg', 'rb') as f:
         request.image_data = f.read()
     response = service.answer(request)
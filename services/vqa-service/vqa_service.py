@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 
 import io
+import asyncio
+import collections
+import functools
+import queue
 import imageio
 import logging
 import threading
@@ -11,10 +15,16 @@ from concurrent import futures
 
 import jpype
 from feature.image import ImageFeatureExtractor
+from feature.cache import FeatureCache, imageDigest
+from cache import AnswerCache, versionStamp
+from question_converter import CachingQuestionConverter
+from question_parser import QuestionParserClient
 from splitnet.splitmultidnnmodel import SplitMultidnnRunner
 from util import initialize_atomspace_by_facts
 from pattern_matcher_vqa import PatternMatcherVqaPipeline, runNeuralNetwork
+from interface import QuestionProcessingListener
 import network_runner
+import stages
 import grpc
 import time
 import vqaservice
@@ -22,9 +32,19 @@ sys.path.append(vqaservice.__path__[0])
 
 
 from vqaservice import service_pb2, service_pb2_grpc
+from vqaservice.pool import VqaWorkerPool, PoolBusyError, WorkerError
+from vqaservice.batcher import MicroBatcher
+from vqaservice.stage import Stage
+from vqaservice.metrics import Registry, start_http_server
 
 logger = logging.getLogger(__name__)
 question2atomeseLibraryPath = ('../question2atomese/target/question2atomese-1.0-SNAPSHOT.jar')
+# upper bound of VqaRequest.top_k
+MAX_TOP_K = 32
+prototxt = '/home/relex/projects/data/test.prototxt'
+caffemodel = '/home/relex/projects/data/resnet101_faster_rcnn_final_iter_320000_for_36_bboxes.caffemodel'
+models = '/home/relex/projects/data/visual_genome/'
+atomspace_path = '/home/relex/projects/data/train_tv_atomspace.scm'
 
 
 def setup_logger():
@@ -37,19 +57,160 @@ def parse_args():
                         help='ip address(default="0.0.0.0")')
     parser.add_argument('port', type=int,
                                help='listent at port')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='number of worker processes, each one loads its own '
+                             'pipeline at startup; 0 means answer in the server '
+                             'thread and load pipeline on the first request (default=0)')
+    parser.add_argument('--queue-size', type=int, default=16,
+                        help='maximum number of requests waiting for a free worker (default=16)')
+    parser.add_argument('--start-timeout', type=float, default=None,
+                        help='seconds to wait for workers to load pipelines')
+    parser.add_argument('--asyncio', action='store_true',
+                        help='use asyncio grpc server which honors client deadlines '
+                             'and cancellation, requires --workers > 0')
+    parser.add_argument('--feature-cache-size', type=int, default=256,
+                        help='megabytes of memory for image features cache in each '
+                             'worker, 0 disables the cache (default=256)')
+    parser.add_argument('--feature-cache-path', type=str, default=None,
+                        help='sqlite database to share image features between workers '
+                             'and restarts')
+    parser.add_argument('--feature-cache-disk-size', type=int, default=0,
+                        help='megabytes of disk for the features database, '
+                             '0 means unbounded (default=0)')
+    parser.add_argument('--answer-cache-size', type=int, default=0,
+                        help='number of answers to cache in each worker, '
+                             '0 disables the cache (default=0)')
+    parser.add_argument('--answer-cache-ttl', type=float, default=None,
+                        help='seconds to keep cached answers, by default answers '
+                             'are kept until evicted')
+    parser.add_argument('--question-parser', type=str, default=None,
+                        help='Unix socket of the question parser process '
+                             '(question_parser.py), if set workers do not start JVM')
+    parser.add_argument('--question-cache-size', type=int, default=10000,
+                        help='number of parsed questions to cache in each worker, '
+                             '0 disables the cache (default=10000)')
+    parser.add_argument('--question-cache-preload', type=str, default=None,
+                        help='file with frequent questions to parse at startup, '
+                             'one question per line optionally prefixed by count')
+    parser.add_argument('--image-layer-cache-size', type=int, default=0,
+                        help='number of images which bounding boxes are kept in the '
+                             'atomspace between questions, values computed for one '
+                             'question stay on the bounding boxes, 0 disables (default=0)')
+    parser.add_argument('--word-score-cache-size', type=int, default=4,
+                        help='number of images which word network scores are kept '
+                             'between questions, 0 disables (default=4)')
+    parser.add_argument('--simple-answers', dest='simple_answers', action='store_true',
+                        help='answer _predadj and _det/_obj/_subj questions from word '
+                             'scores instead of pattern matcher queries')
+    parser.add_argument('--no-simple-answers', dest='simple_answers', action='store_false',
+                        help='answer all questions by pattern matcher queries (default)')
+    parser.set_defaults(simple_answers=False)
+    parser.add_argument('--detector-workers', type=int, default=0,
+                        help='number of processes extracting image features for all '
+                             'workers, images of concurrent requests are batched; '
+                             '0 means each worker extracts features itself (default=0)')
+    parser.add_argument('--detector-batch-size', type=int, default=8,
+                        help='maximum number of images in a detector batch (default=8)')
+    parser.add_argument('--detector-batch-window', type=float, default=5,
+                        help='milliseconds to wait for more images before the batch '
+                             'is sent to a detector (default=5)')
+    parser.add_argument('--detector-queue-size', type=int, default=64,
+                        help='maximum number of images waiting for a detector (default=64)')
+    parser.add_argument('--decode-workers', type=int, default=2,
+                        help='number of threads in each detector process decoding images '
+                             'of the batch ahead of the network (default=2)')
+    parser.add_argument('--parser-workers', type=int, default=0,
+                        help='number of threads parsing questions by --question-parser '
+                             'while image features are extracted; 0 means workers parse '
+                             'questions themselves (default=0)')
+    parser.add_argument('--parser-queue-size', type=int, default=64,
+                        help='maximum number of requests waiting for a parser thread '
+                             '(default=64)')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='serve prometheus metrics at http://ip:port/metrics')
     return parser.parse_args()
 
 
-def build_vqa():
-    prototxt = '/home/relex/projects/data/test.prototxt'
-    caffemodel = '/home/relex/projects/data/resnet101_faster_rcnn_final_iter_320000_for_36_bboxes.caffemodel'
-    models = '/home/relex/projects/data/visual_genome/'
-    atomspace_path = '/home/relex/projects/data/train_tv_atomspace.scm'
-    jpype.startJVM(jpype.getDefaultJVMPath(),
-                   '-Djava.class.path=' + question2atomeseLibraryPath)
+def build_registry():
+    registry = Registry()
+    registry.counter('vqa_questions_total', 'Number of questions answered')
+    registry.histogram('vqa_stage_seconds', 'Duration of the pipeline stages', ['stage'])
+    registry.counter('vqa_errors_total', 'Number of error responses by error class', ['error'])
+    registry.counter('vqa_cache_requests_total', 'Number of cache lookups', ['cache', 'result'])
+    registry.histogram('vqa_detector_batch_size', 'Number of distinct images in detector batches',
+                       buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32))
+    registry.histogram('vqa_detector_wait_seconds',
+                       'Time from request arrival to the start of its detector batch')
+    return registry
 
-    question_converter = jpype.JClass('org.opencog.vqa.relex.QuestionToOpencogConverter')()
+
+# worker processes get a copy of the registry, values are passed to the
+# parent after each call
+registry = build_registry()
+
+
+def observe_stage(name, seconds):
+    registry['vqa_stage_seconds'].observe(seconds, stage=name)
+
+
+def count_cache_lookup(cache, hit):
+    registry['vqa_cache_requests_total'].inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def error_class(error_message):
+    """
+    Error message without details to be used as a metric label
+    """
+    words = error_message.split(None, 1)
+    if words and (words[0].endswith('Error') or words[0].endswith('Exception')):
+        return words[0]
+    return error_message.split(':', 1)[0].split('\n', 1)[0][:64]
+
+
+feature_cache = None
+answer_cache = None
+# threads decoding images in a detector process
+decoder = None
+
+
+def build_feature_cache(args):
+    if args.feature_cache_size <= 0:
+        return None
+    disk_max_bytes = None
+    if args.feature_cache_disk_size > 0:
+        disk_max_bytes = args.feature_cache_disk_size * 2**20
+    return FeatureCache(args.feature_cache_size * 2**20, path=args.feature_cache_path,
+                        diskMaxBytes=disk_max_bytes)
+
+
+def build_detector(args):
+    """
+    Build feature extractor in a detector process
+    """
+    global feature_cache, decoder
     extractor = ImageFeatureExtractor(prototxt, caffemodel)
+    feature_cache = build_feature_cache(args)
+    decoder = futures.ThreadPoolExecutor(max_workers=max(1, args.decode_workers))
+    return extractor
+
+
+def build_vqa(args):
+    global feature_cache, answer_cache
+    if args.question_parser is not None:
+        question_converter = QuestionParserClient(args.question_parser)
+    else:
+        jpype.startJVM(jpype.getDefaultJVMPath(),
+                       '-Djava.class.path=' + question2atomeseLibraryPath)
+        question_converter = jpype.JClass('org.opencog.vqa.relex.QuestionToOpencogConverter')()
+    if args.question_cache_size > 0:
+        question_converter = CachingQuestionConverter(question_converter,
+                                                      args.question_cache_size)
+        if args.question_cache_preload is not None:
+            question_converter.preload(args.question_cache_preload)
+    # features are passed by the detector processes if they are used
+    extractor = None
+    if args.workers <= 0 or args.detector_workers <= 0:
+        extractor = ImageFeatureExtractor(prototxt, caffemodel)
 
     scheme_directories = ["/home/relex/projects/opencog/examples/pln/conjunction/",
                           "/home/relex/projects/atomspace/examples/rule-engine/rules/",
@@ -59,51 +220,758 @@ def build_vqa():
                                               "conjunction-rule-base-config.scm",
                                               scheme_directories)
     network_runner.runner = SplitMultidnnRunner(models)
-    vqa = PatternMatcherVqaPipeline(extractor, question_converter, atomspace, None)
+    vqa = PatternMatcherVqaPipeline(extractor, question_converter, atomspace, None,
+                                    imageLayerCacheSize=args.image_layer_cache_size,
+                                    wordScoreCacheSize=args.word_score_cache_size,
+                                    simpleAnswers=args.simple_answers)
+    # cache is created in the worker process, sqlite connection cannot be shared
+    feature_cache = build_feature_cache(args)
+    if args.answer_cache_size > 0:
+        version = versionStamp([prototxt, caffemodel, models, atomspace_path,
+                                question2atomeseLibraryPath])
+        answer_cache = AnswerCache(args.answer_cache_size, ttl=args.answer_cache_ttl,
+                                   version=version)
     return vqa
 
 
+def to_response(answer):
+    """
+    Convert QueryProcessingData to VqaResponse
+    """
+    response = service_pb2.VqaResponse()
+    response.ok = False
+    if answer.ok:
+        response.answer = answer.answer
+        response.ok = True
+        for candidate in answer.candidates:
+            response.candidates.add(answer=candidate.answer or '',
+                                    strength=candidate.strength,
+                                    confidence=candidate.confidence,
+                                    bounding_box=-1 if candidate.answerBox is None
+                                    else candidate.answerBox)
+    else:
+        response.error_message = answer.error_message
+        registry['vqa_errors_total'].inc(error=error_class(answer.error_message))
+    return response
+
+
+def error_response(error_message):
+    registry['vqa_errors_total'].inc(error=error_class(error_message))
+    response = service_pb2.VqaResponse()
+    response.ok = False
+    response.error_message = error_message
+    return response
+
+
+def decode_image(image_data):
+    with stages.stage('decode'):
+        return imageio.imread(io.BytesIO(image_data))
+
+
+def extract_features(extractor, image_key, image_data):
+    """
+    Decode image and extract features, if the same image was processed
+    before features are taken from the cache
+
+    :return: Tuple[features, boxes]
+    """
+    computed = []
+
+    def compute():
+        computed.append(True)
+        image = decode_image(image_data)
+        with stages.stage('getFeaturesByImage'):
+            return extractor.getFeaturesByImage(image)
+
+    if feature_cache is None:
+        return compute()
+    result = feature_cache.getOrCompute(image_key, compute)
+    count_cache_lookup('feature', not computed)
+    return result
+
+
+def detect_images(extractor, images):
+    """
+    Extract features of a batch of images in a detector process, images
+    which are not in the cache are decoded by the decoder threads while
+    the network processes previous images
+
+    :param images: List[Tuple[str, bytes]]
+        image keys and encoded images
+    :return: List[Union[Tuple[features, boxes], RuntimeError]]
+        features or error of each image
+    """
+    results = [None] * len(images)
+    decoding = []
+    for i, (image_key, image_data) in enumerate(images):
+        if feature_cache is not None:
+            results[i] = feature_cache.get(image_key)
+            count_cache_lookup('feature', results[i] is not None)
+        if results[i] is None:
+            decoding.append((i, image_key, decoder.submit(decode_image, image_data)))
+    for i, image_key, image in decoding:
+        try:
+            image = image.result()
+            with stages.stage('getFeaturesByImage'):
+                features, boxes = extractor.getFeaturesByImage(image)
+            if feature_cache is not None:
+                features, boxes = feature_cache.put(image_key, features, boxes)
+            results[i] = (features, boxes)
+        except RuntimeError as e:
+            logger.error(e)
+            results[i] = RuntimeError(str(e))
+        except Exception as e:
+            # error of one image should not fail other images of the batch
+            logger.exception(e)
+            results[i] = RuntimeError('{0}: {1}'.format(type(e).__name__, e))
+    return results
+
+
+def top_k(request):
+    """
+    Number of answer candidates requested
+    """
+    return min(max(request.top_k, 1), MAX_TOP_K)
+
+
+def answer_request(vqa, request, features=None, parsed=None):
+    """
+    Answer VqaRequest using pipeline
+
+    It is module level function to be passed to the worker processes
+    """
+    return answer_questions(vqa, request.image_data, [request.question], request.use_pm,
+                            features=features, parsed=parsed, k=top_k(request))[0]
+
+
+def answer_questions(vqa, image_data, questions, use_pm, features=None, parsed=None, k=1):
+    """
+    Answer several questions about one image, features are extracted once
+    and only if some answers are not in the cache
+
+    :param features: Tuple[features, boxes]
+        features extracted by a detector process, if None features are
+        extracted by the pipeline
+    :param parsed: List[ParsedQuestion]
+        questions parsed by the parser stage, if None questions are parsed
+        by the pipeline
+    :param k: int
+        number of answer candidates
+    :return: List[VqaResponse]
+    """
+    image_key = imageDigest(image_data)
+    responses = [None] * len(questions)
+    registry['vqa_questions_total'].inc(len(questions))
+    if answer_cache is not None:
+        responses = [answer_cache.get(image_key, question, use_pm, k) for question in questions]
+        for response in responses:
+            count_cache_lookup('answer', response is not None)
+    try:
+        boxes = None
+        if features is not None:
+            features, boxes = features
+        for i, question in enumerate(questions):
+            if responses[i] is not None:
+                continue
+            if features is None:
+                features, boxes = extract_features(vqa.featureExtractor, image_key, image_data)
+            responses[i] = to_response(vqa.answerQuestionByFeatures(
+                features, boxes, question, use_pm=use_pm,
+                parsedQuestion=None if parsed is None else parsed[i], topK=k))
+            if answer_cache is not None and responses[i].ok:
+                answer_cache.put(image_key, question, use_pm, responses[i], k)
+    except RuntimeError as e:
+        logger.error(e)
+        responses = [error_response(str(e)) if response is None else response
+                     for response in responses]
+    for response in responses:
+        logger.info(response)
+    return responses
+
+
+class EventListener(QuestionProcessingListener):
+    """
+    Converts pipeline stages into VqaEvent messages
+    """
+
+    def __init__(self, emit):
+        self.emit = emit
+        self.start = time.time()
+
+    def event(self, stage):
+        event = service_pb2.VqaEvent()
+        event.stage = stage
+        event.elapsed = time.time() - self.start
+        return event
+
+    def onFeatures(self, features, boxes):
+        event = self.event(service_pb2.VqaEvent.FEATURES)
+        for x1, y1, x2, y2 in boxes:
+            event.boxes.add(x1=float(x1), y1=float(y1), x2=float(x2), y2=float(y2))
+        self.emit(event)
+
+    def onRelexFormula(self, relexFormula, questionType):
+        event = self.event(service_pb2.VqaEvent.RELEX_FORMULA)
+        event.relex_formula = str(relexFormula)
+        if questionType is not None:
+            event.question_type = str(questionType)
+        self.emit(event)
+
+    def onQuery(self, query):
+        event = self.event(service_pb2.VqaEvent.QUERY)
+        event.query = str(query)
+        self.emit(event)
+
+
+def answer_stream(vqa, emit, request, features=None, parsed=None):
+    """
+    Answer VqaRequest passing VqaEvent for each processing stage to emit()
+
+    It is module level function to be passed to the worker processes
+    :return: VqaResponse
+        the same response which is sent in the last event
+    """
+    registry['vqa_questions_total'].inc()
+    listener = EventListener(emit)
+    answer_box = -1
+    try:
+        # stream reports every stage, so answer cache is not used
+        if features is None:
+            features = extract_features(vqa.featureExtractor, imageDigest(request.image_data),
+                                        request.image_data)
+        features, boxes = features
+        listener.onFeatures(features, boxes)
+        answer = vqa.answerQuestionByFeatures(features, boxes, request.question,
+                                              use_pm=request.use_pm, listener=listener,
+                                              parsedQuestion=None if parsed is None else parsed[0],
+                                              topK=top_k(request))
+        response = to_response(answer)
+        if answer.ok and answer.answerBox is not None:
+            answer_box = answer.answerBox
+    except RuntimeError as e:
+        logger.error(e)
+        response = error_response(str(e))
+    logger.info(response)
+    event = listener.event(service_pb2.VqaEvent.ANSWER)
+    event.response.CopyFrom(response)
+    event.answer_box = answer_box
+    emit(event)
+    return response
+
+
+def error_event(error_message):
+    event = service_pb2.VqaEvent()
+    event.stage = service_pb2.VqaEvent.ANSWER
+    event.response.CopyFrom(error_response(error_message))
+    event.answer_box = -1
+    return event
+
+
+def group_by_image(requests):
+    """
+    Group VqaRequests by image, use_pm flag and number of answer candidates
+
+    :param requests: Iterable[VqaRequest]
+    :return: List[Tuple[bytes, bool, int, List[int]]]
+        image data, use_pm flag, number of candidates and indexes of
+        requests in the group
+    """
+    groups = collections.OrderedDict()
+    for i, request in enumerate(requests):
+        key = (request.image_data, request.use_pm, top_k(request))
+        groups.setdefault(key, []).append(i)
+    return [(image_data, use_pm, k, indexes)
+            for (image_data, use_pm, k), indexes in groups.items()]
+
+
+def batch_response(responses):
+    response = service_pb2.VqaBatchResponse()
+    response.responses.extend(responses)
+    return response
+
+
 thread_local = threading.local()
 
 
 class VqaService(service_pb2_grpc.VqaServiceServicer):
 
+    def __init__(self, factory):
+        self.factory = factory
+
     @property
     def vqa(self):
         # jpype is not threadsafe, causes segmentation fault
         # if run from another thread
         if getattr(thread_local, 'vqa', None) is None:
-            thread_local.vqa = build_vqa()
+            thread_local.vqa = self.factory()
         return thread_local.vqa
 
     def answer(self, request, context):
-        image = imageio.imread(io.BytesIO(request.image_data))
-        question = request.question
-        response = service_pb2.VqaResponse()
-        response.ok = False
-        try:
-            answer = self.vqa.answerQuestionByImage(image, question, use_pm=request.use_pm)
-            if answer.ok:
-                response.answer = answer.answer
-                response.ok = True
-            else:
-                response.error_message = answer.error_message
+        return answer_request(self.vqa, request)
+
+    def answerBatch(self, request, context):
+        return batch_response(answer_questions(self.vqa, request.image_data,
+                                               list(request.questions), request.use_pm,
+                                               k=top_k(request)))
+
+    def answerPairs(self, request, context):
+        responses = [None] * len(request.requests)
+        for image_data, use_pm, k, indexes in group_by_image(request.requests):
+            questions = [request.requests[i].question for i in indexes]
+            for i, response in zip(indexes, answer_questions(self.vqa, image_data,
+                                                             questions, use_pm, k=k)):
+                responses[i] = response
+        return batch_response(responses)
+
+    def answerStream(self, request, context):
+        # pipeline can be used only from the server thread,
+        # so events are sent after the answer is ready
+        events = []
+        answer_stream(self.vqa, events.append, request)
+        return iter(events)
+
+
+class Detector:
+    """
+    Extracts features in the pool of detector processes, images of
+    concurrent requests are collected into batches and the same image is
+    processed once per batch
+    """
+
+    def __init__(self, pool, max_batch_size, window, queue_size):
+        self.pool = pool
+        self.batcher = MicroBatcher(self.process, max_batch_size=max_batch_size,
+                                    window=window, max_in_flight=pool.num_workers,
+                                    queue_size=queue_size,
+                                    observe_batch=registry['vqa_detector_batch_size'].observe,
+                                    observe_wait=registry['vqa_detector_wait_seconds'].observe)
+
+    def process(self, images):
+        return self.pool.submit(detect_images, images)
+
+    def submit(self, image_data):
+        """
+        :return: concurrent.futures.Future
+            resolved to Tuple[features, boxes]
+        :raises PoolBusyError: if too many images wait for a detector
+        """
+        image_key = imageDigest(image_data)
+        try:
+            return self.batcher.submit((image_key, image_data), key=image_key)
+        except queue.Full:
+            raise PoolBusyError('detector queue is full ({0} images)'.format(
+                self.batcher.items.maxsize))
+
+
+def detector_error(error):
+    """
+    Error message of the failed feature extraction
+    """
+    if isinstance(error, WorkerError):
+        logger.error(error)
+        return 'internal error'
+    return str(error)
+
+
+def start_stages(detector, parser, image_data, questions, deadline=None):
+    """
+    Start feature extraction and question parsing, they run concurrently
+    with each other and with the stages of other requests
+
+    :return: Tuple[Future, Future]
+        detection and parsing, None for the stages which are run by the
+        workers
+    :raises PoolBusyError: if a stage queue is full
+    """
+    detection, parsing = None, None
+    if detector is not None:
+        detection = detector.submit(image_data)
+    if parser is not None:
+        parsing = parser.submit(questions, deadline=deadline)
+    return detection, parsing
+
+
+def parsing_result(parsing):
+    """
+    :return: List[ParsedQuestion] or None
+        None if questions should be parsed by the worker, the worker
+        parses them again if parser failed and reports the error
+    """
+    try:
+        return parsing.result()
+    except (RuntimeError, futures.TimeoutError) as e:
+        logger.warning(e)
+        return None
+
+
+class VqaPoolService(service_pb2_grpc.VqaServiceServicer):
+    """
+    Service which answers questions in the pool of worker processes
+
+    If detector or parser stages are given, features are extracted and
+    questions are parsed concurrently before the request is passed to the
+    reasoning workers.
+    """
+
+    def __init__(self, pool, detector=None, parser=None):
+        self.pool = pool
+        self.detector = detector
+        self.parser = parser
+
+    def start(self, context, image_data, questions):
+        try:
+            return start_stages(self.detector, self.parser, image_data, questions)
+        except PoolBusyError as e:
+            logger.warning(e)
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, str(e))
+
+    def finish(self, detection, parsing):
+        """
+        :return: Tuple[features, parsed questions]
+            None for the stages which are run by the workers
+        :raises RuntimeError: if features cannot be extracted
+        """
+        features, parsed = None, None
+        if detection is not None:
+            try:
+                features = detection.result()
+            except RuntimeError as e:
+                raise RuntimeError(detector_error(e))
+        if parsing is not None:
+            parsed = parsing_result(parsing)
+        return features, parsed
+
+    def submit(self, context, function, *args, on_event=None):
+        try:
+            return self.pool.submit(function, *args, on_event=on_event)
+        except PoolBusyError as e:
+            logger.warning(e)
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, str(e))
+        except WorkerError as e:
+            logger.error(e)
+            context.abort(grpc.StatusCode.UNAVAILABLE, 'no workers available')
+
+    def answer(self, request, context):
+        started = self.start(context, request.image_data, [request.question])
+        try:
+            features, parsed = self.finish(*started)
         except RuntimeError as e:
+            return error_response(str(e))
+        future = self.submit(context, answer_request, request, features, parsed)
+        try:
+            return future.result()
+        except WorkerError as e:
             logger.error(e)
-            response.error_message = str(e)
-        logger.info(response)
+            return error_response('internal error')
+
+    def answerBatch(self, request, context):
+        questions = list(request.questions)
+        started = self.start(context, request.image_data, questions)
+        try:
+            features, parsed = self.finish(*started)
+        except RuntimeError as e:
+            return batch_response([error_response(str(e)) for _ in questions])
+        future = self.submit(context, answer_questions, request.image_data,
+                             questions, request.use_pm, features, parsed, top_k(request))
+        try:
+            return batch_response(future.result())
+        except WorkerError as e:
+            logger.error(e)
+            return batch_response([error_response('internal error') for _ in questions])
+
+    def answerPairs(self, request, context):
+        # distinct images are processed by different workers in parallel
+        groups = group_by_image(request.requests)
+        questions = [[request.requests[i].question for i in indexes]
+                     for _, _, _, indexes in groups]
+        pending = [self.start(context, image_data, group_questions)
+                   for (image_data, _, _, _), group_questions in zip(groups, questions)]
+        tasks = []
+        responses = [None] * len(request.requests)
+        for (image_data, use_pm, k, indexes), group_questions, started in zip(
+                groups, questions, pending):
+            try:
+                features, parsed = self.finish(*started)
+            except RuntimeError as e:
+                for i in indexes:
+                    responses[i] = error_response(str(e))
+                continue
+            tasks.append((indexes, self.submit(context, answer_questions, image_data,
+                                               group_questions, use_pm, features, parsed,
+                                               k)))
+        for indexes, future in tasks:
+            try:
+                group_responses = future.result()
+            except WorkerError as e:
+                logger.error(e)
+                group_responses = [error_response('internal error') for _ in indexes]
+            for i, response in zip(indexes, group_responses):
+                responses[i] = response
+        return batch_response(responses)
+
+    def answerStream(self, request, context):
+        started = self.start(context, request.image_data, [request.question])
+        try:
+            features, parsed = self.finish(*started)
+        except RuntimeError as e:
+            yield error_event(str(e))
+            return
+        events = queue.Queue()
+        future = self.submit(context, answer_stream, request, features, parsed,
+                             on_event=events.put)
+        future.add_done_callback(lambda _: events.put(None))
+        while True:
+            event = events.get()
+            if event is None:
+                break
+            yield event
+        if future.exception() is not None:
+            logger.error(future.exception())
+            yield error_event('internal error')
+
+
+class AsyncVqaPoolService(service_pb2_grpc.VqaServiceServicer):
+    """
+    grpc.aio service which answers questions in the pool of worker processes
+
+    Requests are rejected with RESOURCE_EXHAUSTED when the pool queue is
+    full. Client deadline is passed to the pool, so the request is not
+    started after deadline, and queued request is cancelled when the client
+    disconnects or deadline is exceeded. Request which is already running
+    in a worker cannot be interrupted.
+    """
+
+    def __init__(self, pool, detector=None, parser=None):
+        self.pool = pool
+        self.detector = detector
+        self.parser = parser
+
+    async def prepare(self, context, image_data, questions):
+        """
+        Extract features in the detector processes and parse questions
+        concurrently
+
+        :return: Tuple[features, parsed questions]
+            None for the stages which are run by the workers
+        :raises RuntimeError: if features cannot be extracted
+        """
+        timeout = context.time_remaining()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            detection, parsing = start_stages(self.detector, self.parser, image_data,
+                                              questions, deadline=deadline)
+        except PoolBusyError as e:
+            logger.warning(e)
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, str(e))
+        features, parsed = None, None
+        if detection is not None:
+            try:
+                # detection is shared with other requests, so it is not cancelled
+                features = await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(detection)), timeout=timeout)
+            except asyncio.TimeoutError:
+                await context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, 'deadline exceeded')
+            except RuntimeError as e:
+                raise RuntimeError(detector_error(e))
+        if parsing is not None:
+            try:
+                parsed = await asyncio.wrap_future(parsing)
+            except (RuntimeError, futures.TimeoutError) as e:
+                # workers parse the questions again and report the error
+                logger.warning(e)
+        return features, parsed
+
+    async def call(self, context, function, *args, on_event=None):
+        """
+        Run function in the pool and wait for result
+
+        :return: function result or None if worker failed
+        """
+        timeout = context.time_remaining()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            future = self.pool.submit(function, *args, deadline=deadline, on_event=on_event)
+        except PoolBusyError as e:
+            logger.warning(e)
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, str(e))
+        except WorkerError as e:
+            logger.error(e)
+            await context.abort(grpc.StatusCode.UNAVAILABLE, 'no workers available')
+        try:
+            # cancellation of the awaiting coroutine cancels the queued future
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+        except (asyncio.TimeoutError, futures.TimeoutError):
+            await context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, 'deadline exceeded')
+        except WorkerError as e:
+            logger.error(e)
+            return None
+
+    async def answer(self, request, context):
+        try:
+            features, parsed = await self.prepare(context, request.image_data,
+                                                  [request.question])
+        except RuntimeError as e:
+            return error_response(str(e))
+        response = await self.call(context, answer_request, request, features, parsed)
+        if response is None:
+            response = error_response('internal error')
         return response
 
+    async def answerBatch(self, request, context):
+        questions = list(request.questions)
+        try:
+            features, parsed = await self.prepare(context, request.image_data, questions)
+        except RuntimeError as e:
+            return batch_response([error_response(str(e)) for _ in questions])
+        responses = await self.call(context, answer_questions, request.image_data,
+                                    questions, request.use_pm, features, parsed,
+                                    top_k(request))
+        if responses is None:
+            responses = [error_response('internal error') for _ in questions]
+        return batch_response(responses)
+
+    async def answerPairs(self, request, context):
+        groups = group_by_image(request.requests)
+        calls = []
+        for image_data, use_pm, k, indexes in groups:
+            questions = [request.requests[i].question for i in indexes]
+            calls.append(self.answer_group(context, image_data, questions, use_pm, k))
+        results = await asyncio.gather(*calls)
+        responses = [None] * len(request.requests)
+        for (_, _, _, indexes), group_responses in zip(groups, results):
+            if group_responses is None:
+                group_responses = [error_response('internal error') for _ in indexes]
+            for i, response in zip(indexes, group_responses):
+                responses[i] = response
+        return batch_response(responses)
+
+    async def answer_group(self, context, image_data, questions, use_pm, k):
+        try:
+            features, parsed = await self.prepare(context, image_data, questions)
+        except RuntimeError as e:
+            return [error_response(str(e)) for _ in questions]
+        return await self.call(context, answer_questions, image_data, questions, use_pm,
+                               features, parsed, k)
+
+    async def answerStream(self, request, context):
+        try:
+            features, parsed = await self.prepare(context, request.image_data,
+                                                  [request.question])
+        except RuntimeError as e:
+            await context.write(error_event(str(e)))
+            return
+        loop = asyncio.get_event_loop()
+        events = asyncio.Queue()
+
+        def on_event(event):
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        task = asyncio.ensure_future(self.call(context, answer_stream, request, features,
+                                               parsed, on_event=on_event))
+        task.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                await context.write(event)
+            if await task is None:
+                await context.write(error_event('internal error'))
+        finally:
+            task.cancel()
+
+
+async def serve_async(service, address):
+    from grpc import aio
+    server = aio.server()
+    service_pb2_grpc.add_VqaServiceServicer_to_server(service, server)
+    server.add_insecure_port(address)
+    await server.start()
+    await server.wait_for_termination()
+
+
+def start_pool(factory, args):
+    pool_metrics = {}
+    if args.metrics_port is not None:
+        pool_metrics = dict(collect=registry.drain, consume=registry.merge)
+    pool = VqaWorkerPool(factory, args.workers, args.queue_size,
+                         start_timeout=args.start_timeout, **pool_metrics)
+    registry.gauge('vqa_queue_depth', 'Number of requests waiting for a free worker',
+                   function=lambda: pool.queue_depth)
+    return pool
+
+
+def start_detector(args):
+    """
+    :return: Detector or None if workers extract features themselves
+    """
+    if args.detector_workers <= 0:
+        return None
+    pool_metrics = {}
+    if args.metrics_port is not None:
+        pool_metrics = dict(collect=registry.drain, consume=registry.merge)
+    # batcher sends at most one batch per detector, so queue is never full
+    pool = VqaWorkerPool(functools.partial(build_detector, args), args.detector_workers,
+                         args.detector_workers, start_timeout=args.start_timeout,
+                         **pool_metrics)
+    return Detector(pool, args.detector_batch_size, args.detector_batch_window / 1000.0,
+                    args.detector_queue_size)
+
+
+def start_parser(args):
+    """
+    :return: Stage or None if workers parse questions themselves
+    """
+    if args.parser_workers <= 0:
+        return None
+    if args.question_parser is None:
+        raise ValueError('--parser-workers requires --question-parser')
+    client = QuestionParserClient(args.question_parser)
+    parser = Stage('parser', client.parseQuestionsAndTypes, args.parser_workers,
+                   args.parser_queue_size)
+    registry.gauge('vqa_parser_queue_depth', 'Number of requests waiting for a parser thread',
+                   function=lambda: parser.queue_depth)
+    return parser
+
 
 def main():
     setup_logger()
-    service = VqaService()
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=1))
+    args = parse_args()
+    address = args.ip + ':' + str(args.port)
+    factory = functools.partial(build_vqa, args)
+    if args.metrics_port is not None:
+        # set before workers are forked
+        stages.observer = observe_stage
+    if args.asyncio:
+        if args.workers < 1:
+            raise ValueError('--asyncio requires --workers > 0')
+        pool = start_pool(factory, args)
+        detector = start_detector(args)
+        parser = start_parser(args)
+        if args.metrics_port is not None:
+            start_http_server(registry, args.metrics_port, args.ip)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(serve_async(AsyncVqaPoolService(pool, detector, parser),
+                                             address))
+        return
+    if args.workers > 0:
+        pool = start_pool(factory, args)
+        service = VqaPoolService(pool, start_detector(args), start_parser(args))
+        # threads only wait for the stages, so allow one per queued request
+        max_threads = args.workers + args.queue_size
+        if args.detector_workers > 0:
+            max_threads += args.detector_queue_size
+    else:
+        service = VqaService(factory)
+        max_threads = 1
+    if args.metrics_port is not None:
+        start_http_server(registry, args.metrics_port, args.ip)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_threads))
     service_pb2_grpc.add_VqaServiceServicer_to_server(
         service,
         server)
-    args = parse_args()
-    server.add_insecure_port(args.ip + ':' + str(args.port))
+    server.add_insecure_port(address)
     server.start()
 
     while True:
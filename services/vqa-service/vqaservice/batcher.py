@@ -0,0 +1,172 @@
+"""
+Dynamic micro-batching of calls from concurrent requests
+
+Items submitted by concurrent requests are collected for a short window or
+until the batch is full and processed by one call. While all processors
+are busy items keep accumulating, so batches grow with the load and the
+latency of a single request under low load is increased by the window at
+most.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from concurrent import futures
+
+
+class _Item:
+    __slots__ = ["future", "value", "key", "submitted"]
+
+    def __init__(self, future, value, key, submitted):
+        self.future = future
+        self.value = value
+        self.key = key
+        self.submitted = submitted
+
+
+class MicroBatcher:
+    """
+    Collects submitted values into batches and passes them to process()
+
+    process(values) is called from the batcher thread and returns
+    concurrent.futures.Future resolved to the list of results in the same
+    order as values. Result which is an exception instance is raised from
+    the future of the corresponding item. Values submitted with the same
+    key while the batch is collected are processed once.
+    """
+
+    def __init__(self, process, max_batch_size=8, window=0.005, max_in_flight=1,
+                 queue_size=0, observe_batch=None, observe_wait=None):
+        """
+        :param process: Callable[[List[Any]], concurrent.futures.Future]
+        :param max_batch_size: int
+            maximum number of distinct values in a batch
+        :param window: float
+            seconds to wait for more values after the first one arrived
+        :param max_in_flight: int
+            maximum number of batches processed at once, e.g. number of
+            detector processes
+        :param queue_size: int
+            maximum number of values waiting for a batch, 0 means unbounded
+        :param observe_batch: Callable[[int], None]
+            called with the size of each batch
+        :param observe_wait: Callable[[float], None]
+            called with seconds each item waited before its batch started
+        """
+        self.process = process
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self.slots = threading.Semaphore(max_in_flight)
+        self.observe_batch = observe_batch
+        self.observe_wait = observe_wait
+        self.items = queue.Queue(maxsize=queue_size)
+        self.logger = logging.getLogger('MicroBatcher')
+        self.thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self.thread.start()
+
+    def submit(self, value, key=None):
+        """
+        :return: concurrent.futures.Future
+            resolved to the result of value
+        :raises queue.Full: if queue_size values are already waiting
+        """
+        future = futures.Future()
+        self.items.put_nowait(_Item(future, value, key, time.monotonic()))
+        return future
+
+    def shutdown(self):
+        self.items.put(None)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            first = self.items.get()
+            if first is None:
+                return
+            groups = {}
+            batch = []
+            stop = not self._add(groups, batch, first)
+            deadline = first.submitted + self.window
+            while not stop and len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.items.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                stop = not self._add(groups, batch, item)
+            # wait for a free processor, values arriving meanwhile join the batch
+            self.slots.acquire()
+            while not stop and len(batch) < self.max_batch_size:
+                try:
+                    item = self.items.get_nowait()
+                except queue.Empty:
+                    break
+                stop = not self._add(groups, batch, item)
+            self._dispatch(batch)
+            if stop:
+                return
+
+    def _add(self, groups, batch, item):
+        """
+        :return: bool
+            False if item is the shutdown marker
+        """
+        if item is None:
+            return False
+        if not item.future.set_running_or_notify_cancel():
+            return True
+        if item.key is not None and item.key in groups:
+            groups[item.key].append(item)
+            return True
+        group = [item]
+        if item.key is not None:
+            groups[item.key] = group
+        batch.append(group)
+        return True
+
+    def _dispatch(self, batch):
+        if not batch:
+            self.slots.release()
+            return
+        now = time.monotonic()
+        if self.observe_batch is not None:
+            self.observe_batch(len(batch))
+        if self.observe_wait is not None:
+            for group in batch:
+                for item in group:
+                    self.observe_wait(now - item.submitted)
+        try:
+            result = self.process([group[0].value for group in batch])
+        except Exception as e:
+            self.slots.release()
+            self._fail(batch, e)
+            return
+        result.add_done_callback(lambda future: self._scatter(batch, future))
+
+    def _scatter(self, batch, future):
+        self.slots.release()
+        try:
+            results = future.result()
+        except Exception as e:
+            self._fail(batch, e)
+            return
+        if len(results) != len(batch):
+            self._fail(batch, RuntimeError('batch of {0} values returned {1} results'.format(
+                len(batch), len(results))))
+            return
+        for group, result in zip(batch, results):
+            for item in group:
+                if isinstance(result, BaseException):
+                    item.future.set_exception(result)
+                else:
+                    item.future.set_result(result)
+
+    def _fail(self, batch, error):
+        self.logger.error('batch of %s values failed: %s', len(batch), error)
+        for group in batch:
+            for item in group:
+                item.future.set_exception(error)
@@ -0,0 +1,248 @@
+"""
+Minimal metrics registry exported in Prometheus text format
+
+Worker processes have their own copy of the registry, after each call
+the worker drains its registry and the parent merges the values into the
+registry which is served over http.
+"""
+
+import collections
+import http.server
+import logging
+import socketserver
+import threading
+
+
+DEFAULT_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05,
+                   .1, .25, .5, 1, 2.5, 5, 10, float('inf'))
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = ['{0}="{1}"'.format(name, _escape(value))
+             for name, value in list(zip(names, values)) + list(extra)]
+    if not pairs:
+        return ''
+    return '{' + ','.join(pairs) + '}'
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError('{0} expects labels {1}, got {2}'.format(
+                self.name, self.labelnames, tuple(labels)))
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def drain(self):
+        with self.lock:
+            values, self.values = self.values, {}
+        return values
+
+    def merge(self, values):
+        raise NotImplementedError()
+
+    def samples(self):
+        raise NotImplementedError()
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def merge(self, values):
+        with self.lock:
+            for key, value in values.items():
+                self.values[key] = self.values.get(key, 0) + value
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Gauge(Metric):
+    """
+    Gauge is either set explicitly or computed by function when rendered,
+    gauges are not passed from the workers
+    """
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def drain(self):
+        return {}
+
+    def merge(self, values):
+        pass
+
+    def samples(self):
+        if self.function is not None:
+            yield self.name, '', self.function()
+            return
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        if self.buckets[-1] != float('inf'):
+            self.buckets += (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            state[1] += value
+
+    def merge(self, values):
+        with self.lock:
+            for key, (counts, total) in values.items():
+                state = self.values.get(key)
+                if state is None:
+                    state = self.values[key] = [[0] * len(self.buckets), 0.0]
+                state[0] = [a + b for a, b in zip(state[0], counts)]
+                state[1] += total
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, (list(counts), total))
+                           for key, (counts, total) in self.values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield (self.name + '_bucket',
+                       _format_labels(self.labelnames, key, [('le', _format_value(bound))]),
+                       cumulative)
+            labels = _format_labels(self.labelnames, key)
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, cumulative
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = collections.OrderedDict()
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError('metric {0} is already registered'.format(metric.name))
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def __getitem__(self, name):
+        return self.metrics[name]
+
+    def drain(self):
+        """
+        Take values accumulated since the last call
+
+        :return: Dict[str, Any]
+            picklable values which can be passed to merge()
+        """
+        drained = {}
+        for name, metric in self.metrics.items():
+            values = metric.drain()
+            if values:
+                drained[name] = values
+        return drained
+
+    def merge(self, drained):
+        for name, values in drained.items():
+            self.metrics[name].merge(values)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append('# HELP {0} {1}'.format(metric.name, metric.documentation))
+            lines.append('# TYPE {0} {1}'.format(metric.name, metric.type))
+            for name, labels, value in metric.samples():
+                lines.append('{0}{1} {2}'.format(name, labels, _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.getLogger('metrics').debug(format, *args)
+
+
+def start_http_server(registry, port, address=''):
+    """
+    Serve registry at http://address:port/metrics in a daemon thread
+
+    :return: http.server.HTTPServer
+    """
+    handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry})
+    server = _ThreadingHTTPServer((address, port), handler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,335 @@
+"""
+Pool of worker processes each owning its own vqa pipeline
+
+jpype is not thread safe and every pipeline needs its own JVM, atomspace
+and neural network models, so the only way to answer several questions
+in parallel is to run several processes. Pipelines are built and warmed up
+when the pool starts, requests are kept in a bounded queue in the parent
+process and dispatched to the first idle worker. A worker which dies is
+replaced by a new one, if no worker can be started the pool fails the
+waiting requests and rejects new ones.
+"""
+
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+
+from concurrent import futures
+
+
+# seconds between checks of the stop event by idle dispatchers
+STOP_POLL_INTERVAL = 0.2
+
+
+class WorkerError(RuntimeError):
+    pass
+
+
+class PoolBusyError(RuntimeError):
+    pass
+
+
+class _WorkItem:
+    __slots__ = ["future", "function", "args", "deadline", "on_event"]
+
+    def __init__(self, future, function, args, deadline, on_event):
+        self.future = future
+        self.function = function
+        self.args = args
+        self.deadline = deadline
+        self.on_event = on_event
+
+
+def _worker_main(connection, factory, collect):
+    """
+    Worker process loop: build the pipeline, report readiness and
+    run the functions sent by the parent until None is received
+    """
+    try:
+        vqa = factory()
+    except BaseException:
+        connection.send(('error', traceback.format_exc()))
+        return
+    connection.send(('ready', None))
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        function, args, streaming = message
+        try:
+            if streaming:
+                result = function(vqa, lambda event: connection.send(('event', event)), *args)
+            else:
+                result = function(vqa, *args)
+            status = 'result'
+        except BaseException:
+            status, result = 'error', traceback.format_exc()
+        if collect is not None:
+            connection.send(('telemetry', collect()))
+        connection.send((status, result))
+
+
+class VqaWorkerPool:
+    """
+    Dispatches calls to a set of worker processes
+
+    Each worker calls factory() once at startup, then every submitted
+    function is called in a worker as function(vqa, *args), where vqa is the
+    object returned by the factory. Functions, arguments and results are
+    passed between processes by pickle.
+
+    After each call the worker calls collect() and the returned object is
+    passed to consume() in the parent process, it is used to gather
+    metrics from the workers.
+    """
+
+    def __init__(self, factory, num_workers, queue_size, start_timeout=None,
+                 collect=None, consume=None):
+        """
+        :param factory: Callable[[], Any]
+            builds the pipeline in a worker process
+        :param num_workers: int
+            number of worker processes
+        :param queue_size: int
+            maximum number of requests waiting for a free worker
+        :param start_timeout: float
+            seconds to wait for all workers to warm up, None to wait forever
+        :param collect: Callable[[], Any]
+            called in a worker after each call
+        :param consume: Callable[[Any], None]
+            called in the parent with the result of collect()
+        """
+        self.factory = factory
+        self.collect = collect
+        self.consume = consume
+        self.num_workers = num_workers
+        self.start_timeout = start_timeout
+        self.pending = queue.Queue(maxsize=queue_size)
+        self.context = multiprocessing.get_context('fork')
+        self.processes = []
+        self.threads = []
+        # guards live_workers and closed, submit() does not enqueue items
+        # after the pool is closed
+        self.lock = threading.Lock()
+        self.live_workers = 0
+        self.closed = False
+        # dispatchers exit when it is set and the queue is empty, stop
+        # markers are not put into the bounded queue which may be full
+        self.stopped = threading.Event()
+        self.logger = logging.getLogger('VqaWorkerPool')
+        self._start()
+
+    def _spawn(self, index):
+        """
+        :return: Tuple[multiprocessing.Process, multiprocessing.connection.Connection]
+            started worker process and parent end of its pipe
+        """
+        parent_end, child_end = self.context.Pipe()
+        process = self.context.Process(target=_worker_main,
+                                       args=(child_end, self.factory, self.collect),
+                                       name='vqa-worker-{0}'.format(index),
+                                       daemon=True)
+        process.start()
+        child_end.close()
+        return process, parent_end
+
+    def _wait_ready(self, process, connection):
+        """
+        :raises WorkerError: if the worker failed to build the pipeline or
+            did not start in start_timeout seconds
+        """
+        try:
+            if not connection.poll(self.start_timeout):
+                raise WorkerError('worker {0} did not start in {1} seconds'.format(
+                    process.name, self.start_timeout))
+            status, details = connection.recv()
+        except (EOFError, OSError) as e:
+            raise WorkerError('worker {0} died while starting: {1}'.format(process.name, e))
+        if status != 'ready':
+            raise WorkerError('worker {0} failed to start:\n{1}'.format(
+                process.name, details))
+        self.logger.info('%s is ready', process.name)
+
+    def _start(self):
+        connections = []
+        for i in range(self.num_workers):
+            process, connection = self._spawn(i)
+            self.processes.append(process)
+            connections.append(connection)
+        for process, connection in zip(self.processes, connections):
+            try:
+                self._wait_ready(process, connection)
+            except WorkerError:
+                self.shutdown()
+                raise
+        self.live_workers = self.num_workers
+        for i, connection in enumerate(connections):
+            thread = threading.Thread(target=self._dispatch,
+                                      args=(i, connection),
+                                      name=self.processes[i].name + '-dispatcher',
+                                      daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _respawn(self, index):
+        """
+        Replace the dead worker
+
+        :return: multiprocessing.connection.Connection
+            connection to the new worker, None if it cannot be started
+        """
+        process = self.processes[index]
+        process.join(timeout=1)
+        if process.is_alive():
+            process.terminate()
+        if self.closed:
+            return None
+        process, connection = self._spawn(index)
+        self.processes[index] = process
+        try:
+            self._wait_ready(process, connection)
+        except WorkerError as e:
+            self.logger.error('cannot replace dead worker: %s', e)
+            connection.close()
+            process.terminate()
+            return None
+        return connection
+
+    def _worker_lost(self):
+        """
+        Called when the dead worker cannot be replaced, the last one fails
+        waiting items since nobody would run them
+        """
+        with self.lock:
+            self.live_workers -= 1
+            if self.live_workers > 0:
+                return
+            self.closed = True
+            self.logger.error('all workers are dead')
+            self._fail_pending(WorkerError('all workers are dead'))
+
+    def _fail_pending(self, error):
+        while True:
+            try:
+                item = self.pending.get_nowait()
+            except queue.Empty:
+                return
+            if item.future.set_running_or_notify_cancel():
+                item.future.set_exception(error)
+
+    def _dispatch(self, index, connection):
+        """
+        Send pending work items to one worker process, one at a time
+        """
+        while True:
+            try:
+                item = self.pending.get(timeout=STOP_POLL_INTERVAL)
+            except queue.Empty:
+                if not self.stopped.is_set():
+                    continue
+                try:
+                    connection.send(None)
+                except OSError:
+                    pass
+                return
+            if not item.future.set_running_or_notify_cancel():
+                continue
+            if item.deadline is not None and item.deadline < time.monotonic():
+                item.future.set_exception(futures.TimeoutError(
+                    'deadline expired while waiting for a free worker'))
+                continue
+            try:
+                connection.send((item.function, item.args, item.on_event is not None))
+                status, result = connection.recv()
+                while status in ('event', 'telemetry'):
+                    if status == 'event':
+                        self._notify(item, result)
+                    else:
+                        self._consume(result)
+                    status, result = connection.recv()
+            except (EOFError, OSError) as e:
+                name = self.processes[index].name
+                self.logger.error('%s died: %s', name, e)
+                item.future.set_exception(WorkerError('{0} died'.format(name)))
+                connection.close()
+                connection = self._respawn(index)
+                if connection is None:
+                    self._worker_lost()
+                    return
+                continue
+            if status == 'result':
+                item.future.set_result(result)
+            else:
+                item.future.set_exception(WorkerError(result))
+
+    def _notify(self, item, event):
+        try:
+            item.on_event(event)
+        except Exception as e:
+            self.logger.exception('event handler failed: %s', e)
+
+    def _consume(self, telemetry):
+        if self.consume is None:
+            return
+        try:
+            self.consume(telemetry)
+        except Exception as e:
+            self.logger.exception('telemetry handler failed: %s', e)
+
+    @property
+    def queue_depth(self):
+        return self.pending.qsize()
+
+    def submit(self, function, *args, timeout=None, deadline=None, on_event=None):
+        """
+        Schedule function(vqa, *args) to be run in one of the workers
+
+        :param function: Callable
+            module level function, it is passed to the worker by reference
+        :param timeout: float
+            seconds to wait for a free slot in the queue, None means
+            do not wait
+        :param deadline: float
+            time.monotonic() value after which the call is not started
+        :param on_event: Callable[[Any], None]
+            if set, function is called as function(vqa, emit, *args) and
+            every object passed to emit() is passed to on_event in the
+            parent process before the future is resolved
+        :return: concurrent.futures.Future
+        :raises PoolBusyError: if the queue is full
+        :raises WorkerError: if the pool is shut down or all workers are dead
+        """
+        future = futures.Future()
+        item = _WorkItem(future, function, args, deadline, on_event)
+        with self.lock:
+            if self.closed:
+                raise WorkerError('worker pool is closed')
+            try:
+                if timeout is None:
+                    self.pending.put_nowait(item)
+                else:
+                    self.pending.put(item, timeout=timeout)
+            except queue.Full:
+                raise PoolBusyError('request queue is full ({0} requests)'.format(
+                    self.pending.maxsize))
+        return future
+
+    def shutdown(self):
+        with self.lock:
+            self.closed = True
+            self._fail_pending(WorkerError('worker pool is shut down'))
+        # the queue is empty and nothing is added anymore, idle dispatchers
+        # exit within STOP_POLL_INTERVAL, busy ones after the current call
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
@@ -0,0 +1,98 @@
+"""
+Thread stage of the request pipeline
+
+Stage runs a function on a fixed number of threads taking calls from a
+bounded queue, so each stage of the pipeline has its own concurrency and
+rejects new calls instead of accumulating them when it cannot keep up.
+It is used for the stages which only wait for other processes, like
+question parsing by the parser process, and do not need the GIL.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from concurrent import futures
+
+from vqaservice.pool import PoolBusyError
+
+
+class _Call:
+    __slots__ = ["future", "args", "deadline"]
+
+    def __init__(self, future, args, deadline):
+        self.future = future
+        self.args = args
+        self.deadline = deadline
+
+
+class Stage:
+    """
+    Calls function(*args) on worker threads
+    """
+
+    def __init__(self, name, function, num_workers, queue_size):
+        """
+        :param name: str
+            stage name used for threads and errors
+        :param function: Callable
+        :param num_workers: int
+            number of threads
+        :param queue_size: int
+            maximum number of calls waiting for a free thread
+        """
+        self.name = name
+        self.function = function
+        self.pending = queue.Queue(maxsize=queue_size)
+        self.logger = logging.getLogger('Stage')
+        self.threads = []
+        for i in range(num_workers):
+            thread = threading.Thread(target=self._run, name='{0}-{1}'.format(name, i),
+                                      daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    @property
+    def queue_depth(self):
+        return self.pending.qsize()
+
+    def submit(self, *args, deadline=None):
+        """
+        :param deadline: float
+            time.monotonic() value after which the call is not started
+        :return: concurrent.futures.Future
+        :raises PoolBusyError: if the queue is full
+        """
+        future = futures.Future()
+        try:
+            self.pending.put_nowait(_Call(future, args, deadline))
+        except queue.Full:
+            raise PoolBusyError('{0} queue is full ({1} requests)'.format(
+                self.name, self.pending.maxsize))
+        return future
+
+    def shutdown(self):
+        for _ in self.threads:
+            self.pending.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            call = self.pending.get()
+            if call is None:
+                return
+            if not call.future.set_running_or_notify_cancel():
+                continue
+            if call.deadline is not None and call.deadline < time.monotonic():
+                call.future.set_exception(futures.TimeoutError(
+                    'deadline expired while waiting in {0} queue'.format(self.name)))
+                continue
+            try:
+                result = self.function(*call.args)
+            except Exception as e:
+                self.logger.error('%s failed: %s', self.name, e)
+                call.future.set_exception(e)
+            else:
+                call.future.set_result(result)
@@ -0,0 +1,133 @@
+"""
+Micro-batcher tests
+
+Run from vqa-service directory:
+    python3 -m unittest vqaservice.test_batcher
+"""
+
+import queue
+import threading
+import time
+import unittest
+
+from concurrent import futures
+
+from vqaservice.batcher import MicroBatcher
+
+
+class Processor:
+    """
+    Records batches and returns values doubled, batches wait for release()
+    while blocked
+    """
+
+    def __init__(self, blocked=False):
+        self.batches = []
+        self.released = threading.Event()
+        if not blocked:
+            self.released.set()
+        self.executor = futures.ThreadPoolExecutor(max_workers=4)
+
+    def __call__(self, values):
+        self.batches.append(list(values))
+        return self.executor.submit(self.run, values)
+
+    def run(self, values):
+        self.released.wait(5)
+        return [ValueError(value) if value == 'bad' else value * 2 for value in values]
+
+
+class MicroBatcherTest(unittest.TestCase):
+
+    def tearDown(self):
+        self.batcher.shutdown()
+
+    def test_values_in_window_are_batched(self):
+        processor = Processor()
+        self.batcher = MicroBatcher(processor, max_batch_size=8, window=0.2)
+        results = [self.batcher.submit(i) for i in range(3)]
+        self.assertEqual([future.result(timeout=5) for future in results], [0, 2, 4])
+        late = self.batcher.submit(3)
+        self.assertEqual(late.result(timeout=5), 6)
+        self.assertEqual(processor.batches, [[0, 1, 2], [3]])
+
+    def test_window_limits_latency(self):
+        processor = Processor()
+        self.batcher = MicroBatcher(processor, max_batch_size=8, window=0.05)
+        start = time.monotonic()
+        self.assertEqual(self.batcher.submit(1).result(timeout=5), 2)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_max_batch_size(self):
+        processor = Processor()
+        self.batcher = MicroBatcher(processor, max_batch_size=2, window=0.2)
+        results = [self.batcher.submit(i) for i in range(5)]
+        self.assertEqual([future.result(timeout=5) for future in results], [0, 2, 4, 6, 8])
+        self.assertEqual(processor.batches, [[0, 1], [2, 3], [4]])
+
+    def test_batch_grows_while_processor_is_busy(self):
+        processor = Processor(blocked=True)
+        self.batcher = MicroBatcher(processor, max_batch_size=8, window=0.0,
+                                    max_in_flight=1)
+        first = self.batcher.submit(0)
+        while not processor.batches:
+            time.sleep(0.01)
+        waiting = [self.batcher.submit(i) for i in range(1, 4)]
+        processor.released.set()
+        self.assertEqual(first.result(timeout=5), 0)
+        self.assertEqual([future.result(timeout=5) for future in waiting], [2, 4, 6])
+        self.assertEqual(processor.batches, [[0], [1, 2, 3]])
+
+    def test_same_key_is_processed_once(self):
+        processor = Processor()
+        self.batcher = MicroBatcher(processor, max_batch_size=8, window=0.2)
+        results = [self.batcher.submit(5, key='image'), self.batcher.submit(5, key='image'),
+                   self.batcher.submit(7, key='other')]
+        self.assertEqual([future.result(timeout=5) for future in results], [10, 10, 14])
+        self.assertEqual(processor.batches, [[5, 7]])
+
+    def test_errors(self):
+        processor = Processor()
+        self.batcher = MicroBatcher(processor, max_batch_size=8, window=0.2)
+        good, bad = self.batcher.submit(1), self.batcher.submit('bad')
+        self.assertEqual(good.result(timeout=5), 2)
+        with self.assertRaises(ValueError):
+            bad.result(timeout=5)
+
+    def test_failed_process(self):
+        def fail(values):
+            raise RuntimeError('no processor')
+
+        self.batcher = MicroBatcher(fail, window=0.01)
+        with self.assertRaises(RuntimeError):
+            self.batcher.submit(1).result(timeout=5)
+
+    def test_queue_size(self):
+        processor = Processor(blocked=True)
+        self.batcher = MicroBatcher(processor, max_batch_size=1, window=0.0,
+                                    max_in_flight=1, queue_size=1)
+        self.batcher.submit(0)
+        while not processor.batches:
+            time.sleep(0.01)
+        # the batcher thread waits for a free processor with the next value
+        self.batcher.submit(1)
+        while self.batcher.items.qsize() > 0:
+            time.sleep(0.01)
+        self.batcher.submit(2)
+        with self.assertRaises(queue.Full):
+            self.batcher.submit(3)
+        processor.released.set()
+
+    def test_observers(self):
+        sizes, waits = [], []
+        self.batcher = MicroBatcher(Processor(), window=0.05, observe_batch=sizes.append,
+                                    observe_wait=waits.append)
+        for future in [self.batcher.submit(i) for i in range(3)]:
+            future.result(timeout=5)
+        self.assertEqual(sizes, [3])
+        self.assertEqual(len(waits), 3)
+        self.assertTrue(all(wait >= 0 for wait in waits))
+
+
+if __name__ == '__main__':
+    unittest.main()
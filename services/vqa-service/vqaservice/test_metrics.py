@@ -0,0 +1,93 @@
+"""
+Metrics registry tests
+
+Run from vqa-service directory:
+    python3 -m unittest vqaservice.test_metrics
+"""
+
+import pickle
+import unittest
+import urllib.error
+import urllib.request
+
+from vqaservice.metrics import Registry, start_http_server
+
+
+def build_registry(queue_depth=lambda: 3):
+    registry = Registry()
+    registry.counter('vqa_requests_total', 'Number of requests', ['method'])
+    registry.histogram('vqa_stage_seconds', 'Stage duration', ['stage'], buckets=(0.1, 1))
+    registry.gauge('vqa_queue_depth', 'Requests waiting', function=queue_depth)
+    return registry
+
+
+class RegistryTest(unittest.TestCase):
+
+    def test_render(self):
+        registry = build_registry()
+        registry['vqa_requests_total'].inc(method='answer')
+        registry['vqa_requests_total'].inc(2, method='answerBatch')
+        for value in [0.05, 0.5, 5]:
+            registry['vqa_stage_seconds'].observe(value, stage='parse "question"')
+        self.assertEqual(registry.render(), '\n'.join([
+            '# HELP vqa_requests_total Number of requests',
+            '# TYPE vqa_requests_total counter',
+            'vqa_requests_total{method="answer"} 1.0',
+            'vqa_requests_total{method="answerBatch"} 2.0',
+            '# HELP vqa_stage_seconds Stage duration',
+            '# TYPE vqa_stage_seconds histogram',
+            'vqa_stage_seconds_bucket{stage="parse \\"question\\"",le="0.1"} 1.0',
+            'vqa_stage_seconds_bucket{stage="parse \\"question\\"",le="1.0"} 2.0',
+            'vqa_stage_seconds_bucket{stage="parse \\"question\\"",le="+Inf"} 3.0',
+            'vqa_stage_seconds_sum{stage="parse \\"question\\""} 5.55',
+            'vqa_stage_seconds_count{stage="parse \\"question\\""} 3.0',
+            '# HELP vqa_queue_depth Requests waiting',
+            '# TYPE vqa_queue_depth gauge',
+            'vqa_queue_depth 3.0',
+        ]) + '\n')
+
+    def test_labels_are_checked(self):
+        registry = build_registry()
+        with self.assertRaises(ValueError):
+            registry['vqa_requests_total'].inc()
+        with self.assertRaises(ValueError):
+            registry['vqa_requests_total'].inc(method='answer', status='ok')
+        with self.assertRaises(ValueError):
+            registry.counter('vqa_requests_total', 'Registered twice')
+
+    def test_merge_workers(self):
+        parent = build_registry()
+        parent['vqa_requests_total'].inc(method='answer')
+        for _ in range(2):
+            worker = build_registry()
+            worker['vqa_requests_total'].inc(method='answer')
+            worker['vqa_stage_seconds'].observe(0.5, stage='reasoning')
+            # values are passed from the worker process by pickle
+            parent.merge(pickle.loads(pickle.dumps(worker.drain())))
+            # drained values are not passed again
+            self.assertEqual(worker.drain(), {})
+        samples = {(name, labels): value for metric in parent.metrics.values()
+                   for name, labels, value in metric.samples()}
+        self.assertEqual(samples[('vqa_requests_total', '{method="answer"}')], 3)
+        self.assertEqual(samples[('vqa_stage_seconds_count', '{stage="reasoning"}')], 2)
+        self.assertEqual(samples[('vqa_stage_seconds_sum', '{stage="reasoning"}')], 1.0)
+        self.assertEqual(samples[('vqa_stage_seconds_bucket',
+                                  '{stage="reasoning",le="1.0"}')], 2)
+
+    def test_http_server(self):
+        registry = build_registry()
+        registry['vqa_requests_total'].inc(method='answer')
+        server = start_http_server(registry, 0, '127.0.0.1')
+        try:
+            url = 'http://127.0.0.1:{0}'.format(server.server_address[1])
+            with urllib.request.urlopen(url + '/metrics') as response:
+                self.assertEqual(response.read().decode('utf-8'), registry.render())
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(url + '/other')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
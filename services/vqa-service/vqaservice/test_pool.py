@@ -0,0 +1,108 @@
+"""
+Worker pool tests
+
+Run from vqa-service directory:
+    python3 -m unittest vqaservice.test_pool
+"""
+
+import os
+import time
+import unittest
+
+from vqaservice.pool import VqaWorkerPool, WorkerError
+
+
+class FakePipeline:
+    pass
+
+
+def build_pipeline():
+    return FakePipeline()
+
+
+def fail_to_build():
+    raise RuntimeError('cannot build pipeline')
+
+
+def worker_pid(vqa):
+    return os.getpid()
+
+
+def exit_worker(vqa):
+    os._exit(1)
+
+
+def sleep(vqa, seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+class VqaWorkerPoolTest(unittest.TestCase):
+
+    def test_calls_are_run_in_workers(self):
+        pool = VqaWorkerPool(build_pipeline, 2, 8, start_timeout=10)
+        try:
+            pids = {pool.submit(worker_pid).result(timeout=10) for _ in range(8)}
+            self.assertNotIn(os.getpid(), pids)
+        finally:
+            pool.shutdown()
+
+    def test_dead_worker_is_replaced(self):
+        pool = VqaWorkerPool(build_pipeline, 1, 8, start_timeout=10)
+        try:
+            pid = pool.submit(worker_pid).result(timeout=10)
+            with self.assertRaises(WorkerError):
+                pool.submit(exit_worker).result(timeout=10)
+            new_pid = pool.submit(worker_pid).result(timeout=10)
+            self.assertNotEqual(new_pid, pid)
+        finally:
+            pool.shutdown()
+
+    def test_pool_without_workers_rejects_calls(self):
+        pool = VqaWorkerPool(build_pipeline, 1, 8, start_timeout=10)
+        try:
+            # the replacement worker cannot build the pipeline
+            pool.factory = fail_to_build
+            running = pool.submit(sleep, 0.3)
+            waiting = [pool.submit(exit_worker)] + [pool.submit(worker_pid) for _ in range(3)]
+            self.assertEqual(running.result(timeout=10), 0.3)
+            for future in waiting:
+                with self.assertRaises(WorkerError):
+                    future.result(timeout=10)
+            with self.assertRaises(WorkerError):
+                pool.submit(worker_pid)
+        finally:
+            pool.shutdown()
+
+    def test_shutdown_with_full_queue(self):
+        pool = VqaWorkerPool(build_pipeline, 1, 2, start_timeout=10)
+        running = pool.submit(sleep, 0.5)
+        # wait until the dispatcher takes the call from the queue
+        while pool.queue_depth > 0:
+            time.sleep(0.01)
+        waiting = [pool.submit(worker_pid), pool.submit(worker_pid)]
+        pool.shutdown()
+        self.assertEqual(running.result(timeout=1), 0.5)
+        for future in waiting:
+            with self.assertRaises(WorkerError):
+                future.result(timeout=1)
+        with self.assertRaises(WorkerError):
+            pool.submit(worker_pid)
+
+    def test_shutdown_with_small_queue(self):
+        # more dispatchers than queue slots, all of them are busy when the
+        # pool is shut down
+        pool = VqaWorkerPool(build_pipeline, 3, 1, start_timeout=10)
+        running = [pool.submit(sleep, 1.5, timeout=10) for _ in range(3)]
+        while pool.queue_depth > 0:
+            time.sleep(0.01)
+        start = time.monotonic()
+        pool.shutdown()
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual([future.result(timeout=1) for future in running], [1.5] * 3)
+        self.assertFalse(any(thread.is_alive() for thread in pool.threads))
+        self.assertFalse(any(process.is_alive() for process in pool.processes))
+
+
+if __name__ == '__main__':
+    unittest.main()